@@ -183,7 +183,11 @@ COMMAND_DETAILS = {
         "commands": [
             "/queue :- SHOW CURRENT QUEUE",
             "/clearqueue :- CLEAR ALL QUEUED TRACKS",
-            "/shuffle :- SHUFFLE QUEUE ORDER"
+            "/shuffle :- SHUFFLE QUEUE ORDER",
+            "/fairqueue [on|off] :- TAKE TURNS BETWEEN REQUESTERS",
+            "/fairqueue weight [n] :- TRACKS PER TURN FOR REPLIED USER",
+            "/previous :- GO BACK TO THE LAST TRACK",
+            "/replay :- PLAY THE CURRENT TRACK AGAIN"
         ]
     }
 }
\ No newline at end of file
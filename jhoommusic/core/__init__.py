@@ -4,6 +4,7 @@ from .database import db as Database
 from .connection import connection_manager as ConnectionManager
 from .queue import queue_manager as QueueManager
 from .process import process_manager as ProcessManager
+from .assistants import assistant_pool as AssistantPool
 
 __all__ = [
     "app",
@@ -12,5 +13,6 @@ __all__ = [
     "Database",
     "ConnectionManager",
     "QueueManager",
-    "ProcessManager"
+    "ProcessManager",
+    "AssistantPool"
 ]
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from pyrogram import filters
+from .config import Config
+from .database import db
+from .sharding import update_chat_id
+from ..utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+# List name -> (collection, id field)
+ACCESS_LISTS = {
+    "auth": ("auth_users", "user_id"),
+    "gban": ("gbanned_users", "user_id"),
+    "block": ("blocked_users", "user_id"),
+    "blacklist": ("blacklisted_chats", "chat_id")
+}
+
+# Redis channel carrying "<add|remove>:<list>:<id>" changes between instances
+ACCESS_CHANNEL = "jhoommusic:access"
+
+
+class AccessLists:
+    """In-memory copies of the auth, gban, block and chat blacklist collections.
+
+    The sets are loaded once at startup, changed together with MongoDB by
+    the admin commands, and reloaded every ACCESS_RECONCILE_INTERVAL
+    seconds. Other instances hear about changes over Redis pub/sub, so
+    lookups never leave the process.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis if redis is not None else redis_client
+        self.sets: Dict[str, set] = {name: set() for name in ACCESS_LISTS}
+        self._task: Optional[asyncio.Task] = None
+        self._listener = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.total_dropped = 0
+        self.total_reloads = 0
+
+    async def load(self):
+        """Read every list from MongoDB"""
+        if not db.enabled:
+            return
+        for name, (collection, field) in ACCESS_LISTS.items():
+            try:
+                docs = await getattr(db, collection).find({}, {field: 1, "_id": 0}).to_list(None)
+            except Exception as e:
+                logger.error(f"❌ ACCESS: Could not load {collection}: {e}")
+                continue
+            self.sets[name] = {doc[field] for doc in docs if field in doc}
+        self.total_reloads += 1
+        logger.info("🔐 Access lists: " + ", ".join(f"{name} {len(ids)}" for name, ids in self.sets.items()))
+
+    def start(self):
+        """Start periodic reconciliation and listen for changes from other instances"""
+        self._loop = asyncio.get_event_loop()
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+        if self.redis is not None and not self._listener:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{ACCESS_CHANNEL: self._on_message})
+                self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+            except Exception as e:
+                logger.error(f"❌ ACCESS: Could not subscribe to {ACCESS_CHANNEL}: {e}")
+
+    async def stop(self):
+        """Stop reconciliation and the pub/sub listener"""
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.ACCESS_RECONCILE_INTERVAL)
+            await self.load()
+
+    def _on_message(self, message):
+        # Runs on the pub/sub thread
+        try:
+            op, name, value = message['data'].decode().split(":")
+            self._loop.call_soon_threadsafe(self._apply, op, name, int(value))
+        except Exception as e:
+            logger.warning(f"⚠️ ACCESS: Bad invalidation message {message.get('data')!r}: {e}")
+
+    def _apply(self, op: str, name: str, value: int):
+        if name not in self.sets:
+            return
+        if op == "add":
+            self.sets[name].add(value)
+        else:
+            self.sets[name].discard(value)
+
+    async def _publish(self, op: str, name: str, value: int):
+        if self.redis is None:
+            return
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, lambda: self.redis.publish(ACCESS_CHANNEL, f"{op}:{name}:{value}")
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ ACCESS: Could not publish change: {e}")
+
+    # Changes
+
+    async def add(self, name: str, value: int, **fields) -> bool:
+        """Add an id to a list; returns False if it was already there"""
+        collection, field = ACCESS_LISTS[name]
+        if value in self.sets[name]:
+            return False
+        if db.enabled:
+            await getattr(db, collection).update_one(
+                {field: value}, {"$set": {field: value, **fields}}, upsert=True
+            )
+        self.sets[name].add(value)
+        await self._publish("add", name, value)
+        return True
+
+    async def remove(self, name: str, value: int) -> bool:
+        """Remove an id from a list; returns False if it was not there"""
+        collection, field = ACCESS_LISTS[name]
+        if value not in self.sets[name]:
+            return False
+        if db.enabled:
+            await getattr(db, collection).delete_one({field: value})
+        self.sets[name].discard(value)
+        await self._publish("remove", name, value)
+        return True
+
+    # Lookups
+
+    def contains(self, name: str, value: Optional[int]) -> bool:
+        return value is not None and value in self.sets[name]
+
+    def members(self, name: str) -> List[int]:
+        return sorted(self.sets[name])
+
+    def is_denied(self, user_id: Optional[int], chat_id: Optional[int]) -> bool:
+        """Check if a user or chat may not use the bot at all"""
+        if user_id in Config.SUDO_USERS:
+            return False
+        return (
+            self.contains("gban", user_id)
+            or self.contains("block", user_id)
+            or self.contains("blacklist", chat_id)
+        )
+
+    def is_authorized(self, user_id: int) -> bool:
+        if user_id in Config.SUDO_USERS or not db.enabled:
+            return True  # Allow all users when DB is disabled
+        return user_id in self.sets["auth"]
+
+    def get_stats(self) -> Dict:
+        """Get access list statistics"""
+        return {
+            **{name: len(ids) for name, ids in self.sets.items()},
+            "dropped": self.total_dropped,
+            "reloads": self.total_reloads,
+            "listening": self._listener is not None
+        }
+
+# Global access lists instance
+access_lists = AccessLists()
+
+
+async def _allowed(_, __, update) -> bool:
+    user = getattr(update, "from_user", None)
+    if not access_lists.is_denied(user.id if user else None, update_chat_id(update)):
+        return True
+    access_lists.total_dropped += 1
+    return False
+
+
+async def _authorized(_, __, update) -> bool:
+    user = getattr(update, "from_user", None)
+    return bool(user) and access_lists.is_authorized(user.id)
+
+# Filter matching updates from users and chats not banned, blocked or blacklisted
+allowed = filters.create(_allowed, "AllowedByAccessLists")
+
+# Filter matching updates from sudo or authorized users
+authorized = filters.create(_authorized, "AuthorizedUser")
@@ -0,0 +1,135 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from pymongo import UpdateOne
+from .config import Config
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Coalesces user and chat activity into periodic bulk writes.
+
+    Handlers record who used the bot and where without touching MongoDB.
+    A user or chat is only marked dirty when its profile changed or its
+    last write is older than ACTIVITY_TTL seconds, so repeated commands
+    cost nothing; dirty records go out with one ``bulk_write`` per
+    collection every ACTIVITY_FLUSH_INTERVAL seconds and at shutdown.
+    """
+
+    def __init__(self):
+        # (collection, id) -> (profile, monotonic time of last write)
+        self._known: "OrderedDict[Tuple[str, int], Tuple[tuple, float]]" = OrderedDict()
+        self._dirty: Dict[Tuple[str, int], Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_recorded = 0
+        self.total_skipped = 0
+        self.total_written = 0
+
+    def start(self):
+        """Start periodic activity writes"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the write loop and write out pending activity"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.ACTIVITY_FLUSH_INTERVAL)
+            await self.flush()
+
+    # Recording
+
+    def _record(self, collection: str, key_field: str, key: int, profile: Dict, seen_field: str):
+        if not db.enabled:
+            return
+        self.total_recorded += 1
+        ident = (collection, key)
+        fingerprint = tuple(profile.values())
+        known = self._known.get(ident)
+        if known and known[0] == fingerprint and time.monotonic() - known[1] < Config.ACTIVITY_TTL:
+            self._known.move_to_end(ident)
+            self.total_skipped += 1
+            return
+
+        self._dirty[ident] = {key_field: key, **profile, seen_field: datetime.utcnow()}
+        self._known[ident] = (fingerprint, time.monotonic())
+        self._known.move_to_end(ident)
+        while len(self._known) > Config.ACTIVITY_CACHE_SIZE:
+            self._known.popitem(last=False)
+
+    def record_user(self, user):
+        """Note that a user was active"""
+        if not user:
+            return
+        self._record("users", "user_id", user.id, {
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name
+        }, "last_seen")
+
+    def record_chat(self, chat):
+        """Note that a chat was active"""
+        if not chat:
+            return
+        self._record("chats", "chat_id", chat.id, {
+            "title": chat.title,
+            "type": getattr(chat.type, 'value', chat.type),
+            "username": chat.username
+        }, "last_active")
+
+    # Writing
+
+    async def flush(self) -> int:
+        """Write dirty users and chats with one bulk_write per collection"""
+        if not self._dirty or not db.enabled:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+
+        written = 0
+        for collection, key_field in (("users", "user_id"), ("chats", "chat_id")):
+            batch = {ident: doc for ident, doc in dirty.items() if ident[0] == collection}
+            if not batch:
+                continue
+            try:
+                await getattr(db, collection).bulk_write(
+                    [UpdateOne({key_field: doc[key_field]}, {"$set": doc}, upsert=True) for doc in batch.values()],
+                    ordered=False
+                )
+                written += len(batch)
+            except Exception as e:
+                logger.error(f"Error saving {collection} activity to DB: {e}")
+                # Keep newer records recorded meanwhile; retry the rest next time
+                for ident, doc in batch.items():
+                    self._dirty.setdefault(ident, doc)
+                    self._known.pop(ident, None)
+
+        self.total_written += written
+        return written
+
+    def get_stats(self) -> Dict:
+        """Get activity tracking statistics"""
+        return {
+            "pending": len(self._dirty),
+            "known": len(self._known),
+            "recorded": self.total_recorded,
+            "skipped": self.total_skipped,
+            "written": self.total_written
+        }
+
+# Global activity tracker instance
+activity_tracker = ActivityTracker()
@@ -0,0 +1,106 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Tuple
+from pyrogram.enums import ChatMembersFilter
+from .bot import app
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = ("administrator", "creator", "owner")
+
+
+def _status(member) -> str:
+    if not member:
+        return ""
+    status = getattr(member, "status", "")
+    return str(getattr(status, "value", status)).lower()
+
+
+class AdminCache:
+    """Administrators of each chat, fetched with one get_chat_members call.
+
+    A chat's admin list is kept for ADMIN_CACHE_TTL seconds, or until a
+    chat member update touches an admin, so privileged commands and
+    permission checks are answered from memory instead of costing a
+    get_chat_member round-trip each. Concurrent misses share one fetch.
+    """
+
+    def __init__(self):
+        # chat_id -> (expires at, user_id -> ChatMember)
+        self._admins: "OrderedDict[int, Tuple[float, Dict[int, object]]]" = OrderedDict()
+        self._fetching: Dict[int, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def _fetch(self, chat_id: int) -> Dict[int, object]:
+        admins = {}
+        async for member in app.get_chat_members(chat_id, filter=ChatMembersFilter.ADMINISTRATORS):
+            if member.user:
+                admins[member.user.id] = member
+        return admins
+
+    async def get_admins(self, chat_id: int) -> Dict[int, object]:
+        """Administrators of a chat by user id"""
+        cached = self._admins.get(chat_id)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            self._admins.move_to_end(chat_id)
+            return cached[1]
+
+        task = self._fetching.get(chat_id)
+        if task is None:
+            self.misses += 1
+            # Its own task: a cancelled caller must not cancel the fetch for the others
+            task = self._fetching[chat_id] = asyncio.create_task(self._load(chat_id))
+        return await asyncio.shield(task)
+
+    async def _load(self, chat_id: int) -> Dict[int, object]:
+        try:
+            admins = await self._fetch(chat_id)
+        except Exception as e:
+            logger.warning(f"⚠️ ADMINS: Could not fetch admins of {chat_id}: {e}")
+            return {}  # not cached, the next check tries again
+        finally:
+            self._fetching.pop(chat_id, None)
+        self._admins[chat_id] = (time.monotonic() + Config.ADMIN_CACHE_TTL, admins)
+        self._admins.move_to_end(chat_id)
+        while len(self._admins) > Config.ADMIN_CACHE_SIZE:
+            self._admins.popitem(last=False)
+        return admins
+
+    async def is_admin(self, chat_id: int, user_id: int) -> bool:
+        """Check if a user administers a chat"""
+        return user_id in await self.get_admins(chat_id)
+
+    async def bot_member(self, chat_id: int):
+        """The bot's own member entry in a chat, if it is an admin there"""
+        admins = await self.get_admins(chat_id)
+        return admins.get(app.me.id) if app.me else None
+
+    def invalidate(self, chat_id: int):
+        """Forget a chat's admins"""
+        if self._admins.pop(chat_id, None):
+            self.invalidations += 1
+
+    def on_member_updated(self, update):
+        """Drop a chat's admins when someone is promoted, demoted or an admin leaves"""
+        old, new = update.old_chat_member, update.new_chat_member
+        if _status(old) in ADMIN_STATUSES or _status(new) in ADMIN_STATUSES:
+            self.invalidate(update.chat.id)
+
+    def get_stats(self) -> Dict:
+        """Get admin cache statistics"""
+        return {
+            "chats": len(self._admins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
+
+# Global admin cache instance
+admin_cache = AdminCache()
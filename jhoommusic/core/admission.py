@@ -0,0 +1,209 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Global admission control for concurrent streams on this host.
+
+    Capacity is measured in stream units; a video stream costs more than an
+    audio stream. Chats that already hold a slot keep it across tracks, new
+    chats wait in a FIFO queue (one entry per chat) until units free up.
+    """
+
+    def __init__(self, capacity: int = None):
+        # STREAM_CAPACITY is per host; shards split it
+        self.capacity = capacity or max(1, Config.STREAM_CAPACITY // Config.SHARD_COUNT)
+        self.admitted: Dict[int, int] = {}
+        self.waiting: "OrderedDict[int, Dict]" = OrderedDict()
+        self.accepting = True
+
+        # Average time a chat holds its slot, for wait estimates
+        self._admitted_at: Dict[int, float] = {}
+        self._avg_hold = float(Config.ADMISSION_DEFAULT_HOLD)
+
+        # Counters
+        self.total_admitted = 0
+        self.total_rejected = 0
+
+    @staticmethod
+    def stream_cost(video: bool) -> int:
+        """Units used by one stream"""
+        return Config.VIDEO_STREAM_COST if video else Config.AUDIO_STREAM_COST
+
+    @property
+    def used(self) -> int:
+        return sum(self.admitted.values())
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.used
+
+    def is_admitted(self, chat_id: int) -> bool:
+        """Check if chat holds a slot"""
+        return chat_id in self.admitted
+
+    def _needed(self, chat_id: int, entry: Dict) -> int:
+        """Extra units a waiter needs (admitted chats only need the difference)"""
+        return max(0, entry['cost'] - self.admitted.get(chat_id, 0))
+
+    def _grant(self, chat_id: int, cost: int):
+        if chat_id not in self.admitted:
+            self._admitted_at[chat_id] = time.monotonic()
+            self.total_admitted += 1
+        self.admitted[chat_id] = cost
+
+    def estimate_wait(self, position: int) -> int:
+        """Estimate seconds until the waiter at ``position`` is admitted"""
+        units_ahead = sum(
+            self._needed(chat_id, entry)
+            for chat_id, entry in list(self.waiting.items())[:position + 1]
+        )
+        missing = max(0, units_ahead - self.free)
+        if missing == 0:
+            return 0
+        # Admitted slots turn over roughly every average hold time
+        turnover_per_second = max(1, self.used) / max(1.0, self._avg_hold)
+        return int(missing / turnover_per_second)
+
+    async def acquire(
+        self,
+        chat_id: int,
+        video: bool = False,
+        on_queued: Optional[Callable[[int, int], Awaitable]] = None
+    ) -> bool:
+        """Admit a stream for a chat, waiting in queue if the host is full"""
+        cost = self.stream_cost(video)
+
+        if not self.accepting:
+            self.total_rejected += 1
+            return False
+
+        # Already admitted chats are protected; they may only grow if units are free
+        current = self.admitted.get(chat_id)
+        if current is not None:
+            if cost <= current:
+                return True
+            if cost - current <= self.free:
+                self.admitted[chat_id] = cost
+                return True
+
+        elif not self.waiting and cost <= self.free:
+            self._grant(chat_id, cost)
+            return True
+
+        # Per-chat fairness: a chat holds at most one place in line
+        entry = self.waiting.get(chat_id)
+        if entry is None:
+            entry = {
+                'cost': cost,
+                'future': asyncio.get_event_loop().create_future(),
+                'queued_at': time.monotonic(),
+                'previous': current,  # units held before growing, if any
+                'waiters': 0
+            }
+            self.waiting[chat_id] = entry
+        else:
+            entry['cost'] = max(entry['cost'], cost)
+
+        position = list(self.waiting.keys()).index(chat_id)
+        eta = self.estimate_wait(position)
+        logger.info(f"⏳ ADMISSION: {chat_id} queued at #{position + 1} (~{eta}s)")
+        if on_queued:
+            try:
+                await on_queued(position + 1, eta)
+            except Exception as e:
+                logger.warning(f"⚠️ ADMISSION: Queue notification failed: {e}")
+
+        entry['waiters'] += 1
+        try:
+            granted = await asyncio.wait_for(
+                asyncio.shield(entry['future']), timeout=Config.ADMISSION_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            entry['waiters'] -= 1
+            # Later callers of the same chat keep its place until they time out too
+            if not entry['waiters']:
+                self._abandon(chat_id, entry)
+            self.total_rejected += 1
+            logger.warning(f"⚠️ ADMISSION: {chat_id} timed out waiting for capacity")
+            return False
+        except asyncio.CancelledError:
+            entry['waiters'] -= 1
+            if not entry['waiters']:
+                self._abandon(chat_id, entry)
+            raise
+        entry['waiters'] -= 1
+        return granted
+
+    def _abandon(self, chat_id: int, entry: Dict):
+        """Undo the wait of a chat whose callers all gave up"""
+        if self.waiting.get(chat_id) is entry:
+            del self.waiting[chat_id]
+            self._drain_waiters()  # chats behind it may fit now
+            return
+        future = entry['future']
+        if not (future.done() and not future.cancelled() and future.result()):
+            return
+        # Granted while the caller was being cancelled; nobody else will give it back
+        if entry['previous'] is None:
+            self.release(chat_id)
+        elif chat_id in self.admitted:
+            self.admitted[chat_id] = entry['previous']
+            self._drain_waiters()
+
+    def stop_accepting(self):
+        """Refuse new streams and turn away everyone waiting (drain mode)"""
+        self.accepting = False
+        for entry in self.waiting.values():
+            if not entry['future'].done():
+                entry['future'].set_result(False)
+        self.waiting.clear()
+        logger.info("🚧 ADMISSION: No longer accepting streams")
+
+    def release(self, chat_id: int):
+        """Release the slot held by a chat"""
+        if self.admitted.pop(chat_id, None) is None:
+            return
+
+        admitted_at = self._admitted_at.pop(chat_id, None)
+        if admitted_at is not None:
+            held = time.monotonic() - admitted_at
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+
+        self._drain_waiters()
+
+    def _drain_waiters(self):
+        """Admit queued chats in FIFO order while they fit"""
+        while self.waiting:
+            chat_id, entry = next(iter(self.waiting.items()))
+            if self._needed(chat_id, entry) > self.free:
+                break
+            del self.waiting[chat_id]
+            if entry['future'].done():
+                continue
+            self._grant(chat_id, entry['cost'])
+            entry['future'].set_result(True)
+            logger.info(f"✅ ADMISSION: {chat_id} admitted after {time.monotonic() - entry['queued_at']:.1f}s")
+
+    def get_utilization(self) -> Dict:
+        """Get live utilization"""
+        used = self.used
+        return {
+            "capacity": self.capacity,
+            "used": used,
+            "percent": round(100 * used / self.capacity, 1) if self.capacity else 0.0,
+            "streams": len(self.admitted),
+            "waiting": len(self.waiting),
+            "admitted_total": self.total_admitted,
+            "rejected_total": self.total_rejected,
+            "accepting": self.accepting
+        }
+
+# Global admission controller instance
+admission_controller = AdmissionController()
@@ -0,0 +1,197 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+from pyrogram.errors import FloodWait, Unauthorized
+from .bot import app, tgcaller, assistant_clients, assistant_callers
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Error texts that point at the account or its connection rather than the chat
+# (TgCaller re-raises some Telegram errors wrapped in its own exceptions)
+ACCOUNT_ERRORS = ("AUTH_KEY", "SESSION_REVOKED", "USER_DEACTIVATED", "FLOOD", "CONNECTION")
+
+
+def is_assistant_error(error) -> bool:
+    """Whether an error says the assistant itself is unusable
+
+    Errors about the chat (no active voice chat, missing rights, a slow
+    probe) would fail with any assistant, so they must not count.
+    """
+    if error is None or isinstance(error, asyncio.TimeoutError):
+        return False
+    if isinstance(error, (Unauthorized, FloodWait, ConnectionError)):
+        return True
+    text = str(error).upper()
+    return any(code in text for code in ACCOUNT_ERRORS)
+
+
+class Assistant:
+    """One voice account with its own TgCaller"""
+
+    def __init__(self, index: int, caller, client=None, name: str = None):
+        self.index = index
+        self.caller = caller
+        self.client = client
+        self.name = name or f"assistant-{index}"
+        self.calls: Set[int] = set()
+        self.failures = 0
+        self.down_until = 0.0
+        self.total_failovers = 0
+
+    @property
+    def load(self) -> int:
+        return len(self.calls)
+
+    def is_available(self) -> bool:
+        if self.down_until > time.monotonic():
+            return False
+        if Config.ASSISTANT_MAX_CALLS and self.load >= Config.ASSISTANT_MAX_CALLS:
+            return False
+        return True
+
+
+class AssistantPool:
+    """Schedules chats onto a pool of assistant accounts.
+
+    A chat sticks to the assistant it was first given; new chats go to the
+    least-loaded available assistant. An assistant that keeps failing is
+    taken out of rotation for a cooldown and its chats fail over on their
+    next join.
+    """
+
+    def __init__(self):
+        self.assistants: List[Assistant] = []
+        self.assignments: Dict[int, int] = {}
+
+    def add(self, caller, client=None, name: str = None) -> Assistant:
+        """Add an assistant to the pool"""
+        assistant = Assistant(len(self.assistants), caller, client, name)
+        self.assistants.append(assistant)
+        return assistant
+
+    async def start(self):
+        """Start every assistant's client and TgCaller"""
+        for assistant in self.assistants:
+            try:
+                if assistant.client and not assistant.client.is_connected:
+                    await assistant.client.start()
+                await assistant.caller.start()
+                logger.info(f"✅ {assistant.name} started")
+            except Exception as e:
+                assistant.down_until = time.monotonic() + Config.ASSISTANT_COOLDOWN
+                logger.error(f"❌ {assistant.name} failed to start: {e}")
+
+    async def stop(self):
+        """Stop every assistant's TgCaller and client"""
+        for assistant in self.assistants:
+            try:
+                await assistant.caller.stop()
+                if assistant.index > 0 and assistant.client and assistant.client.is_connected:
+                    await assistant.client.stop()
+            except Exception as e:
+                logger.error(f"❌ Error stopping {assistant.name}: {e}")
+
+    def _pick(self, exclude: Set[int] = ()) -> Optional[Assistant]:
+        candidates = [
+            a for a in self.assistants
+            if a.index not in exclude and a.is_available()
+        ]
+        if not candidates:
+            # Everyone is down or full: fall back to the least-loaded non-excluded one
+            candidates = [a for a in self.assistants if a.index not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda a: (a.load, a.failures, a.index))
+
+    def assistant_for(self, chat_id: int) -> Assistant:
+        """Get the assistant serving a chat, assigning one if needed"""
+        index = self.assignments.get(chat_id)
+        if index is not None:
+            assistant = self.assistants[index]
+            # Sticky unless it went down while the chat was not in a call
+            if chat_id in assistant.calls or assistant.down_until <= time.monotonic():
+                return assistant
+
+        assistant = self._pick()
+        if assistant is None:
+            raise RuntimeError("No assistants configured")
+        if index is not None and index != assistant.index:
+            assistant.total_failovers += 1
+            logger.warning(f"🔀 ASSISTANTS: {chat_id} failed over {self.assistants[index].name} → {assistant.name}")
+        self.assignments[chat_id] = assistant.index
+        return assistant
+
+    def get_caller(self, chat_id: int):
+        """Get the TgCaller serving a chat"""
+        return self.assistant_for(chat_id).caller
+
+    def reassign(self, chat_id: int, exclude: Set[int]) -> Optional[Assistant]:
+        """Move a chat to another assistant, skipping ``exclude``"""
+        assistant = self._pick(exclude)
+        if assistant is None:
+            return None
+        previous = self.assignments.get(chat_id)
+        if previous is not None and previous != assistant.index:
+            self.assistants[previous].calls.discard(chat_id)
+            assistant.total_failovers += 1
+            logger.warning(f"🔀 ASSISTANTS: {chat_id} failed over to {assistant.name}")
+        self.assignments[chat_id] = assistant.index
+        return assistant
+
+    def mark_joined(self, chat_id: int):
+        """Record that a chat's assistant is in its call"""
+        assistant = self.assistants[self.assignments[chat_id]]
+        assistant.calls.add(chat_id)
+        assistant.failures = 0
+
+    def mark_left(self, chat_id: int):
+        """Record that a chat's assistant left its call"""
+        index = self.assignments.get(chat_id)
+        if index is not None:
+            self.assistants[index].calls.discard(chat_id)
+
+    def report_failure(self, chat_id: int, error: Exception = None):
+        """Count a failed call operation against the chat's assistant
+
+        Only account and transport errors count; see ``is_assistant_error``.
+        """
+        index = self.assignments.get(chat_id)
+        if index is None or not is_assistant_error(error):
+            return
+        assistant = self.assistants[index]
+        assistant.failures += 1
+        if assistant.failures >= Config.ASSISTANT_MAX_FAILURES:
+            assistant.down_until = time.monotonic() + Config.ASSISTANT_COOLDOWN
+            assistant.failures = 0
+            logger.error(
+                f"❌ ASSISTANTS: {assistant.name} taken out of rotation for "
+                f"{Config.ASSISTANT_COOLDOWN}s ({error})"
+            )
+
+    def get_stats(self) -> List[Dict]:
+        """Get per-assistant load"""
+        now = time.monotonic()
+        return [
+            {
+                "name": a.name,
+                "calls": a.load,
+                "assigned": sum(1 for index in self.assignments.values() if index == a.index),
+                "failures": a.failures,
+                "down": a.down_until > now,
+                "failovers": a.total_failovers
+            }
+            for a in self.assistants
+        ]
+
+
+def _build_pool() -> AssistantPool:
+    pool = AssistantPool()
+    pool.add(tgcaller, app, "main")
+    for client, caller in zip(assistant_clients, assistant_callers):
+        pool.add(caller, client, client.name)
+    return pool
+
+# Global assistant pool instance
+assistant_pool = _build_pool()
@@ -37,22 +37,46 @@ if not Config.validate():
 
 logger.info("🎵 Initializing JhoomMusic Bot...")
 
+# Every shard needs its own session file
+SESSION_SUFFIX = f"-shard{Config.SHARD_ID}" if Config.SHARD_COUNT > 1 else ""
+
 # Initialize Pyrogram client WITHOUT plugins (we'll register manually)
 app = Client(
-    "JhoomMusicBot",
+    f"JhoomMusicBot{SESSION_SUFFIX}",
     api_id=Config.API_ID,
     api_hash=Config.API_HASH,
     bot_token=Config.BOT_TOKEN
 )
 
+# FFmpeg settings shared by every TgCaller
+FFMPEG_PARAMETERS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+    'options': '-vn -preset ultrafast -tune zerolatency'
+}
+
 # Initialize TgCaller
 tgcaller = TgCaller(
     app, 
     log_level=logging.INFO,
-    ffmpeg_parameters={
-        'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-        'options': '-vn -preset ultrafast -tune zerolatency'
-    }
+    ffmpeg_parameters=FFMPEG_PARAMETERS
 )
 
-logger.info("✅ Bot and TgCaller initialized successfully")
\ No newline at end of file
+# Extra assistant accounts, each with its own TgCaller
+assistant_clients = []
+assistant_callers = []
+# Each account logs in on exactly one shard; the same session on two shards
+# gets AUTH_KEY_DUPLICATED. With fewer accounts than shards some shards get none.
+sessions = list(enumerate(Config.ASSISTANT_SESSIONS, 1))[Config.SHARD_ID::Config.SHARD_COUNT]
+if Config.ASSISTANT_SESSIONS and not sessions:
+    logger.warning(f"⚠️ No assistant session left for shard {Config.SHARD_ID}, playing with the bot only")
+for i, session in sessions:
+    client = Client(
+        f"JhoomAssistant{i}{SESSION_SUFFIX}",
+        api_id=Config.API_ID,
+        api_hash=Config.API_HASH,
+        session_string=session
+    )
+    assistant_clients.append(client)
+    assistant_callers.append(TgCaller(client, log_level=logging.INFO, ffmpeg_parameters=FFMPEG_PARAMETERS))
+
+logger.info(f"✅ Bot and TgCaller initialized successfully ({len(assistant_callers)} extra assistants)")
\ No newline at end of file
@@ -0,0 +1,291 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Tuple
+from bson import ObjectId
+from pyrogram.errors import FloodWait
+from .bot import app
+from .config import Config
+from .database import db
+from .access import access_lists
+from ..utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Target -> (collection, id field)
+BROADCAST_TARGETS = {
+    "chats": ("chats", "chat_id"),
+    "users": ("users", "user_id")
+}
+
+# Command flags -> job options
+BROADCAST_FLAGS = ("-pin", "-pinloud", "-user", "-nobot")
+
+
+def parse_broadcast(text: str) -> Tuple[Dict, str]:
+    """Split ``/broadcast [flags] message`` into job options and the message"""
+    parts = (text or "").split(None, 1)
+    rest = parts[1] if len(parts) > 1 else ""
+    flags = set()
+    while rest:
+        head, _, tail = rest.partition(" ")
+        if head.lower() not in BROADCAST_FLAGS:
+            break
+        flags.add(head.lower())
+        rest = tail.lstrip(" ")
+
+    targets = [] if "-nobot" in flags else ["chats"]
+    if "-user" in flags:
+        targets.append("users")
+    options = {
+        "targets": targets,
+        "pin": "-pin" in flags or "-pinloud" in flags,
+        "pin_loud": "-pinloud" in flags
+    }
+    return options, rest
+
+
+class _Watermark:
+    """Highest recipient id below which every send has finished.
+
+    Sends complete out of order; resuming from the watermark repeats at
+    most BROADCAST_CONCURRENCY recipients and never skips one.
+    """
+
+    def __init__(self, start=None):
+        self.value = start
+        self._order = deque()
+        self._finished = set()
+
+    def dispatched(self, recipient: int):
+        self._order.append(recipient)
+
+    def finished(self, recipient: int):
+        self._finished.add(recipient)
+        while self._order and self._order[0] in self._finished:
+            self._finished.discard(self._order[0])
+            self.value = self._order.popleft()
+
+
+class BroadcastEngine:
+    """Sends broadcast jobs to every chat and/or user, resumably.
+
+    Recipients are streamed from a MongoDB cursor in id order and sent to
+    by at most BROADCAST_CONCURRENCY tasks, all drawing from one token
+    bucket that backs off on FloodWait. Job progress (per target, the id
+    every earlier recipient has been handled up to) is checkpointed in
+    broadcast_jobs, so jobs still running at shutdown continue on the next
+    start.
+    """
+
+    def __init__(self, api=None, database=None):
+        self.api = api or app
+        self.db = database or db
+        self.bucket = TokenBucket(Config.BROADCAST_RATE, min_rate=Config.BROADCAST_MIN_RATE)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.jobs: Dict[str, Dict] = {}
+
+    async def create(self, created_by: int, text: str = None, source: Dict = None,
+                     targets: List[str] = None, pin: bool = False, pin_loud: bool = False,
+                     progress: Dict = None) -> str:
+        """Store a new job and start sending it"""
+        job = {
+            "_id": ObjectId(),
+            "text": text,
+            "source": source,  # {"chat_id", "message_id"} to copy instead of text
+            "targets": targets or ["chats"],
+            "pin": pin,
+            "pin_loud": pin_loud,
+            "progress_message": progress,  # {"chat_id", "message_id"} to edit
+            "checkpoint": {},
+            "sent": 0,
+            "failed": 0,
+            "status": "running",
+            "created_by": created_by,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+        await self.db.broadcast_jobs.insert_one(job)
+        self._launch(job)
+        return str(job["_id"])
+
+    async def resume(self) -> int:
+        """Continue jobs that were running when the bot stopped"""
+        jobs = await self.db.broadcast_jobs.find({"status": "running"}).to_list(None)
+        for job in jobs:
+            if str(job["_id"]) not in self.tasks:
+                logger.info(f"📢 Resuming broadcast {job['_id']} ({job['sent']} sent)")
+                self._launch(job)
+        return len(jobs)
+
+    def _launch(self, job: Dict):
+        job_id = str(job["_id"])
+        self.jobs[job_id] = job
+        task = self.tasks[job_id] = asyncio.create_task(self._run(job))
+        task.add_done_callback(lambda _: self.tasks.pop(job_id, None))
+
+    async def cancel(self, job_id: str = None) -> bool:
+        """Cancel a running job (the latest one if no id is given)"""
+        job_id = job_id or next(reversed(self.tasks), None)
+        job = self.jobs.get(job_id)
+        if not job or job["status"] != "running":
+            return False
+        job["status"] = "cancelled"
+        return True
+
+    async def stop(self):
+        """Stop sending; running jobs resume on the next start"""
+        for task in list(self.tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    # Sending
+
+    async def _run(self, job: Dict):
+        semaphore = asyncio.Semaphore(Config.BROADCAST_CONCURRENCY)
+        pending = set()
+        target = watermark = None
+        last_progress = time.monotonic()
+        try:
+            for target in job["targets"]:
+                collection, field = BROADCAST_TARGETS[target]
+                watermark = _Watermark(job["checkpoint"].get(target))
+                query = {field: {"$gt": watermark.value}} if watermark.value is not None else {}
+                cursor = getattr(self.db, collection).find(query, {field: 1, "_id": 0}).sort(field, 1)
+
+                unsaved = 0
+                async for doc in cursor:
+                    if job["status"] != "running":
+                        break
+                    recipient = doc.get(field)
+                    if recipient is None:
+                        continue
+                    # Skip blacklisted chats and gbanned or blocked users
+                    if access_lists.is_denied(*((recipient, None) if target == "users" else (None, recipient))):
+                        continue
+                    await semaphore.acquire()
+                    watermark.dispatched(recipient)
+                    task = asyncio.create_task(self._deliver(job, recipient, semaphore, watermark))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+
+                    unsaved += 1
+                    if unsaved >= Config.BROADCAST_CHECKPOINT_EVERY:
+                        unsaved = 0
+                        job["checkpoint"][target] = watermark.value
+                        await self._checkpoint(job)
+                    if time.monotonic() - last_progress >= Config.BROADCAST_PROGRESS_INTERVAL:
+                        last_progress = time.monotonic()
+                        await self._report(job)
+
+                if pending:
+                    await asyncio.gather(*pending)
+                job["checkpoint"][target] = watermark.value
+                if job["status"] != "running":
+                    break
+
+            if job["status"] == "running":
+                job["status"] = "done"
+            job["finished_at"] = datetime.utcnow()
+            await self._checkpoint(job)
+            await self._report(job)
+            logger.info(f"📢 Broadcast {job['_id']} {job['status']}: {job['sent']} sent, {job['failed']} failed")
+        except asyncio.CancelledError:
+            # Shutting down: keep the job running so it resumes from here.
+            # Cancelled sends don't move the watermark, so they are retried.
+            for task in pending:
+                task.cancel()
+            if watermark is not None:
+                job["checkpoint"][target] = watermark.value
+            await self._checkpoint(job)
+            raise
+        except Exception as e:
+            logger.error(f"❌ Broadcast {job['_id']} failed: {e}")
+            job["status"] = "failed"
+            await self._checkpoint(job)
+            await self._report(job)
+
+    async def _deliver(self, job: Dict, recipient: int, semaphore: asyncio.Semaphore, watermark: _Watermark):
+        try:
+            sent = await self._send(job, recipient)
+            # Settled either way; a cancel from here on must not send it again
+            watermark.finished(recipient)
+            if sent is not None and job["pin"]:
+                await self._pin(job, recipient, sent)
+        finally:
+            semaphore.release()
+
+    async def _send(self, job: Dict, recipient: int):
+        """Send the job's message to one recipient; None if it failed"""
+        for _ in range(Config.BROADCAST_RETRIES + 1):
+            await self.bucket.acquire()
+            try:
+                if job.get("source"):
+                    sent = await self.api.copy_message(
+                        recipient, job["source"]["chat_id"], job["source"]["message_id"]
+                    )
+                else:
+                    sent = await self.api.send_message(recipient, job["text"])
+            except FloodWait as e:
+                self.bucket.penalize(e.value)
+                continue
+            except Exception as e:
+                logger.debug(f"Broadcast to {recipient} failed: {e}")
+                break
+
+            self.bucket.reward()
+            job["sent"] += 1
+            return sent
+        job["failed"] += 1
+        return None
+
+    async def _pin(self, job: Dict, recipient: int, sent):
+        await self.bucket.acquire()
+        try:
+            await self.api.pin_chat_message(recipient, sent.id, disable_notification=not job["pin_loud"])
+        except FloodWait as e:
+            self.bucket.penalize(e.value)
+        except Exception:
+            pass  # no rights to pin there
+
+    # Progress
+
+    async def _checkpoint(self, job: Dict):
+        job["updated_at"] = datetime.utcnow()
+        try:
+            await self.db.broadcast_jobs.update_one({"_id": job["_id"]}, {"$set": {
+                key: job.get(key)
+                for key in ("checkpoint", "sent", "failed", "status", "updated_at", "finished_at")
+            }})
+        except Exception as e:
+            logger.error(f"❌ Could not checkpoint broadcast {job['_id']}: {e}")
+
+    async def _report(self, job: Dict):
+        where = job.get("progress_message")
+        if not where:
+            return
+        title = {
+            "running": "📢 **Broadcasting...**",
+            "done": "📢 **Broadcast completed!**",
+            "cancelled": "🛑 **Broadcast cancelled**",
+            "failed": "❌ **Broadcast stopped on an error**"
+        }.get(job["status"], "📢 **Broadcast**")
+        try:
+            await self.api.edit_message_text(
+                where["chat_id"], where["message_id"],
+                f"{title}\n**Success:** {job['sent']}\n**Failed:** {job['failed']}"
+            )
+        except Exception:
+            pass
+
+    def get_stats(self) -> Dict:
+        """Get broadcast statistics"""
+        return {
+            "running": len(self.tasks),
+            "bucket": self.bucket.get_stats()
+        }
+
+# Global broadcast engine instance
+broadcast_engine = BroadcastEngine()
@@ -0,0 +1,241 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from .config import Config
+from .database import db
+from ..utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "chatstate:{}"
+
+
+def deep_size(value, _seen: set = None) -> int:
+    """Approximate memory held by a (JSON-like) value"""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)) or type(value).__name__ == "deque":
+        size += sum(deep_size(item, seen) for item in value)
+    return size
+
+
+class ChatStateRegistry:
+    """Keeps per-chat in-memory state within a memory budget.
+
+    Modules holding per-chat state register as providers with
+    ``export_chat_state(chat_id) -> Optional[Dict]`` (what cannot be rebuilt
+    from the database), ``import_chat_state(chat_id, state)``,
+    ``evict_chat_state(chat_id)``, ``chat_state_busy(chat_id) -> bool`` and
+    ``chat_state_size(chat_id) -> int`` (bytes held). Chats untouched for CHAT_STATE_IDLE
+    seconds, and the least recently used ones while the estimate is above
+    CHAT_STATE_BUDGET_MB, are exported to Redis (or MongoDB) and dropped from
+    memory; the next ``ensure`` of that chat brings the state back.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis if redis is not None else redis_client
+        self.providers: Dict[str, object] = {}
+        self.last_access: "OrderedDict[int, float]" = OrderedDict()
+        self.sizes: Dict[int, int] = {}
+        self._dirty: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_evicted = 0
+        self.total_restored = 0
+
+    def register(self, name: str, provider):
+        """Add a module that keeps per-chat state"""
+        self.providers[name] = provider
+
+    @property
+    def backend(self) -> Optional[str]:
+        if self.redis is not None:
+            return "redis"
+        return "mongo" if db.enabled else None
+
+    def start(self):
+        """Start the eviction sweep"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"🗄️ Chat state budget: {Config.CHAT_STATE_BUDGET_MB} MB ({self.backend or 'no store'})")
+
+    async def stop(self):
+        """Stop the eviction sweep"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.CHAT_STATE_SWEEP_INTERVAL)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"❌ CHAT STATE: Sweep error: {e}")
+
+    # Access
+
+    def touch(self, chat_id: int):
+        """Mark a resident chat as used"""
+        self.last_access[chat_id] = time.monotonic()
+        self.last_access.move_to_end(chat_id)
+        self._dirty.add(chat_id)
+
+    async def ensure(self, chat_id: int):
+        """Make sure a chat's state is in memory, restoring it if it was evicted"""
+        if chat_id in self.last_access:
+            self.touch(chat_id)
+            return
+        self.touch(chat_id)
+        state = await self._load(chat_id)
+        if not state:
+            return
+        for name, provider in self.providers.items():
+            if name in state:
+                try:
+                    provider.import_chat_state(chat_id, state[name])
+                except Exception as e:
+                    logger.error(f"❌ CHAT STATE: Restore of {name} failed for {chat_id}: {e}")
+        self.total_restored += 1
+        await self._delete(chat_id)
+
+    # Eviction
+
+    def _busy(self, chat_id: int) -> bool:
+        return any(provider.chat_state_busy(chat_id) for provider in self.providers.values())
+
+    def _size(self, chat_id: int) -> int:
+        return sum(provider.chat_state_size(chat_id) for provider in self.providers.values())
+
+    def _measure(self):
+        for chat_id in self._dirty:
+            if chat_id in self.last_access:
+                self.sizes[chat_id] = self._size(chat_id)
+        self._dirty.clear()
+
+    async def sweep(self) -> int:
+        """Evict idle chats, then least recently used ones while over budget"""
+        self._measure()
+        budget = Config.CHAT_STATE_BUDGET_MB * 1024 * 1024
+        cutoff = time.monotonic() - Config.CHAT_STATE_IDLE
+        used = sum(self.sizes.values())
+
+        evicted = 0
+        for chat_id, accessed in list(self.last_access.items()):
+            if accessed > cutoff and used <= budget:
+                break  # the rest are newer, and we are within budget
+            if self._busy(chat_id):
+                continue
+            if await self.evict(chat_id):
+                used -= self.sizes.pop(chat_id, 0)
+                evicted += 1
+
+        if evicted:
+            logger.info(f"🗄️ CHAT STATE: Evicted {evicted} chats, ~{used / 1024 / 1024:.1f} MB resident")
+        return evicted
+
+    async def evict(self, chat_id: int) -> bool:
+        """Store a chat's state and drop it from memory"""
+        state = {}
+        for name, provider in self.providers.items():
+            exported = provider.export_chat_state(chat_id)
+            if exported:
+                state[name] = exported
+
+        if state:
+            if not self.backend:
+                return False  # nowhere to keep it
+            try:
+                await self._save(chat_id, state)
+            except Exception as e:
+                logger.error(f"❌ CHAT STATE: Could not store {chat_id}: {e}")
+                return False
+
+        for provider in self.providers.values():
+            provider.evict_chat_state(chat_id)
+        self.last_access.pop(chat_id, None)
+        self._dirty.discard(chat_id)
+        self.total_evicted += 1
+        return True
+
+    # Storage
+
+    async def _call(self, func, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+    async def _save(self, chat_id: int, state: Dict):
+        if self.backend == "redis":
+            await self._call(
+                self.redis.set, STATE_KEY.format(chat_id), json.dumps(state, default=str),
+                ex=Config.CHAT_STATE_RETENTION
+            )
+        else:
+            await db.chat_state.replace_one(
+                {"chat_id": chat_id},
+                {"chat_id": chat_id, "state": json.dumps(state, default=str), "saved_at": datetime.utcnow()},
+                upsert=True
+            )
+
+    async def _load(self, chat_id: int) -> Optional[Dict]:
+        try:
+            if self.backend == "redis":
+                raw = await self._call(self.redis.get, STATE_KEY.format(chat_id))
+            elif self.backend == "mongo":
+                doc = await db.chat_state.find_one({"chat_id": chat_id})
+                raw = doc and doc['state']
+            else:
+                return None
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.error(f"❌ CHAT STATE: Could not load {chat_id}: {e}")
+            return None
+
+    async def _delete(self, chat_id: int):
+        try:
+            if self.backend == "redis":
+                await self._call(self.redis.delete, STATE_KEY.format(chat_id))
+            elif self.backend == "mongo":
+                await db.chat_state.delete_one({"chat_id": chat_id})
+        except Exception as e:
+            logger.warning(f"⚠️ CHAT STATE: Could not delete stored state of {chat_id}: {e}")
+
+    # Reporting
+
+    def memory_for(self, chat_id: int) -> int:
+        """Estimated bytes of in-memory state of a chat"""
+        if chat_id in self._dirty or chat_id not in self.sizes:
+            self.sizes[chat_id] = self._size(chat_id)
+        return self.sizes[chat_id]
+
+    def top_chats(self, limit: int = 5) -> List[Dict]:
+        """Chats holding the most state"""
+        largest = sorted(self.sizes.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{"chat_id": chat_id, "bytes": size} for chat_id, size in largest]
+
+    def get_stats(self) -> Dict:
+        """Get chat state statistics"""
+        return {
+            "resident": len(self.last_access),
+            "bytes": sum(self.sizes.values()),
+            "budget_bytes": Config.CHAT_STATE_BUDGET_MB * 1024 * 1024,
+            "evicted": self.total_evicted,
+            "restored": self.total_restored,
+            "top": self.top_chats()
+        }
+
+# Global chat state registry instance
+chat_state = ChatStateRegistry()
@@ -38,6 +38,119 @@ class Config:
     MAX_HISTORY_SIZE: int = int(os.getenv("MAX_HISTORY_SIZE", "20"))
     MAX_THUMBNAIL_CACHE: int = int(os.getenv("MAX_THUMBNAIL_CACHE", "100"))
     
+    # Pipe Buffer Settings (jitter buffer between FFmpeg and TgCaller)
+    PIPE_CHUNK_MS: int = int(os.getenv("PIPE_CHUNK_MS", "20"))
+    JITTER_BUFFER_DEPTH: int = int(os.getenv("JITTER_BUFFER_DEPTH", "50"))
+    JITTER_BUFFER_PREFILL: int = int(os.getenv("JITTER_BUFFER_PREFILL", "10"))
+    
+    # Load-adaptive Transcoding
+    LOAD_SAMPLE_INTERVAL: float = float(os.getenv("LOAD_SAMPLE_INTERVAL", "5"))
+    LOAD_MEDIUM_PERCENT: float = float(os.getenv("LOAD_MEDIUM_PERCENT", "60"))
+    LOAD_HIGH_PERCENT: float = float(os.getenv("LOAD_HIGH_PERCENT", "75"))
+    LOAD_CRITICAL_PERCENT: float = float(os.getenv("LOAD_CRITICAL_PERCENT", "90"))
+    MAX_VIDEO_PROFILE: str = os.getenv("MAX_VIDEO_PROFILE", "medium")
+    
+    # Stream Admission Control (capacity in stream units)
+    STREAM_CAPACITY: int = int(os.getenv("STREAM_CAPACITY", "60"))
+    AUDIO_STREAM_COST: int = int(os.getenv("AUDIO_STREAM_COST", "1"))
+    VIDEO_STREAM_COST: int = int(os.getenv("VIDEO_STREAM_COST", "4"))
+    ADMISSION_TIMEOUT: float = float(os.getenv("ADMISSION_TIMEOUT", "120"))
+    ADMISSION_DEFAULT_HOLD: float = float(os.getenv("ADMISSION_DEFAULT_HOLD", "600"))
+    
+    # Per-chat Resource Accounting
+    RESOURCE_SAMPLE_INTERVAL: float = float(os.getenv("RESOURCE_SAMPLE_INTERVAL", "10"))
+    FAIR_SHARE_FACTOR: float = float(os.getenv("FAIR_SHARE_FACTOR", "3.0"))
+    FAIR_SHARE_MIN_CPU: float = float(os.getenv("FAIR_SHARE_MIN_CPU", "25"))
+    FAIR_SHARE_STRIKES: int = int(os.getenv("FAIR_SHARE_STRIKES", "3"))
+    THROTTLE_NICE: int = int(os.getenv("THROTTLE_NICE", "10"))
+    
+    # Voice Connection Health Probes
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+    HEALTH_PROBE_CONCURRENCY: int = int(os.getenv("HEALTH_PROBE_CONCURRENCY", "16"))
+    HEALTH_PROBE_TIMEOUT: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+    HEALTH_PROBE_FAILURES: int = max(1, int(os.getenv("HEALTH_PROBE_FAILURES", "3")))
+    
+    # Idle Voice Chat Reaper (seconds)
+    IDLE_TIMEOUT: int = int(os.getenv("IDLE_TIMEOUT", "180"))
+    EMPTY_TIMEOUT: int = int(os.getenv("EMPTY_TIMEOUT", "60"))
+    
+    # Assistant Accounts (comma-separated Pyrogram session strings)
+    ASSISTANT_SESSIONS: List[str] = [
+        s.strip() for s in os.getenv("ASSISTANT_SESSIONS", "").split(",") if s.strip()
+    ]
+    ASSISTANT_MAX_CALLS: int = int(os.getenv("ASSISTANT_MAX_CALLS", "0"))
+    ASSISTANT_MAX_FAILURES: int = int(os.getenv("ASSISTANT_MAX_FAILURES", "3"))
+    ASSISTANT_COOLDOWN: int = int(os.getenv("ASSISTANT_COOLDOWN", "300"))
+    
+    # Sharding (SHARD_COUNT worker processes; SHARD_ID is set per worker)
+    SHARD_COUNT: int = max(1, int(os.getenv("SHARD_COUNT", "1")))
+    SHARD_ID: int = int(os.getenv("SHARD_ID", "0"))
+    
+    # Chat Ownership Leases (multi-host; seconds)
+    INSTANCE_ID: str = os.getenv("INSTANCE_ID", "")
+    INSTANCE_ID_FILE: str = os.getenv("INSTANCE_ID_FILE", ".instance_id")
+    LEASE_TTL: float = float(os.getenv("LEASE_TTL", "15"))
+    LEASE_RENEW_INTERVAL: float = float(os.getenv("LEASE_RENEW_INTERVAL", "5"))
+    TAKEOVER_CONCURRENCY: int = int(os.getenv("TAKEOVER_CONCURRENCY", "4"))
+    
+    # Session Snapshots (backend: auto, redis or file)
+    SNAPSHOT_BACKEND: str = os.getenv("SNAPSHOT_BACKEND", "auto")
+    SNAPSHOT_FILE: str = os.getenv("SNAPSHOT_FILE", "sessions.jsonl")
+    SNAPSHOT_INTERVAL: float = float(os.getenv("SNAPSHOT_INTERVAL", "10"))
+    SNAPSHOT_MAX_AGE: int = int(os.getenv("SNAPSHOT_MAX_AGE", "1800"))
+    SNAPSHOT_QUEUE_HEAD: int = int(os.getenv("SNAPSHOT_QUEUE_HEAD", "5"))
+    RESTORE_CONCURRENCY: int = int(os.getenv("RESTORE_CONCURRENCY", "8"))
+    
+    # Graceful Drain on SIGTERM (seconds)
+    DRAIN_TIMEOUT: float = float(os.getenv("DRAIN_TIMEOUT", "240"))
+    DRAIN_CONCURRENCY: int = int(os.getenv("DRAIN_CONCURRENCY", "16"))
+    
+    # Queue Write-Behind (durability window in seconds; 0 = write through)
+    QUEUE_FLUSH_INTERVAL: float = float(os.getenv("QUEUE_FLUSH_INTERVAL", "1.0"))
+    QUEUE_FLUSH_BATCH: int = int(os.getenv("QUEUE_FLUSH_BATCH", "200"))
+    QUEUE_ORDER_KEY_MAX: int = int(os.getenv("QUEUE_ORDER_KEY_MAX", "24"))
+    QUEUE_HYDRATE_HEAD: int = int(os.getenv("QUEUE_HYDRATE_HEAD", "10"))
+    QUEUE_BULK_CHUNK: int = int(os.getenv("QUEUE_BULK_CHUNK", "25"))
+    
+    # Play History (MAX_HISTORY_SIZE tracks per chat)
+    HISTORY_FLUSH_INTERVAL: float = float(os.getenv("HISTORY_FLUSH_INTERVAL", "60"))
+    HISTORY_URL_TTL: int = int(os.getenv("HISTORY_URL_TTL", "1800"))
+    HISTORY_RETENTION_DAYS: int = int(os.getenv("HISTORY_RETENTION_DAYS", "7"))
+    
+    # Per-chat State Memory Budget (idle chats are moved to Redis/MongoDB)
+    CHAT_STATE_BUDGET_MB: int = int(os.getenv("CHAT_STATE_BUDGET_MB", "64"))
+    CHAT_STATE_IDLE: float = float(os.getenv("CHAT_STATE_IDLE", "1800"))
+    CHAT_STATE_SWEEP_INTERVAL: float = float(os.getenv("CHAT_STATE_SWEEP_INTERVAL", "60"))
+    CHAT_STATE_RETENTION: int = int(os.getenv("CHAT_STATE_RETENTION", str(7 * 86400)))
+    
+    # User/Chat Activity Writes
+    ACTIVITY_FLUSH_INTERVAL: float = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+    ACTIVITY_TTL: int = int(os.getenv("ACTIVITY_TTL", "600"))
+    ACTIVITY_CACHE_SIZE: int = int(os.getenv("ACTIVITY_CACHE_SIZE", "50000"))
+    
+    # Access Lists (auth, gban, block, chat blacklist)
+    ACCESS_RECONCILE_INTERVAL: float = float(os.getenv("ACCESS_RECONCILE_INTERVAL", "300"))
+    
+    # Chat Administrator Cache
+    ADMIN_CACHE_TTL: int = int(os.getenv("ADMIN_CACHE_TTL", "600"))
+    ADMIN_CACHE_SIZE: int = int(os.getenv("ADMIN_CACHE_SIZE", "10000"))
+    
+    # Broadcasts (messages per second across all sends)
+    BROADCAST_RATE: float = float(os.getenv("BROADCAST_RATE", "25"))
+    BROADCAST_MIN_RATE: float = float(os.getenv("BROADCAST_MIN_RATE", "2"))
+    BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+    BROADCAST_RETRIES: int = int(os.getenv("BROADCAST_RETRIES", "3"))
+    BROADCAST_CHECKPOINT_EVERY: int = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "100"))
+    BROADCAST_PROGRESS_INTERVAL: float = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "10"))
+    
+    # Outbound API Governor (calls per second)
+    GOVERNOR_GLOBAL_RATE: float = float(os.getenv("GOVERNOR_GLOBAL_RATE", "25"))
+    GOVERNOR_CHAT_RATE: float = float(os.getenv("GOVERNOR_CHAT_RATE", "1"))
+    GOVERNOR_CHAT_BURST: float = float(os.getenv("GOVERNOR_CHAT_BURST", "3"))
+    GOVERNOR_RETRIES: int = int(os.getenv("GOVERNOR_RETRIES", "2"))
+    GOVERNOR_MAX_CHATS: int = int(os.getenv("GOVERNOR_MAX_CHATS", "5000"))
+    PLACEHOLDER_DELAY: float = float(os.getenv("PLACEHOLDER_DELAY", "0.8"))
+    
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = os.getenv("LOG_FILE", "jhoommusic.log")
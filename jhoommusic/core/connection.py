@@ -1,65 +1,261 @@
+import time
 import asyncio
 import logging
-from typing import Dict
+from typing import Dict, List, Optional
 
-from .bot import tgcaller
+from .assistants import assistant_pool
+from .config import Config
 
 logger = logging.getLogger(__name__)
 
+# Per-chat connection states
+IDLE = "idle"
+JOINING = "joining"
+JOINED = "joined"
+LEAVING = "leaving"
+
+
+class VoiceConnection:
+    """State of the voice chat connection in one chat"""
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.state = IDLE
+        self.lock = asyncio.Lock()
+        self.joined_at: Optional[float] = None
+        self.last_used = time.monotonic()
+        self.reuses = 0
+        self.users = 0  # callers holding or waiting for the lock
+
+
 class ConnectionManager:
-    """Manages voice chat connections"""
-    
+    """Manages voice chat connections with per-chat state machines"""
+
     def __init__(self):
-        self.active_connections: Dict[int, bool] = {}
-        self.lock = asyncio.Lock()
-    
+        self.connections: Dict[int, VoiceConnection] = {}
+        self._task: Optional[asyncio.Task] = None
+        # chat_id -> failed health probes in a row
+        self.probe_failures: Dict[int, int] = {}
+
+        self.total_joins = 0
+        self.total_reuses = 0
+        self.total_rejoins = 0
+
+    def start(self):
+        """Start probing joined calls in the background"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+            logger.info("📞 Voice connection health checks started")
+
+    async def stop(self):
+        """Stop the health check loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.HEALTH_CHECK_INTERVAL)
+            try:
+                await self.cleanup_inactive_connections()
+            except Exception as e:
+                logger.error(f"❌ Health check error: {e}")
+
+    def _get(self, chat_id: int) -> VoiceConnection:
+        conn = self.connections.get(chat_id)
+        if conn is None:
+            conn = self.connections[chat_id] = VoiceConnection(chat_id)
+        conn.users += 1
+        return conn
+
+    def _put(self, conn: VoiceConnection):
+        """Done with a connection; forget it once it is idle and unused"""
+        conn.users -= 1
+        if conn.users == 0 and conn.state == IDLE and self.connections.get(conn.chat_id) is conn:
+            del self.connections[conn.chat_id]
+
+    @property
+    def active_connections(self) -> Dict[int, bool]:
+        """Chats with a joined voice connection"""
+        return {chat_id: True for chat_id, conn in self.connections.items() if conn.state == JOINED}
+
     async def get_connection(self, chat_id: int) -> bool:
-        """Get or create a voice chat connection"""
-        async with self.lock:
-            if chat_id in self.active_connections:
+        """Get a warm voice chat connection or join one"""
+        conn = self._get(chat_id)
+        try:
+            async with conn.lock:
+                return await self._connect(conn)
+        finally:
+            self._put(conn)
+
+    async def _connect(self, conn: VoiceConnection) -> bool:
+        chat_id = conn.chat_id
+        conn.last_used = time.monotonic()
+        if conn.state == JOINED:
+            # We may have been kicked or the voice chat ended since
+            if await self._probe(chat_id):
+                conn.reuses += 1
+                self.total_reuses += 1
                 return True
-            
+            logger.info(f"Call in {chat_id} is gone, joining again")
+            assistant_pool.mark_left(chat_id)
+            self.total_rejoins += 1
+
+        conn.state = JOINING
+        tried = set()
+        while True:
+            assistant = assistant_pool.assistant_for(chat_id)
             try:
-                # Join voice chat using TgCaller
-                await tgcaller.join(chat_id)
-                self.active_connections[chat_id] = True
-                logger.info(f"Connected to voice chat: {chat_id}")
-                return True
+                await assistant.caller.join_group_call(chat_id)
+                logger.info(f"Connected to voice chat: {chat_id} via {assistant.name}")
+                break
             except Exception as e:
-                logger.error(f"Connection error for {chat_id}: {e}")
-                return False
-    
-    async def release_connection(self, chat_id: int) -> None:
-        """Release voice chat connection"""
-        async with self.lock:
-            if chat_id in self.active_connections:
+                if "already joined" in str(e).lower():
+                    logger.info(f"Already in voice chat: {chat_id}")
+                    break
+                logger.error(f"Connection error for {chat_id} via {assistant.name}: {e}")
+                assistant_pool.report_failure(chat_id, e)
+                tried.add(assistant.index)
+                if not assistant_pool.reassign(chat_id, exclude=tried):
+                    conn.state = IDLE
+                    return False
+
+        assistant_pool.mark_joined(chat_id)
+        conn.state = JOINED
+        conn.joined_at = time.monotonic()
+        self.total_joins += 1
+        return True
+
+    async def release_connection(self, chat_id: int, force: bool = False) -> bool:
+        """Leave the voice chat of a chat
+
+        With ``force`` the leave is attempted even if we don't think we're joined.
+        """
+        if chat_id not in self.connections and not force:
+            return False
+
+        conn = self._get(chat_id)
+        try:
+            async with conn.lock:
+                if conn.state != JOINED and not force:
+                    return False
+
+                conn.state = LEAVING
                 try:
-                    await tgcaller.leave_call(chat_id)
+                    await assistant_pool.get_caller(chat_id).leave_group_call(chat_id)
                     logger.info(f"Left voice chat: {chat_id}")
+                    return True
                 except Exception as e:
-                    logger.error(f"Error leaving call {chat_id}: {e}")
+                    logger.warning(f"Error leaving call {chat_id} (may be normal): {e}")
+                    return False
                 finally:
-                    del self.active_connections[chat_id]
-    
+                    assistant_pool.mark_left(chat_id)
+                    conn.state = IDLE
+                    conn.joined_at = None
+        finally:
+            self._put(conn)
+
+    def invalidate(self, chat_id: int):
+        """Don't trust a joined connection; the next use joins again"""
+        conn = self.connections.get(chat_id)
+        if conn and conn.state == JOINED:
+            conn.state = IDLE
+            conn.joined_at = None
+            assistant_pool.mark_left(chat_id)
+            if conn.users == 0:
+                del self.connections[chat_id]
+
+    def touch(self, chat_id: int):
+        """Mark a connection as used"""
+        conn = self.connections.get(chat_id)
+        if conn:
+            conn.last_used = time.monotonic()
+
+    def get_state(self, chat_id: int) -> str:
+        """Get connection state of a chat"""
+        conn = self.connections.get(chat_id)
+        return conn.state if conn else IDLE
+
     def is_connected(self, chat_id: int) -> bool:
         """Check if connected to voice chat"""
-        return chat_id in self.active_connections
-    
-    async def cleanup_inactive_connections(self):
-        """Clean up inactive connections"""
-        async with self.lock:
-            inactive_chats = []
-            for chat_id in list(self.active_connections.keys()):
-                try:
-                    # Check if call is still active using TgCaller
-                    call_info = await tgcaller.get_call(chat_id)
-                    if not call_info:
-                        inactive_chats.append(chat_id)
-                except Exception:
-                    inactive_chats.append(chat_id)
-            
-            for chat_id in inactive_chats:
-                await self.release_connection(chat_id)
+        return self.get_state(chat_id) == JOINED
+
+    async def _probe(self, chat_id: int, semaphore: asyncio.Semaphore = None) -> bool:
+        """Check whether the call of a chat is still alive"""
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(1)
+        async with semaphore:
+            try:
+                call_info = await asyncio.wait_for(
+                    assistant_pool.get_caller(chat_id).get_call(chat_id), timeout=Config.HEALTH_PROBE_TIMEOUT
+                )
+                return bool(call_info)
+            except Exception:
+                return False
+
+    async def probe_connections(self) -> Dict[int, bool]:
+        """Probe all joined connections concurrently with bounded parallelism"""
+        chat_ids = [chat_id for chat_id, conn in self.connections.items() if conn.state == JOINED]
+        if not chat_ids:
+            return {}
+        semaphore = asyncio.Semaphore(Config.HEALTH_PROBE_CONCURRENCY)
+        results = await asyncio.gather(*(self._probe(chat_id, semaphore) for chat_id in chat_ids))
+        health = dict(zip(chat_ids, results))
+
+        # A single timeout or API hiccup isn't a dead call; count failures in a row
+        failures = {}
+        for chat_id, alive in health.items():
+            if not alive:
+                failures[chat_id] = self.probe_failures.get(chat_id, 0) + 1
+        self.probe_failures = failures
+        return health
+
+    async def dead_connections(self) -> List[int]:
+        """Probe joined calls; chats that failed HEALTH_PROBE_FAILURES probes in a row"""
+        await self.probe_connections()
+        return [chat_id for chat_id, count in self.probe_failures.items() if count >= Config.HEALTH_PROBE_FAILURES]
+
+    async def drop_dead_call(self, chat_id: int) -> bool:
+        """Tear down everything we hold for a chat whose call is gone"""
+        from .stream_manager import stream_manager
+
+        self.probe_failures.pop(chat_id, None)
+        if stream_manager.is_streaming(chat_id):
+            # Also frees FFmpeg, the admission slot and the reaper's timers
+            return await stream_manager.stop_stream(chat_id)
+        return await self.release_connection(chat_id)
+
+    async def cleanup_inactive_connections(self) -> List[int]:
+        """Clean up connections whose call is gone"""
+        inactive_chats = await self.dead_connections()
+
+        semaphore = asyncio.Semaphore(Config.HEALTH_PROBE_CONCURRENCY)
+
+        async def release(chat_id: int):
+            async with semaphore:
+                await self.drop_dead_call(chat_id)
+
+        await asyncio.gather(*(release(chat_id) for chat_id in inactive_chats))
+        if inactive_chats:
+            logger.info(f"Released {len(inactive_chats)} inactive voice connections")
+        return inactive_chats
+
+    def get_stats(self) -> Dict:
+        """Get connection pool statistics"""
+        states: Dict[str, int] = {}
+        for conn in self.connections.values():
+            states[conn.state] = states.get(conn.state, 0) + 1
+        return {
+            "states": states,
+            "joins": self.total_joins,
+            "reuses": self.total_reuses,
+            "rejoins": self.total_rejoins,
+            "assistants": assistant_pool.get_stats()
+        }
 
 # Global connection manager instance
 connection_manager = ConnectionManager()
@@ -49,7 +49,8 @@ class Database:
             'users', 'chats', 'blocked_users', 'blacklisted_chats',
             'auth_users', 'channel_connections', 'channel_queues',
             'gbanned_users', 'playlists', 'user_settings',
-            'thumbnails', 'troubleshooting_logs'
+            'thumbnails', 'troubleshooting_logs', 'play_history', 'chat_state',
+            'broadcast_jobs'
         ]
 
         for name in collection_names:
@@ -66,16 +67,47 @@ class Database:
             await self._collections['blocked_users'].create_index("user_id", unique=True)
             await self._collections['auth_users'].create_index("user_id", unique=True)
             await self._collections['gbanned_users'].create_index("user_id", unique=True)
+            await self._collections['blacklisted_chats'].create_index("chat_id", unique=True)
             await self._collections['playlists'].create_index([("user_id", 1), ("name", 1)], unique=True)
-            await self._collections['channel_queues'].create_index([("chat_id", 1), ("timestamp", -1)])
+            await self._migrate_queue_order()
+            await self._collections['channel_queues'].create_index([("chat_id", 1), ("order", 1)])
             await self._collections['user_settings'].create_index([("chat_id", 1), ("user_id", 1)])
             await self._collections['thumbnails'].create_index("key", unique=True)
             await self._collections['troubleshooting_logs'].create_index([("chat_id", 1), ("timestamp", -1)])
+            await self._collections['play_history'].create_index([("chat_id", 1), ("played_at", -1)])
+            await self._collections['play_history'].create_index(
+                "saved_at", expireAfterSeconds=Config.HISTORY_RETENTION_DAYS * 86400
+            )
+            await self._collections['chat_state'].create_index("chat_id", unique=True)
+            await self._collections['broadcast_jobs'].create_index("status")
+            await self._collections['chat_state'].create_index(
+                "saved_at", expireAfterSeconds=Config.CHAT_STATE_RETENTION
+            )
 
             logger.info("✅ Database indexes created successfully")
         except Exception as e:
             logger.error(f"⚠️ Error creating database indexes: {e}")
 
+    async def _migrate_queue_order(self):
+        """Give queue documents from before order keys an order key by timestamp"""
+        from ..utils.orderkey import spread_keys
+
+        queues = self._collections['channel_queues']
+        try:
+            await queues.drop_index("chat_id_1_timestamp_-1")
+        except Exception:
+            pass  # Already migrated
+
+        chat_ids = await queues.distinct("chat_id", {"order": {"$exists": False}})
+        for chat_id in chat_ids:
+            docs = await queues.find(
+                {"chat_id": chat_id, "order": {"$exists": False}}, {"_id": 1}, sort=[("timestamp", 1)]
+            ).to_list(None)
+            for doc, order in zip(docs, spread_keys(len(docs))):
+                await queues.update_one({"_id": doc["_id"]}, {"$set": {"order": order}})
+        if chat_ids:
+            logger.info(f"✅ Added order keys to queues of {len(chat_ids)} chats")
+
     def __getattr__(self, name):
         """Allow direct access to collections"""
         if not self.enabled:
@@ -0,0 +1,306 @@
+import asyncio
+import logging
+from bisect import insort
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from pyrogram.errors import FloodWait
+from .bot import app
+from .config import Config
+from ..utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Lower goes first
+PRIORITY_CONTROL = 0   # replies to commands and buttons
+PRIORITY_NORMAL = 1    # now playing and error messages
+PRIORITY_COSMETIC = 2  # progress edits and cleanup deletes
+
+
+class _Call:
+    """One queued API call and everyone waiting for its result"""
+
+    __slots__ = ("priority", "seq", "chat_id", "method", "args", "kwargs", "key", "waiters", "attempts")
+
+    def __init__(self, priority: int, seq: int, chat_id: Optional[int], method: str,
+                 args: tuple, kwargs: dict, key: Optional[Tuple] = None):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.waiters: List[asyncio.Future] = []
+        self.attempts = 0
+
+    def __lt__(self, other: "_Call") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class DeferredReply:
+    """Reply to a command whose placeholder only goes out if the work is slow.
+
+    The placeholder is sent after PLACEHOLDER_DELAY seconds. If the first
+    ``edit_text`` comes before that, its text is sent as the reply instead,
+    saving the placeholder and the edit. Use it like the Message it stands
+    in for.
+    """
+
+    def __init__(self, governor: "ApiGovernor", message, placeholder: str, delay: float, priority: int):
+        self.governor = governor
+        self.message = message
+        self.priority = priority
+        self.sent = None
+        self._due = False
+        self._lock = asyncio.Lock()
+        self._placeholder = asyncio.create_task(self._send_placeholder(placeholder, delay))
+
+    async def _send_placeholder(self, text: str, delay: float):
+        await asyncio.sleep(delay)
+        self._due = True  # from here on the placeholder may already be on its way
+        self.sent = await self.governor.reply(self.message, text, priority=self.priority)
+
+    async def _settle(self):
+        if self._placeholder.done():
+            return
+        if not self._due:
+            self._placeholder.cancel()
+            return
+        try:
+            await self._placeholder
+        except Exception:
+            pass  # placeholder failed; the text is sent as a new reply
+
+    async def edit_text(self, text: str, priority: int = None, **kwargs):
+        """Show ``text``: edit the placeholder if it was sent, otherwise reply with it"""
+        priority = self.priority if priority is None else priority
+        async with self._lock:
+            await self._settle()
+            if self.sent is None:
+                self.sent = await self.governor.reply(self.message, text, priority=priority, **kwargs)
+                return self.sent
+        return await self.governor.edit_message_text(
+            self.sent.chat.id, self.sent.id, text, priority=priority, **kwargs
+        )
+
+    async def delete(self):
+        """Remove the reply, or never send it"""
+        await self._settle()
+        if self.sent is not None:
+            await self.governor.delete_messages(self.sent.chat.id, self.sent.id, priority=PRIORITY_COSMETIC)
+
+
+class ApiGovernor:
+    """Paces outbound Telegram calls under global and per-chat token buckets.
+
+    Calls are queued by priority and dispatched by one loop that takes a
+    token from the global bucket and from the chat's own bucket. A chat
+    that is out of tokens, or paused by a FloodWait, is skipped without
+    holding up other chats. A pending edit of a message is replaced by a
+    newer edit of the same message, so only the latest text is sent.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or app
+        self.global_bucket = TokenBucket(Config.GOVERNOR_GLOBAL_RATE)
+        self.chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._queue: List[_Call] = []
+        self._edits: Dict[Tuple, _Call] = {}
+        self._seq = count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_calls = 0
+        self.total_coalesced = 0
+        self.total_flood_waits = 0
+
+    def start(self):
+        """Start dispatching calls"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop dispatching; queued calls are cancelled"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for call in self._queue:
+            for waiter in call.waiters:
+                waiter.cancel()
+        self._queue.clear()
+        self._edits.clear()
+
+    # Queueing
+
+    def _bucket(self, chat_id: Optional[int]) -> Optional[TokenBucket]:
+        if chat_id is None:
+            return None
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(
+                Config.GOVERNOR_CHAT_RATE, capacity=Config.GOVERNOR_CHAT_BURST
+            )
+            while len(self.chat_buckets) > Config.GOVERNOR_MAX_CHATS:
+                self.chat_buckets.popitem(last=False)
+        self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _enqueue(self, call: _Call):
+        insort(self._queue, call)
+        if call.key:
+            self._edits[call.key] = call
+        self._wakeup.set()
+
+    async def call(self, chat_id: Optional[int], method: str, *args,
+                   priority: int = PRIORITY_NORMAL, coalesce_key: Tuple = None, **kwargs):
+        """Queue ``client.<method>(*args, **kwargs)`` and wait for its result"""
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+
+        pending = self._edits.get(coalesce_key) if coalesce_key else None
+        if pending:
+            # Superseded: send the newer content once, in the older call's place
+            self.total_coalesced += 1
+            pending.args, pending.kwargs = args, kwargs
+            pending.waiters.append(future)
+            if priority < pending.priority:
+                self._queue.remove(pending)
+                pending.priority = priority
+                insort(self._queue, pending)
+                self._wakeup.set()
+        else:
+            call = _Call(priority, next(self._seq), chat_id, method, args, kwargs, coalesce_key)
+            call.waiters.append(future)
+            self._enqueue(call)
+        return await future
+
+    # Dispatching
+
+    def _pick(self) -> Tuple[Optional[_Call], Optional[float]]:
+        """Next call that may go now, or how long until one might"""
+        wait = self.global_bucket.delay()
+        if wait > 0 or not self._queue:
+            return None, wait or None
+
+        waits = []
+        blocked = set()
+        for call in self._queue:
+            if call.chat_id in blocked:
+                continue
+            bucket = self._bucket(call.chat_id)
+            delay = bucket.delay() if bucket else 0
+            if delay > 0:
+                # Keep this chat's calls in order behind the one that has to wait
+                blocked.add(call.chat_id)
+                waits.append(delay)
+                continue
+            if bucket:
+                bucket.try_acquire()
+            self.global_bucket.try_acquire()
+            return call, 0
+        return None, min(waits) if waits else None
+
+    async def _run(self):
+        while True:
+            call, wait = self._pick()
+            if call:
+                self._queue.remove(call)
+                if call.key and self._edits.get(call.key) is call:
+                    del self._edits[call.key]
+                asyncio.create_task(self._execute(call))
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, call: _Call):
+        self.total_calls += 1
+        try:
+            result = await getattr(self.client, call.method)(*call.args, **call.kwargs)
+        except FloodWait as e:
+            self.total_flood_waits += 1
+            (self._bucket(call.chat_id) or self.global_bucket).penalize(e.value)
+            logger.warning(f"⏳ GOVERNOR: FloodWait {e.value}s on {call.method} in {call.chat_id}")
+            newer = self._edits.get(call.key) if call.key else None
+            if newer:
+                newer.waiters.extend(call.waiters)  # a newer edit is already queued
+            elif call.attempts < Config.GOVERNOR_RETRIES:
+                call.attempts += 1
+                self._enqueue(call)
+            else:
+                self._resolve(call, error=e)
+        except Exception as e:
+            self._resolve(call, error=e)
+        else:
+            bucket = self._bucket(call.chat_id)
+            if bucket:
+                bucket.reward()
+            self._resolve(call, result=result)
+        finally:
+            self._wakeup.set()
+
+    @staticmethod
+    def _resolve(call: _Call, result=None, error: Exception = None):
+        for waiter in call.waiters:
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+
+    # Shortcuts
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_NORMAL, **kwargs):
+        return await self.call(chat_id, "send_message", chat_id, text, priority=priority, **kwargs)
+
+    async def send_photo(self, chat_id: int, photo, priority: int = PRIORITY_NORMAL, **kwargs):
+        return await self.call(chat_id, "send_photo", chat_id, photo, priority=priority, **kwargs)
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str,
+                                priority: int = PRIORITY_COSMETIC, **kwargs):
+        return await self.call(
+            chat_id, "edit_message_text", chat_id, message_id, text,
+            priority=priority, coalesce_key=("edit", chat_id, message_id), **kwargs
+        )
+
+    async def delete_messages(self, chat_id: int, message_ids, priority: int = PRIORITY_COSMETIC, **kwargs):
+        return await self.call(chat_id, "delete_messages", chat_id, message_ids, priority=priority, **kwargs)
+
+    async def reply(self, message, text: str, priority: int = PRIORITY_CONTROL, **kwargs):
+        """Reply to a message"""
+        return await self.send_message(
+            message.chat.id, text, priority=priority, reply_to_message_id=message.id, **kwargs
+        )
+
+    async def deferred_reply(self, message, placeholder: str, priority: int = PRIORITY_CONTROL) -> DeferredReply:
+        """Reply with ``placeholder`` only if no final text is ready within PLACEHOLDER_DELAY"""
+        self.start()
+        return DeferredReply(self, message, placeholder, Config.PLACEHOLDER_DELAY, priority)
+
+    async def edit(self, message, text: str, priority: int = PRIORITY_COSMETIC, **kwargs):
+        """Edit a message the bot sent"""
+        if isinstance(message, DeferredReply):
+            return await message.edit_text(text, priority=priority, **kwargs)
+        return await self.edit_message_text(message.chat.id, message.id, text, priority=priority, **kwargs)
+
+    def get_stats(self) -> Dict:
+        """Get governor statistics"""
+        return {
+            "queued": len(self._queue),
+            "calls": self.total_calls,
+            "coalesced": self.total_coalesced,
+            "flood_waits": self.total_flood_waits,
+            "paused_chats": sum(1 for bucket in self.chat_buckets.values() if bucket.delay() > 0),
+            "global": self.global_bucket.get_stats()
+        }
+
+# Global API governor instance
+governor = ApiGovernor()
@@ -0,0 +1,200 @@
+import re
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+from .config import Config
+from .database import db
+from .chatstate import chat_state, deep_size
+
+logger = logging.getLogger(__name__)
+
+# Signed stream URLs (e.g. googlevideo) carry their expiry time
+EXPIRE_PATTERN = re.compile(r"[?&/]expire[=/](\d+)")
+
+
+class PlayHistory:
+    """Recently played tracks per chat, for /previous and /replay.
+
+    Each chat keeps a ring of the last MAX_HISTORY_SIZE compact track
+    records, newest last (the last record is the track now playing). A
+    record keeps the resolved stream URL with its expiry, so going back to
+    a track skips extraction while the URL is still valid and falls back
+    to the track page (never a new search) once it is not. New records are
+    written to MongoDB in bulk every HISTORY_FLUSH_INTERVAL seconds and
+    read back lazily when a chat's ring is empty after a restart.
+    """
+
+    def __init__(self):
+        self.rings: Dict[int, Deque[Dict]] = {}
+        self._loaded: set = set()
+        self._pending: List[Dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_cached_replays = 0
+        self.total_resolved_replays = 0
+
+    def start(self):
+        """Start periodic history writes"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the write loop and write out pending records"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.HISTORY_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write new history records with one insert_many"""
+        if not self._pending or not db.enabled:
+            self._pending.clear()
+            return 0
+        records, self._pending = self._pending, []
+        saved_at = datetime.utcnow()
+        for record in records:
+            record['saved_at'] = saved_at  # expires via a TTL index
+        try:
+            await db.play_history.insert_many(records, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to save play history: {e}")
+            return 0
+        return len(records)
+
+    # Recording
+
+    @staticmethod
+    def _url_expires(url: str) -> float:
+        match = EXPIRE_PATTERN.search(url or "")
+        if match:
+            return float(match.group(1))
+        return time.time() + Config.HISTORY_URL_TTL
+
+    def _ring(self, chat_id: int) -> Deque[Dict]:
+        ring = self.rings.get(chat_id)
+        if ring is None:
+            ring = self.rings[chat_id] = deque(maxlen=Config.MAX_HISTORY_SIZE)
+        return ring
+
+    def record(self, chat_id: int, info: Dict, source: str):
+        """Remember a track that just started playing"""
+        page = info.get('webpage_url') or source
+        record = {
+            'chat_id': chat_id,
+            'title': info.get('title', 'Unknown'),
+            'artist': info.get('artist', 'Unknown Artist'),
+            'duration': info.get('duration', 0),
+            'thumbnail': info.get('thumbnail'),
+            'is_video': info.get('is_video', False),
+            'source': info.get('source', 'Unknown'),
+            'webpage_url': page,
+            'url': info.get('url'),
+            'url_expires': self._url_expires(info.get('url')),
+            'user_id': info.get('user_id'),
+            'played_at': time.time()
+        }
+
+        ring = self._ring(chat_id)
+        if ring and ring[-1]['webpage_url'] == page:
+            # Same track restarted (seek, resume, replay): refresh it in place
+            ring[-1].update(record)
+            return
+        ring.append(record)
+        self._pending.append(dict(record))
+
+    # Going back
+
+    async def _load(self, chat_id: int):
+        await chat_state.ensure(chat_id)
+        if chat_id in self._loaded:
+            return
+        self._loaded.add(chat_id)
+        if self.rings.get(chat_id) or not db.enabled:
+            return
+        try:
+            docs = await db.play_history.find(
+                {"chat_id": chat_id}, {"_id": 0}, sort=[("played_at", -1)]
+            ).limit(Config.MAX_HISTORY_SIZE).to_list(Config.MAX_HISTORY_SIZE)
+        except Exception as e:
+            logger.error(f"Failed to load play history: {e}")
+            return
+        self._ring(chat_id).extend(reversed(docs))
+
+    async def current(self, chat_id: int) -> Optional[Dict]:
+        """Latest played track of a chat"""
+        await self._load(chat_id)
+        ring = self.rings.get(chat_id)
+        return ring[-1] if ring else None
+
+    async def previous(self, chat_id: int) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Step back one track: returns (track to play, track it replaces)"""
+        await self._load(chat_id)
+        ring = self.rings.get(chat_id)
+        if not ring or len(ring) < 2:
+            return None, None
+        current = ring.pop()
+        return ring[-1], current
+
+    def undo_previous(self, chat_id: int, current: Dict):
+        """Put back the track that a failed step back replaced"""
+        self._ring(chat_id).append(current)
+
+    def playable(self, record: Dict) -> Tuple[str, Optional[Dict]]:
+        """Source of a record, plus media info to skip extraction if its URL is still valid"""
+        margin = (record.get('duration') or 0) + 60
+        if record.get('url') and record.get('url_expires', 0) - time.time() > margin:
+            self.total_cached_replays += 1
+            return record['webpage_url'], record
+        self.total_resolved_replays += 1
+        return record.get('webpage_url') or record['url'], None
+
+    def forget(self, chat_id: int):
+        """Drop the in-memory history of a chat"""
+        self.rings.pop(chat_id, None)
+        self._loaded.discard(chat_id)
+
+    # Chat state provider
+
+    def chat_state_busy(self, chat_id: int) -> bool:
+        return False
+
+    def chat_state_size(self, chat_id: int) -> int:
+        return deep_size(self.rings.get(chat_id))
+
+    def export_chat_state(self, chat_id: int) -> Optional[Dict]:
+        # With MongoDB the ring is read back lazily
+        if db.enabled or not self.rings.get(chat_id):
+            return None
+        return {'ring': list(self.rings[chat_id])}
+
+    def import_chat_state(self, chat_id: int, state: Dict):
+        self._ring(chat_id).extend(state.get('ring', ()))
+        self._loaded.add(chat_id)
+
+    def evict_chat_state(self, chat_id: int):
+        self.forget(chat_id)
+
+    def get_stats(self) -> Dict:
+        """Get history statistics"""
+        return {
+            "chats": len(self.rings),
+            "pending": len(self._pending),
+            "cached_replays": self.total_cached_replays,
+            "resolved_replays": self.total_resolved_replays
+        }
+
+# Global play history instance
+play_history = PlayHistory()
+chat_state.register("history", play_history)
@@ -0,0 +1,446 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from .config import Config
+from ..utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "lease:chat:{}"
+FENCE_KEY = "lease:fence:{}"
+STATE_KEY = "lease:state:{}"
+CHATS_KEY = "lease:chats"
+INSTANCES_KEY = "lease:instances:{}"
+
+# KEYS: lease, fence, chats  ARGV: owner, ttl_ms, chat_id
+# Returns the fencing token, or -1 if another owner holds the lease
+ACQUIRE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local owner, fence = string.match(current, '^(.*):(%d+)$')
+    if owner == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return tonumber(fence)
+    end
+    return -1
+end
+local fence = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. fence, 'PX', ARGV[2])
+redis.call('SADD', KEYS[3], ARGV[3])
+return fence
+"""
+
+# KEYS: lease  ARGV: owner:fence, ttl_ms
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lease, state, chats  ARGV: owner:fence, chat_id
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('SREM', KEYS[3], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# KEYS: lease  ARGV: owner:fence
+# Drops the lease but keeps the chat listed and its state, so a peer adopts it
+HAND_OFF_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: lease, state  ARGV: owner:fence, field, value, ...
+SAVE_STATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+
+def instance_id() -> str:
+    """INSTANCE_ID, or a name generated once and kept in INSTANCE_ID_FILE.
+
+    The name has to survive restarts: leases of the previous run are still
+    live for LEASE_TTL, and only the same owner can pick them up again.
+    """
+    if Config.INSTANCE_ID:
+        return Config.INSTANCE_ID
+    path = Config.INSTANCE_ID_FILE
+    if Config.SHARD_COUNT > 1:
+        # Shards started from one directory are separate instances
+        root, ext = os.path.splitext(path)
+        path = f"{root}-shard{Config.SHARD_ID}{ext}"
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = f.read().strip()
+        if saved:
+            return saved
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"⚠️ LEASE: Could not read {path}: {e}")
+
+    generated = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generated + "\n")
+    except OSError as e:
+        logger.warning(f"⚠️ LEASE: Could not save instance id, leases won't survive a restart: {e}")
+        return f"{socket.gethostname()}-{os.getpid()}"
+    return generated
+
+
+class LeaseManager:
+    """Per-chat playback ownership across bot instances.
+
+    Each chat's playback is owned by exactly one instance through a Redis
+    key with a TTL that the owner keeps renewing. Every acquisition gets a
+    new fencing token and all writes check it, so an instance that lost its
+    lease (e.g. after a long pause) cannot overwrite the new owner's state.
+    Chats whose lease expired are taken over by a live instance, which
+    resumes them from the persisted position or queue.
+    Without Redis every chat is treated as owned locally.
+    """
+
+    def __init__(self, redis=None, owner: str = None):
+        self.redis = redis if redis is not None else redis_client
+        self.enabled = self.redis is not None
+        self.owner = owner or instance_id()
+        self.leases: Dict[int, Dict] = {}
+        self.draining = False
+        self._task: Optional[asyncio.Task] = None
+        self._takeovers: Dict[int, asyncio.Task] = {}
+
+        self.total_takeovers = 0
+        self.total_lost = 0
+
+        if self.enabled:
+            self._acquire = self.redis.register_script(ACQUIRE_SCRIPT)
+            self._renew = self.redis.register_script(RENEW_SCRIPT)
+            self._release = self.redis.register_script(RELEASE_SCRIPT)
+            self._hand_off = self.redis.register_script(HAND_OFF_SCRIPT)
+            self._save_state = self.redis.register_script(SAVE_STATE_SCRIPT)
+
+    @property
+    def ttl_ms(self) -> int:
+        return int(Config.LEASE_TTL * 1000)
+
+    async def _call(self, func, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+    def _token(self, chat_id: int) -> Optional[str]:
+        lease = self.leases.get(chat_id)
+        return f"{self.owner}:{lease['fence']}" if lease else None
+
+    def start(self):
+        """Start renewing leases and watching for orphaned chats"""
+        if self.enabled and not self._task:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"🔐 Lease manager started as {self.owner}")
+
+    async def stop(self):
+        """Stop the renewal loop and any takeovers still running"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in self._takeovers.values():
+            task.cancel()
+        await asyncio.gather(*self._takeovers.values(), return_exceptions=True)
+        self._takeovers.clear()
+
+    def owns(self, chat_id: int) -> bool:
+        """Check if this instance holds a live lease for a chat"""
+        if not self.enabled:
+            return True
+        lease = self.leases.get(chat_id)
+        return bool(lease) and lease['expires'] > time.monotonic()
+
+    def fence(self, chat_id: int) -> Optional[int]:
+        """Fencing token of our lease on a chat"""
+        lease = self.leases.get(chat_id)
+        return lease['fence'] if lease else None
+
+    async def acquire(self, chat_id: int) -> bool:
+        """Take (or extend) ownership of a chat"""
+        if not self.enabled:
+            return True
+        started = time.monotonic()
+        try:
+            fence = await self._call(
+                self._acquire,
+                keys=[LEASE_KEY.format(chat_id), FENCE_KEY.format(chat_id), CHATS_KEY],
+                args=[self.owner, self.ttl_ms, chat_id]
+            )
+        except Exception as e:
+            logger.error(f"❌ LEASE: Acquire error for {chat_id}: {e}")
+            return False
+
+        fence = int(fence)
+        if fence < 0:
+            return False
+        self.leases[chat_id] = {'fence': fence, 'expires': started + Config.LEASE_TTL}
+        return True
+
+    async def held_elsewhere(self, chat_id: int) -> bool:
+        """Check if another instance holds a live lease for a chat"""
+        if not self.enabled:
+            return False
+        try:
+            current = await self._call(self.redis.get, LEASE_KEY.format(chat_id))
+        except Exception as e:
+            logger.error(f"❌ LEASE: Lookup error for {chat_id}: {e}")
+            return True  # can't tell; assume someone else may have it
+        if current is None:
+            return False
+        if isinstance(current, bytes):
+            current = current.decode()
+        return current.rsplit(":", 1)[0] != self.owner
+
+    async def release(self, chat_id: int) -> bool:
+        """Give up ownership of a chat"""
+        if not self.enabled:
+            return True
+        token = self._token(chat_id)
+        self.leases.pop(chat_id, None)
+        if token is None:
+            return False
+        try:
+            return bool(await self._call(
+                self._release,
+                keys=[LEASE_KEY.format(chat_id), STATE_KEY.format(chat_id), CHATS_KEY],
+                args=[token, chat_id]
+            ))
+        except Exception as e:
+            logger.error(f"❌ LEASE: Release error for {chat_id}: {e}")
+            return False
+
+    async def hand_off(self, chat_id: int) -> bool:
+        """Give up a chat so that a peer instance takes it over"""
+        if not self.enabled:
+            return False
+        token = self._token(chat_id)
+        self.leases.pop(chat_id, None)
+        if token is None:
+            return False
+        try:
+            return bool(await self._call(
+                self._hand_off, keys=[LEASE_KEY.format(chat_id)], args=[token]
+            ))
+        except Exception as e:
+            logger.error(f"❌ LEASE: Hand-off error for {chat_id}: {e}")
+            return False
+
+    @property
+    def _instances_key(self) -> str:
+        # Chats only move between instances of the same shard
+        return INSTANCES_KEY.format(Config.SHARD_ID)
+
+    async def _heartbeat(self):
+        await self._call(self.redis.zadd, self._instances_key, {self.owner: time.time()})
+
+    async def peers(self) -> List[str]:
+        """Other live instances that could take our chats over"""
+        if not self.enabled:
+            return []
+        try:
+            live = await self._call(
+                self.redis.zrangebyscore, self._instances_key, time.time() - 3 * Config.LEASE_TTL, "+inf"
+            )
+        except Exception as e:
+            logger.error(f"❌ LEASE: Peer lookup error: {e}")
+            return []
+        live = [p.decode() if isinstance(p, bytes) else p for p in live or ()]
+        return [p for p in live if p != self.owner]
+
+    async def start_draining(self):
+        """Stop adopting chats and stop advertising this instance"""
+        self.draining = True
+        if self.enabled:
+            try:
+                await self._call(self.redis.zrem, self._instances_key, self.owner)
+            except Exception as e:
+                logger.error(f"❌ LEASE: Deregister error: {e}")
+
+    async def renew(self, chat_id: int) -> bool:
+        """Extend our lease on a chat; False if it was lost"""
+        token = self._token(chat_id)
+        if token is None:
+            return False
+        started = time.monotonic()
+        try:
+            renewed = await self._call(
+                self._renew, keys=[LEASE_KEY.format(chat_id)], args=[token, self.ttl_ms]
+            )
+        except Exception as e:
+            # Keep the lease until it expires locally; Redis may be back next round
+            logger.warning(f"⚠️ LEASE: Renew error for {chat_id}: {e}")
+            return self.owns(chat_id)
+
+        if renewed:
+            self.leases[chat_id]['expires'] = started + Config.LEASE_TTL
+            return True
+        self.leases.pop(chat_id, None)
+        return False
+
+    async def save_state(self, chat_id: int, state: Dict) -> bool:
+        """Persist playback state of a chat, fenced by our lease"""
+        token = self._token(chat_id)
+        if not self.enabled or token is None:
+            return False
+        args = [token]
+        for field, value in state.items():
+            args += [field, str(value)]
+        try:
+            return bool(await self._call(
+                self._save_state,
+                keys=[LEASE_KEY.format(chat_id), STATE_KEY.format(chat_id)],
+                args=args
+            ))
+        except Exception as e:
+            logger.error(f"❌ LEASE: State save error for {chat_id}: {e}")
+            return False
+
+    async def load_state(self, chat_id: int) -> Dict:
+        """Load persisted playback state of a chat"""
+        if not self.enabled:
+            return {}
+        try:
+            raw = await self._call(self.redis.hgetall, STATE_KEY.format(chat_id))
+        except Exception as e:
+            logger.error(f"❌ LEASE: State load error for {chat_id}: {e}")
+            return {}
+        return {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in (raw or {}).items()
+        }
+
+    async def find_orphans(self) -> List[int]:
+        """Chats with playback whose owner's lease expired"""
+        from .sharding import owns_chat
+
+        members = await self._call(self.redis.smembers, CHATS_KEY)
+        orphans = []
+        for member in members or ():
+            chat_id = int(member)
+            if chat_id in self.leases or not owns_chat(chat_id):
+                continue
+            if not await self._call(self.redis.exists, LEASE_KEY.format(chat_id)):
+                orphans.append(chat_id)
+        return orphans
+
+    async def _run(self):
+        # Renewal keeps a fixed cadence; takeovers (extraction, join,
+        # admission wait) run in the background so they can't delay it
+        next_round = time.monotonic()
+        while True:
+            next_round += Config.LEASE_RENEW_INTERVAL
+            await asyncio.sleep(max(0.0, next_round - time.monotonic()))
+            next_round = max(next_round, time.monotonic())
+            try:
+                await self._renew_all()
+                if self.draining:
+                    continue
+                await self._heartbeat()
+                for chat_id in await self.find_orphans():
+                    self._start_takeover(chat_id)
+            except Exception as e:
+                logger.error(f"❌ LEASE: Loop error: {e}")
+
+    def _start_takeover(self, chat_id: int):
+        """Adopt an orphan in the background, at most TAKEOVER_CONCURRENCY at a time"""
+        if chat_id in self._takeovers or len(self._takeovers) >= Config.TAKEOVER_CONCURRENCY:
+            return  # the next round picks it up again if it is still orphaned
+        task = self._takeovers[chat_id] = asyncio.create_task(self._take_over_logged(chat_id))
+        task.add_done_callback(lambda _: self._takeovers.pop(chat_id, None))
+
+    async def _take_over_logged(self, chat_id: int):
+        try:
+            await self.take_over(chat_id)
+        except Exception as e:
+            logger.error(f"❌ LEASE: Takeover error for {chat_id}: {e}")
+
+    async def _renew_all(self):
+        from .stream_manager import stream_manager
+
+        for chat_id in list(self.leases):
+            if not await self.renew(chat_id):
+                self.total_lost += 1
+                logger.warning(f"⚠️ LEASE: Lost ownership of {chat_id}, stopping local playback")
+                await stream_manager.stop_stream(chat_id, lease_lost=True)
+                continue
+
+            stream = stream_manager.get_stream_info(chat_id)
+            if stream:
+                await self.save_state(chat_id, {
+                    'source': stream['source'],
+                    'video': int(stream['type'] == 'video'),
+                    'position': round(stream_manager.get_position(chat_id), 1)
+                })
+
+    async def take_over(self, chat_id: int) -> bool:
+        """Adopt a chat whose owner died and resume its playback"""
+        from .stream_manager import stream_manager
+        from .playback import playback_manager
+        from .snapshot import snapshot_manager
+
+        if not await self.acquire(chat_id):
+            return False
+
+        self.total_takeovers += 1
+        logger.info(f"🔐 LEASE: Took over {chat_id} (fence {self.fence(chat_id)})")
+
+        # Full session snapshot first, then the position saved with the lease
+        if await snapshot_manager.restore_chat(chat_id):
+            return True
+
+        state = await self.load_state(chat_id)
+        if state.get('source'):
+            resumed = await stream_manager.start_stream(
+                chat_id,
+                state['source'],
+                video=state.get('video') == '1',
+                seek=float(state.get('position') or 0)
+            )
+            if resumed:
+                return True
+
+        # Nothing to resume mid-track; continue with the persisted queue
+        await playback_manager.play_next_track(chat_id)
+        if not stream_manager.is_streaming(chat_id):
+            await self.release(chat_id)
+        return True
+
+    def get_stats(self) -> Dict:
+        """Get lease statistics"""
+        return {
+            "enabled": self.enabled,
+            "owner": self.owner,
+            "owned": len(self.leases),
+            "takeovers": self.total_takeovers,
+            "takeovers_running": len(self._takeovers),
+            "lost": self.total_lost,
+            "draining": self.draining
+        }
+
+# Global lease manager instance
+lease_manager = LeaseManager()
@@ -0,0 +1,233 @@
+import os
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def pcm_bytes_per_second(sample_rate: int = 48000, channels: int = 2) -> int:
+    """Bytes in one second of s16le PCM"""
+    return sample_rate * channels * 2
+
+
+def pcm_chunk_size(sample_rate: int = 48000, chunk_ms: int = None, channels: int = 2) -> int:
+    """Bytes in one s16le PCM chunk"""
+    chunk_ms = chunk_ms or Config.PIPE_CHUNK_MS
+    return pcm_bytes_per_second(sample_rate, channels) * chunk_ms // 1000
+
+
+class PipeRingBuffer:
+    """Jitter buffer between an ffmpeg stdout pipe and TgCaller.
+
+    All chunk storage is preallocated once as a single bytearray and handed
+    out as memoryview slices, so steady-state playback does not allocate a
+    new bytes object per read. Reading from the pipe is driven by the event
+    loop's reader callback instead of a StreamReader.
+    """
+
+    def __init__(
+        self,
+        chat_id: int,
+        fd: int,
+        chunk_size: int = None,
+        depth: int = None,
+        prefill: int = None,
+        on_eof: Optional[Callable[[int], None]] = None,
+        sample_rate: int = 48000,
+        channels: int = 2
+    ):
+        self.chat_id = chat_id
+        self.fd = fd
+        # Format of the PCM in the pipe, for turning bytes into playback time
+        self.bytes_per_second = pcm_bytes_per_second(sample_rate, channels)
+        self.chunk_size = chunk_size or pcm_chunk_size(sample_rate, channels=channels)
+        self.depth = max(2, depth or Config.JITTER_BUFFER_DEPTH)
+        self.prefill = min(self.depth, max(1, prefill or Config.JITTER_BUFFER_PREFILL))
+        self.on_eof = on_eof
+
+        self._storage = bytearray(self.chunk_size * self.depth)
+        view = memoryview(self._storage)
+        self._slots = [
+            view[i * self.chunk_size:(i + 1) * self.chunk_size]
+            for i in range(self.depth)
+        ]
+        self._filled = [0] * self.depth
+
+        self._head = 0          # next complete slot to hand out
+        self._tail = 0          # slot currently being written
+        self._ready = 0         # complete slots waiting to be read
+        self._lent: Optional[int] = None  # slot currently held by the reader
+        self._lent_offset = 0
+
+        self._primed = False
+        self._eof = False
+        self._closed = False
+        self._reading = False
+        self._waiter: Optional[asyncio.Future] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Stats
+        self.underruns = 0
+        self.overruns = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def start(self):
+        """Start pulling data from the pipe"""
+        self._loop = asyncio.get_event_loop()
+        os.set_blocking(self.fd, False)
+        self._resume_reading()
+
+    def _resume_reading(self):
+        if not self._reading and not self._eof and not self._closed:
+            self._loop.add_reader(self.fd, self._on_readable)
+            self._reading = True
+
+    def _pause_reading(self):
+        if self._reading:
+            self._loop.remove_reader(self.fd)
+            self._reading = False
+
+    def _occupied(self) -> int:
+        return self._ready + (1 if self._lent is not None else 0)
+
+    def _on_readable(self):
+        """Read directly into the current tail slot"""
+        tail = self._tail
+        offset = self._filled[tail]
+        try:
+            n = os.readv(self.fd, [self._slots[tail][offset:]])
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logger.warning(f"⚠️ PIPE BUFFER: Read error in {self.chat_id}: {e}")
+            n = 0
+
+        if n == 0:
+            self._set_eof()
+            return
+
+        self.bytes_in += n
+        self._filled[tail] += n
+        if self._filled[tail] < self.chunk_size:
+            return
+
+        # Slot complete
+        self._tail = (tail + 1) % self.depth
+        self._ready += 1
+        if not self._primed and self._ready >= self.prefill:
+            self._primed = True
+        if self._primed:
+            self._wake()
+
+        if self._occupied() >= self.depth:
+            # Consumer is behind; let ffmpeg block on the pipe until a slot frees
+            self.overruns += 1
+            self._pause_reading()
+
+    def _set_eof(self):
+        self._eof = True
+        self._pause_reading()
+        # A trailing partial chunk is still playable
+        if self._filled[self._tail] > 0:
+            self._tail = (self._tail + 1) % self.depth
+            self._ready += 1
+        self._wake()
+        if self.on_eof:
+            try:
+                self.on_eof(self.chat_id)
+            except Exception as e:
+                logger.error(f"❌ PIPE BUFFER: EOF callback error: {e}")
+
+    def _wake(self):
+        if self._waiter and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _release_lent(self):
+        if self._lent is None:
+            return
+        self._filled[self._lent] = 0
+        self._lent = None
+        self._lent_offset = 0
+        self._resume_reading()
+
+    async def read(self, n: int = -1) -> memoryview:
+        """Return up to ``n`` bytes of the next chunk.
+
+        The returned view is only valid until the next call to ``read``.
+        An empty view signals end of stream.
+        """
+        if self._lent is not None:
+            remaining = self._filled[self._lent] - self._lent_offset
+            if remaining > 0:
+                return self._take(self._lent, n)
+            self._release_lent()
+
+        while not self._eof and not self._closed and (self._ready == 0 or not self._primed):
+            if self._primed:
+                # Ran dry mid-stream: count it and rebuild the jitter buffer
+                self.underruns += 1
+                self._primed = False
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        if self._closed or self._ready == 0:
+            return memoryview(b"")
+
+        slot = self._head
+        self._head = (self._head + 1) % self.depth
+        self._ready -= 1
+        self._lent = slot
+        self._lent_offset = 0
+        return self._take(slot, n)
+
+    def _take(self, slot: int, n: int) -> memoryview:
+        start = self._lent_offset
+        end = self._filled[slot]
+        if n is not None and n >= 0:
+            end = min(end, start + n)
+        self._lent_offset = end
+        self.bytes_out += end - start
+        return self._slots[slot][start:end]
+
+    def at_eof(self) -> bool:
+        """StreamReader-compatible EOF check"""
+        return self._eof and self._ready == 0 and (
+            self._lent is None or self._lent_offset >= self._filled[self._lent]
+        )
+
+    def buffered_ms(self) -> int:
+        """Approximate buffered audio in milliseconds"""
+        return self._ready * self.chunk_size * 1000 // self.bytes_per_second
+
+    def get_stats(self) -> Dict:
+        """Get buffer statistics"""
+        return {
+            "depth": self.depth,
+            "prefill": self.prefill,
+            "buffered": self._ready,
+            "buffered_ms": self.buffered_ms(),
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "eof": self._eof
+        }
+
+    def close(self):
+        """Stop reading and close the pipe"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._loop:
+            self._pause_reading()
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self._wake()
@@ -1,9 +1,11 @@
 import logging
 from typing import Dict, Optional
-from collections import defaultdict
-from .bot import tgcaller, app
+from .bot import tgcaller
 from .connection import connection_manager
 from .queue import queue_manager
+from .history import play_history
+from .chatstate import chat_state, deep_size
+from .governor import governor, PRIORITY_COSMETIC
 from .stream_manager import stream_manager
 from .thumbnail import generate_thumbnail
 from ..constants.images import UI_IMAGES
@@ -11,6 +13,12 @@ from ..utils.helpers import format_duration
 
 logger = logging.getLogger(__name__)
 
+# Old now-playing messages are deleted once this many pile up, in one call
+CLEANUP_BATCH = 5
+
+# Most message ids Telegram deletes in one call
+DELETE_BATCH_SIZE = 100
+
 class PlaybackManager:
     """Manages music playback across different chats"""
     
@@ -18,7 +26,7 @@ class PlaybackManager:
         self.current_streams: Dict[int, Dict] = {}
         self.loop_status: Dict[int, Dict] = {}
         self.shuffle_status: Dict[int, bool] = {}
-        self.message_history: Dict[int, list] = defaultdict(list)
+        self.message_history: Dict[int, list] = {}
     
     async def play_track(self, chat_id: int, track: Dict, same_track: bool = False):
         """Play a track in the specified chat"""
@@ -26,15 +34,22 @@ class PlaybackManager:
             if not same_track:
                 self.current_streams[chat_id] = track
             
+            # Tracks that came back from history may still have a valid resolved URL
+            if 'url_expires' in track:
+                source, media_info = play_history.playable(track)
+            else:
+                source, media_info = track['url'], None
+            
             # Use stream manager for playback
             success = await stream_manager.start_stream(
                 chat_id, 
-                track['url'], 
-                video=track.get('is_video', False)
+                source, 
+                video=track.get('is_video', False),
+                media_info=media_info
             )
             
             if not success:
-                await app.send_message(chat_id, "❌ Failed to start playback")
+                await governor.send_message(chat_id, "❌ Failed to start playback")
                 return False
             
             # Send now playing message
@@ -47,14 +62,14 @@ class PlaybackManager:
             )
             
             caption = self._format_now_playing(track)
-            msg = await app.send_photo(
+            msg = await governor.send_photo(
                 chat_id,
                 photo=thumb,
                 caption=caption
             )
             
             # Track message for cleanup
-            self.message_history[chat_id].append(msg.id)
+            self.message_history.setdefault(chat_id, []).append(msg.id)
             await self._cleanup_old_messages(chat_id)
             
             logger.info(f"Now playing in {chat_id}: {track['title']}")
@@ -62,7 +77,7 @@ class PlaybackManager:
             
         except Exception as e:
             logger.error(f"Playback error in chat {chat_id}: {e}")
-            await app.send_message(chat_id, f"❌ Playback error: {str(e)}")
+            await governor.send_message(chat_id, f"❌ Playback error: {str(e)}")
             return False
     
     async def play_next_track(self, chat_id: int, same_track: bool = False):
@@ -80,7 +95,7 @@ class PlaybackManager:
             
         except Exception as e:
             logger.error(f"Error playing next track in {chat_id}: {e}")
-            await app.send_message(chat_id, f"❌ Error playing next track: {str(e)}")
+            await governor.send_message(chat_id, f"❌ Error playing next track: {str(e)}")
     
     async def pause_playback(self, chat_id: int) -> bool:
         """Pause playback"""
@@ -106,6 +121,72 @@ class PlaybackManager:
             return True
         return False
     
+    async def _play_record(self, chat_id: int, record: Dict) -> bool:
+        """Stream a history record, reusing its resolved URL when still valid"""
+        source, media_info = play_history.playable(record)
+        success = await stream_manager.start_stream(
+            chat_id,
+            source,
+            video=record.get('is_video', False),
+            media_info=media_info
+        )
+        if success:
+            self.current_streams[chat_id] = record
+        return success
+    
+    async def play_previous(self, chat_id: int) -> Optional[Dict]:
+        """Go back to the previous track; the current one is queued up next"""
+        record, current = await play_history.previous(chat_id)
+        if not record:
+            return None
+        if not await self._play_record(chat_id, record):
+            play_history.undo_previous(chat_id, current)
+            return None
+        try:
+            await queue_manager.insert_next(chat_id, current)
+        except Exception as e:
+            logger.warning(f"Could not requeue {current.get('title')} in {chat_id}: {e}")
+        return record
+    
+    async def replay(self, chat_id: int) -> Optional[Dict]:
+        """Play the latest track again from the start"""
+        record = await play_history.current(chat_id)
+        if not record or not await self._play_record(chat_id, record):
+            return None
+        return record
+    
+    # Chat state provider
+    
+    def chat_state_busy(self, chat_id: int) -> bool:
+        return chat_id in self.current_streams or stream_manager.is_streaming(chat_id)
+    
+    def chat_state_size(self, chat_id: int) -> int:
+        return sum(
+            deep_size(store.get(chat_id))
+            for store in (self.current_streams, self.loop_status, self.shuffle_status, self.message_history)
+        )
+    
+    def export_chat_state(self, chat_id: int) -> Optional[Dict]:
+        state = {
+            'loop': self.loop_status.get(chat_id),
+            'shuffle': self.shuffle_status.get(chat_id),
+            'messages': self.message_history.get(chat_id)
+        }
+        state = {key: value for key, value in state.items() if value}
+        return state or None
+    
+    def import_chat_state(self, chat_id: int, state: Dict):
+        if state.get('loop'):
+            self.loop_status[chat_id] = state['loop']
+        if state.get('shuffle'):
+            self.shuffle_status[chat_id] = state['shuffle']
+        if state.get('messages'):
+            self.message_history[chat_id] = state['messages']
+    
+    def evict_chat_state(self, chat_id: int):
+        for store in (self.current_streams, self.loop_status, self.shuffle_status, self.message_history):
+            store.pop(chat_id, None)
+    
     def get_current_track(self, chat_id: int) -> Optional[Dict]:
         """Get currently playing track"""
         return self.current_streams.get(chat_id)
@@ -132,7 +213,7 @@ class PlaybackManager:
         
         if chat_id not in self.loop_status or self.loop_status[chat_id]['count'] == 0:
             await connection_manager.release_connection(chat_id)
-            await app.send_photo(
+            await governor.send_photo(
                 chat_id,
                 UI_IMAGES["player"],
                 caption="⏹ Playback ended"
@@ -153,13 +234,17 @@ class PlaybackManager:
     
     async def _cleanup_old_messages(self, chat_id: int, keep_last: int = 5):
         """Clean up old messages"""
-        if chat_id in self.message_history and len(self.message_history[chat_id]) > keep_last:
-            for msg_id in self.message_history[chat_id][:-keep_last]:
+        if chat_id in self.message_history and len(self.message_history[chat_id]) >= keep_last + CLEANUP_BATCH:
+            old = self.message_history[chat_id][:-keep_last]
+            self.message_history[chat_id] = self.message_history[chat_id][-keep_last:]
+            for start in range(0, len(old), DELETE_BATCH_SIZE):
                 try:
-                    await app.delete_messages(chat_id, msg_id)
+                    await governor.delete_messages(
+                        chat_id, old[start:start + DELETE_BATCH_SIZE], priority=PRIORITY_COSMETIC
+                    )
                 except Exception:
                     pass
-            self.message_history[chat_id] = self.message_history[chat_id][-keep_last:]
 
 # Global playback manager instance
 playback_manager = PlaybackManager()
+chat_state.register("playback", playback_manager)
@@ -1,67 +1,197 @@
-import os
+import time
 import asyncio
 import logging
 import concurrent.futures
+from typing import Dict, List, Optional
+import psutil
 from .config import Config
 
 logger = logging.getLogger(__name__)
 
+# Transcoding profiles, best quality first. Audio is always 48 kHz stereo
+# PCM (what the call expects); lower profiles use a shorter resampling
+# filter, which is cheaper for sources at other rates (e.g. 44.1 kHz).
+# Video settings are what TgCaller encodes the call's video at.
+TRANSCODE_PROFILES: Dict[str, Dict] = {
+    "high": {
+        "resample_filter_size": 32,
+        "width": 1280,
+        "height": 720,
+        "fps": 30,
+        "video_bitrate": 1500000,
+        "threads": 2
+    },
+    "medium": {
+        "resample_filter_size": 16,
+        "width": 854,
+        "height": 480,
+        "fps": 24,
+        "video_bitrate": 1000000,
+        "threads": 2
+    },
+    "low": {
+        "resample_filter_size": 8,
+        "width": 640,
+        "height": 360,
+        "fps": 15,
+        "video_bitrate": 600000,
+        "threads": 1
+    },
+    "minimal": {
+        "resample_filter_size": 4,
+        "width": 426,
+        "height": 240,
+        "fps": 15,
+        "video_bitrate": 300000,
+        "threads": 1
+    }
+}
+PROFILE_ORDER: List[str] = list(TRANSCODE_PROFILES.keys())
+
+# s16le PCM written to the audio pipe
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_CHANNELS = 2
+
+
 class ProcessManager:
     """Manages FFmpeg processes and system resources"""
-    
+
     def __init__(self):
         self.max_processes = Config.FFMPEG_PROCESSES
-        self.current_processes = 0
         self.lock = asyncio.Lock()
         self.executor = concurrent.futures.ThreadPoolExecutor(
             max_workers=self.max_processes
         )
-    
-    async def adjust_processes(self) -> None:
-        """Dynamically adjust process count based on system load"""
-        async with self.lock:
-            try:
-                load = os.getloadavg()[0] if hasattr(os, 'getloadavg') else 1.0
-            except:
-                load = 1.0
-            
-            # Adjust based on load
-            if load > 2.0 and self.max_processes > 2:
-                new_max = max(2, self.max_processes - 1)
-                logger.info(f"⚠️ High load detected. Reducing processes: {self.max_processes} → {new_max}")
-                self.max_processes = new_max
-            elif load < 1.0 and self.max_processes < Config.FFMPEG_PROCESSES:
-                new_max = min(Config.FFMPEG_PROCESSES, self.max_processes + 1)
-                logger.info(f"✅ Low load detected. Increasing processes: {self.max_processes} → {new_max}")
-                self.max_processes = new_max
-            
-            # NOTE: Modifying _max_workers directly (not recommended but works)
-            if self.executor._max_workers != self.max_processes:
-                self.executor._max_workers = self.max_processes
-    
+
+        # Smoothed host measurements
+        self.cpu_percent = 0.0
+        self.memory_percent = 0.0
+        self._last_sample = 0.0
+        self.current_profile = PROFILE_ORDER[0]
+
+        # Prime psutil so the first real sample is meaningful
+        psutil.cpu_percent(interval=None)
+
+    def sample(self, force: bool = False) -> Dict:
+        """Sample host CPU and memory (non-blocking, rate limited)"""
+        now = time.monotonic()
+        if not force and now - self._last_sample < Config.LOAD_SAMPLE_INTERVAL:
+            return self.get_load()
+
+        cpu = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory().percent
+
+        if self._last_sample == 0.0:
+            self.cpu_percent, self.memory_percent = cpu, memory
+        else:
+            # Exponential smoothing so one spike doesn't flip profiles
+            alpha = 0.5
+            self.cpu_percent = alpha * cpu + (1 - alpha) * self.cpu_percent
+            self.memory_percent = alpha * memory + (1 - alpha) * self.memory_percent
+        self._last_sample = now
+
+        self._update_profile()
+        return self.get_load()
+
+    def _update_profile(self):
+        """Pick the host-wide profile from current headroom"""
+        pressure = max(self.cpu_percent, self.memory_percent)
+        if pressure >= Config.LOAD_CRITICAL_PERCENT:
+            profile = "minimal"
+        elif pressure >= Config.LOAD_HIGH_PERCENT:
+            profile = "low"
+        elif pressure >= Config.LOAD_MEDIUM_PERCENT:
+            profile = "medium"
+        else:
+            profile = "high"
+
+        if profile != self.current_profile:
+            arrow = "⚠️ Degrading" if PROFILE_ORDER.index(profile) > PROFILE_ORDER.index(self.current_profile) else "✅ Restoring"
+            logger.info(
+                f"{arrow} transcoding profile: {self.current_profile} → {profile} "
+                f"(cpu {self.cpu_percent:.0f}%, mem {self.memory_percent:.0f}%)"
+            )
+            self.current_profile = profile
+
+    def get_load(self) -> Dict:
+        """Get last sampled host load"""
+        return {
+            "cpu_percent": round(self.cpu_percent, 1),
+            "memory_percent": round(self.memory_percent, 1),
+            "profile": self.current_profile
+        }
+
+    def select_profile(self, is_video: bool = False, floor: Optional[str] = None) -> str:
+        """Choose a profile for a new or restarted stream.
+
+        ``floor`` is the best profile the stream is still allowed to use,
+        e.g. after it was downgraded for hogging resources.
+        """
+        self.sample()
+        profile = self.current_profile
+        if floor and PROFILE_ORDER.index(floor) > PROFILE_ORDER.index(profile):
+            profile = floor
+        if is_video and Config.MAX_VIDEO_PROFILE in TRANSCODE_PROFILES:
+            if PROFILE_ORDER.index(Config.MAX_VIDEO_PROFILE) > PROFILE_ORDER.index(profile):
+                profile = Config.MAX_VIDEO_PROFILE
+        return profile
+
+    def lower_profile(self, profile: str) -> Optional[str]:
+        """Get the next lower profile, or None if already lowest"""
+        index = PROFILE_ORDER.index(profile)
+        if index + 1 < len(PROFILE_ORDER):
+            return PROFILE_ORDER[index + 1]
+        return None
+
+    def build_ffmpeg_command(
+        self,
+        url: str,
+        is_video: bool = False,
+        profile: str = None,
+        seek: float = 0
+    ) -> List[str]:
+        """Build the FFmpeg command for a stream.
+
+        This is the single command builder used for both new and restarted
+        streams.
+        """
+        settings = TRANSCODE_PROFILES[profile or self.current_profile]
+
+        cmd = ['ffmpeg']
+        if url.startswith(('http://', 'https://')):
+            cmd += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+        if seek > 0:
+            cmd += ['-ss', f"{seek:.2f}"]
+        cmd += ['-threads', str(min(settings['threads'], 8)), '-i', url]
+
+        if is_video:
+            cmd += [
+                '-f', 'rawvideo',
+                '-pix_fmt', 'yuv420p',
+                '-vf', f"scale={settings['width']}:{settings['height']}",
+                '-r', str(settings['fps'])
+            ]
+        else:
+            cmd += [
+                '-vn',
+                '-f', 's16le',
+                '-ac', str(AUDIO_CHANNELS),
+                '-af', f"aresample=filter_size={settings['resample_filter_size']}",
+                '-ar', str(AUDIO_SAMPLE_RATE),
+                '-acodec', 'pcm_s16le'
+            ]
+
+        cmd += ['-loglevel', 'error', '-']
+        return cmd
+
+    def get_profile(self, profile: str) -> Dict:
+        """Get profile settings"""
+        return TRANSCODE_PROFILES[profile]
+
     async def get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
         """Get the thread pool executor"""
-        await self.adjust_processes()
         return self.executor
-    
-    def get_ffmpeg_options(self, chat_id: int, is_video: bool = False) -> dict:
-        """Get optimized FFmpeg options"""
-        base_options = {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-            'options': '-vn' if not is_video else ''
-        }
 
-        # Adjust buffer size
-        if chat_id < 0:  # Group
-            base_options['options'] += ' -bufsize 1024k'
-        else:  # Private
-            base_options['options'] += ' -bufsize 512k'
-
-        # Threads per process (limit to 8)
-        base_options['options'] += f' -threads {min(self.max_processes, 8)}'
-        
-        return base_options
-    
     async def cleanup(self):
         """Cleanup resources"""
         if self.executor:
@@ -1,133 +1,755 @@
 import asyncio
 import logging
-from typing import Dict, List, Optional
-from collections import defaultdict
+import random
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
 from datetime import datetime
+from itertools import islice
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
 from .database import db
 from .config import Config
+from .chatstate import chat_state, deep_size
+from ..utils.orderkey import key_between, spread_keys
 
 logger = logging.getLogger(__name__)
 
+# Bookkeeping fields of a queue entry that are not part of the track
+ENTRY_FIELDS = ('_id', '_order', '_partial', '_round')
+
+QUEUE_MODES = ('fifo', 'fair')
+
+# Heavy track fields left out when loading a queue; fetched when the track plays
+LIGHT_PROJECTION = {"track.description": 0}
+
 class QueueManager:
-    """Manages music queues for different chats"""
-    
+    """Manages music queues for different chats
+
+    Every queued entry is the track dict plus a stable ``_id`` (the Mongo
+    document id) and a lexicographic order key ``_order``. Documents are
+    indexed on (chat_id, order), so inserting or moving an entry rewrites
+    that entry only and pages of the queue come straight off the index.
+    Database writes and deletes address entries by ``_id`` only.
+
+    After a restart a chat's queue is hydrated lazily on first touch: only
+    the head is loaded (without heavy fields) and further tracks are read
+    in index order as positions past it are needed. The in-memory queue is
+    always a contiguous prefix of the full queue.
+
+    The in-memory queue is authoritative. Mutations are recorded in a
+    per-chat write-behind journal and flushed with one ordered
+    ``bulk_write`` every QUEUE_FLUSH_INTERVAL seconds (the durability
+    window) or once QUEUE_FLUSH_BATCH operations are pending:
+      * mutations of one chat reach MongoDB in the order they happened;
+      * operations on the same entry are coalesced (an entry added and
+        played within one window never touches the database);
+      * a failed flush is retried from the first operation that failed,
+        with later mutations applied after it. Inserts of a failed batch
+        may already be stored, so they are retried as ``upsert`` and no
+        longer cancel out against a later delete.
+    QUEUE_FLUSH_INTERVAL=0 writes through on every mutation.
+
+    In ``fair`` mode (set per chat in user_settings) each requester gets
+    ``weight`` slots (default 1) per round, and a new track is placed at the
+    end of the first round in which its requester still has a free slot.
+    The queue itself is kept in that effective order, so picking the next
+    track stays a popleft and previews and persisted order match playback.
+    """
+
     def __init__(self):
-        self.queues: Dict[int, List[Dict]] = defaultdict(list)
-        self.locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
-    
-    async def add_to_queue(self, chat_id: int, track: Dict) -> None:
+        # Plain dicts so lookups never leave entries behind for idle chats
+        self.queues: Dict[int, Deque[Dict]] = {}
+        self.locks: Dict[int, asyncio.Lock] = {}
+
+        # chat_id -> {'clear': bool, 'ops': {entry_id: (kind, payload)}}
+        self._journal: Dict[int, Dict] = {}
+        self._pending = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_now = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Lazy hydration: chats whose persisted queue was looked at, how many of
+        # their tracks are still only in the database, and the last order key there
+        self.hydrated: set = set()
+        self._unloaded: Dict[int, int] = {}
+        self._tails: Dict[int, str] = {}
+
+        # Queue slots held for bulk adds still being written
+        self._reserved: Dict[int, int] = {}
+
+        # Fair-share scheduling: chat mode, requester weights, each requester's
+        # latest round and slots used in it, and the round now playing
+        self.modes: Dict[int, str] = {}
+        self._weights: Dict[int, Dict[int, int]] = {}
+        self._rounds: Dict[int, Dict[int, List[int]]] = {}
+        self._current_round: Dict[int, int] = {}
+
+        self.total_flushes = 0
+        self.total_ops_written = 0
+        self.total_ops_coalesced = 0
+
+    def _lock(self, chat_id: int) -> asyncio.Lock:
+        lock = self.locks.get(chat_id)
+        if lock is None:
+            lock = self.locks[chat_id] = asyncio.Lock()
+        return lock
+
+    @staticmethod
+    def _new_entry(track: Dict) -> Dict:
+        entry = {k: v for k, v in track.items() if k not in ENTRY_FIELDS}
+        entry['_id'] = ObjectId()
+        entry['_order'] = ''
+        return entry
+
+    @staticmethod
+    def _document(chat_id: int, entry: Dict) -> Dict:
+        track = {k: v for k, v in entry.items() if k not in ENTRY_FIELDS}
+        return {
+            "_id": entry['_id'],
+            "chat_id": chat_id,
+            "track": track,
+            "order": entry['_order'],
+            "timestamp": datetime.utcnow()
+        }
+
+    @staticmethod
+    def _from_document(doc: Dict, partial: bool = False) -> Dict:
+        entry = dict(doc['track'])
+        entry['_id'] = doc['_id']
+        entry['_order'] = doc.get('order', '')
+        if partial:
+            entry['_partial'] = True
+        return entry
+
+    def _size(self, chat_id: int) -> int:
+        return (
+            len(self.queues.get(chat_id, ()))
+            + self._unloaded.get(chat_id, 0)
+            + self._reserved.get(chat_id, 0)
+        )
+
+    @staticmethod
+    def _key_at(queue: Deque[Dict], position: int) -> str:
+        """Order key for an entry placed at ``position``"""
+        before = queue[position - 1]['_order'] if position > 0 else None
+        after = queue[position]['_order'] if position < len(queue) else None
+        return key_between(before, after)
+
+    async def _rebalance(self, chat_id: int, queue: Deque[Dict]):
+        """Respread the order keys of a chat once repeated inserts made them long"""
+        for entry, order in zip(queue, spread_keys(len(queue))):
+            entry['_order'] = order
+            await self._persist(chat_id, 'update', entry['_id'], {"order": order})
+        logger.info(f"Rebalanced queue order keys for chat {chat_id}")
+
+    async def _place(self, chat_id: int, queue: Deque[Dict], position: int, entry: Dict):
+        """Put an entry (with a fresh order key) at a position of the queue"""
+        entry['_order'] = self._key_at(queue, position)
+        queue.insert(position, entry)
+        # Respreading needs every key in memory
+        if len(entry['_order']) > Config.QUEUE_ORDER_KEY_MAX and not self._unloaded.get(chat_id):
+            await self._rebalance(chat_id, queue)
+
+    async def _enqueue(self, chat_id: int, entry: Dict):
+        """Put a new entry where the chat's scheduling mode wants it"""
+        if self.modes.get(chat_id) == 'fair':
+            queue = self.queues[chat_id]
+            await self._place(chat_id, queue, self._fair_position(chat_id, queue, entry), entry)
+        else:
+            await self._append(chat_id, entry)
+
+    async def _append(self, chat_id: int, entry: Dict):
+        """Put an entry at the end of the queue"""
+        if not self._unloaded.get(chat_id):
+            await self._place(chat_id, self.queues[chat_id], len(self.queues[chat_id]), entry)
+            return
+        # The end of the queue is not loaded; keep the entry in the database only
+        entry['_order'] = key_between(self._tails.get(chat_id), None)
+        self._tails[chat_id] = entry['_order']
+        self._unloaded[chat_id] += 1
+
+    # Fair-share scheduling
+
+    def _fair_position(self, chat_id: int, queue: Deque[Dict], entry: Dict) -> int:
+        """Give an entry its round and return where it goes in the queue"""
+        user = entry.get('user_id') or 0
+        weight = self._weights.get(chat_id, {}).get(user, 1)
+        current = self._current_round.get(chat_id, 0)
+        rounds = self._rounds.setdefault(chat_id, {})
+
+        state = rounds.get(user)
+        if state is None or state[0] < current:
+            state = [current, 0]
+        if state[1] >= weight:
+            state = [state[0] + 1, 0]
+        state[1] += 1
+        rounds[user] = state
+        entry['_round'] = state[0]
+
+        # Rounds never decrease along the queue: binary search for the end of ours
+        low, high = 0, len(queue)
+        while low < high:
+            middle = (low + high) // 2
+            if queue[middle].get('_round', -1) <= state[0]:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _fit_round(self, queue: Deque[Dict], position: int, entry: Dict):
+        """Give a manually placed entry the round of its neighbours"""
+        if position > 0:
+            entry['_round'] = queue[position - 1].get('_round', -1)
+        elif len(queue) > 1:
+            entry['_round'] = queue[1].get('_round', -1)
+
+    def _reset_rounds(self, chat_id: int):
+        for entry in self.queues.get(chat_id, ()):
+            entry.pop('_round', None)
+        self._rounds.pop(chat_id, None)
+        self._current_round.pop(chat_id, None)
+
+    async def set_mode(self, chat_id: int, mode: str) -> bool:
+        """Switch a chat between plain (fifo) and fair-share scheduling"""
+        if mode not in QUEUE_MODES:
+            return False
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            # Fair placement needs the whole queue in memory
+            if mode == 'fair':
+                await self._load_more(chat_id)
+            self._reset_rounds(chat_id)
+            if mode == 'fifo':
+                self.modes.pop(chat_id, None)
+            else:
+                self.modes[chat_id] = mode
+
+        if db.enabled:
+            try:
+                await db.user_settings.update_one(
+                    {"chat_id": chat_id, "user_id": 0}, {"$set": {"queue_mode": mode}}, upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Failed to save queue mode: {e}")
+        logger.info(f"Queue mode for chat {chat_id}: {mode}")
+        return True
+
+    async def set_weight(self, chat_id: int, user_id: int, weight: int):
+        """Set how many tracks a requester gets per round in fair mode"""
+        weight = max(1, weight)
+        if weight == 1:
+            self._weights.get(chat_id, {}).pop(user_id, None)
+        else:
+            self._weights.setdefault(chat_id, {})[user_id] = weight
+
+        if db.enabled:
+            try:
+                await db.user_settings.update_one(
+                    {"chat_id": chat_id, "user_id": user_id}, {"$set": {"queue_weight": weight}}, upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Failed to save queue weight: {e}")
+
+    async def _load_settings(self, chat_id: int):
+        settings = await db.user_settings.find(
+            {"chat_id": chat_id, "$or": [{"queue_mode": {"$exists": True}}, {"queue_weight": {"$gt": 1}}]}
+        ).to_list(None)
+        for doc in settings:
+            if doc.get('queue_mode') == 'fair':
+                self.modes[chat_id] = 'fair'
+            if doc.get('queue_weight', 1) > 1:
+                self._weights.setdefault(chat_id, {})[doc['user_id']] = doc['queue_weight']
+
+    # Lazy hydration
+
+    async def _hydrate(self, chat_id: int):
+        """Load the head of a chat's persisted queue on first touch"""
+        await chat_state.ensure(chat_id)
+        if chat_id not in self.queues:
+            self.queues[chat_id] = deque()
+        if chat_id in self.hydrated:
+            return
+        if not db.enabled:
+            self.hydrated.add(chat_id)
+            return
+        try:
+            await self._load_settings(chat_id)
+            await self._sync(chat_id)
+            total = await db.channel_queues.count_documents({"chat_id": chat_id})
+            head, last = [], None
+            if total:
+                head = await db.channel_queues.find(
+                    {"chat_id": chat_id}, LIGHT_PROJECTION, sort=[("order", 1)]
+                ).limit(Config.QUEUE_HYDRATE_HEAD).to_list(Config.QUEUE_HYDRATE_HEAD)
+                if total > len(head):
+                    last = await db.channel_queues.find_one(
+                        {"chat_id": chat_id}, {"order": 1}, sort=[("order", -1)]
+                    )
+        except Exception as e:
+            # Not marked hydrated, so the next touch tries again
+            logger.error(f"Failed to load queue from DB: {e}")
+            return
+
+        self.hydrated.add(chat_id)
+        if not total:
+            return
+        self.queues[chat_id].extend(self._from_document(doc, partial=True) for doc in head)
+        if last:
+            self._unloaded[chat_id] = total - len(head)
+            self._tails[chat_id] = last['order']
+        if self.modes.get(chat_id) == 'fair':
+            await self._load_more(chat_id)
+        logger.info(f"Loaded queue of chat {chat_id}: {len(head)}/{total} tracks")
+
+    async def _load_more(self, chat_id: int, count: int = None) -> int:
+        """Read the next ``count`` (default: all) unloaded tracks of a chat"""
+        unloaded = self._unloaded.get(chat_id, 0)
+        if not unloaded:
+            return 0
+        count = min(count or unloaded, unloaded)
+        queue = self.queues[chat_id]
+        query = {"chat_id": chat_id}
+        if queue:
+            query["order"] = {"$gt": queue[-1]['_order']}
+        try:
+            await self._sync(chat_id)
+            docs = await db.channel_queues.find(
+                query, LIGHT_PROJECTION, sort=[("order", 1)]
+            ).limit(count).to_list(count)
+        except Exception as e:
+            logger.error(f"Failed to load queue from DB: {e}")
+            return 0
+
+        queue.extend(self._from_document(doc, partial=True) for doc in docs)
+        if len(docs) < count or unloaded == len(docs):
+            # Reached the end of the stored queue
+            self._unloaded.pop(chat_id, None)
+            self._tails.pop(chat_id, None)
+        else:
+            self._unloaded[chat_id] = unloaded - len(docs)
+        return len(docs)
+
+    async def _ensure_loaded(self, chat_id: int, positions: int):
+        """Make sure the first ``positions`` tracks of a chat are in memory"""
+        missing = positions - len(self.queues.get(chat_id, ()))
+        if missing > 0:
+            await self._load_more(chat_id, max(missing, Config.QUEUE_HYDRATE_HEAD))
+
+    async def _complete(self, entry: Dict) -> Dict:
+        """Fetch the fields a lazily loaded entry was loaded without"""
+        if not entry.pop('_partial', False) or not db.enabled:
+            return entry
+        try:
+            doc = await db.channel_queues.find_one({"_id": entry['_id']})
+            if doc:
+                return self._from_document(doc)
+        except Exception as e:
+            logger.error(f"Failed to load track from DB: {e}")
+        return entry
+
+    # Write-behind journal
+
+    def start(self):
+        """Start the periodic journal flush"""
+        if not self._task and Config.QUEUE_FLUSH_INTERVAL > 0:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"📝 Queue write-behind started ({Config.QUEUE_FLUSH_INTERVAL}s window)")
+
+    async def stop(self):
+        """Stop the flush loop and write out everything pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=Config.QUEUE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def _record(self, chat_id: int, kind: str, entry_id: ObjectId = None, payload=None):
+        """Add one mutation to the journal, coalescing with pending ones"""
+        if kind == 'clear':
+            # Everything pending for the chat is superseded
+            chat = self._journal.get(chat_id)
+            dropped = len(chat['ops']) + chat['clear'] if chat else 0
+            self._pending -= dropped
+            self.total_ops_coalesced += dropped
+            self._journal[chat_id] = {'clear': True, 'ops': OrderedDict()}
+            self._pending += 1
+            return
+
+        chat = self._journal.setdefault(chat_id, {'clear': False, 'ops': OrderedDict()})
+        ops = chat['ops']
+        previous = ops.get(entry_id)
+        if previous is None:
+            ops[entry_id] = (kind, payload)
+            self._pending += 1
+            return
+
+        self.total_ops_coalesced += 1
+        if previous[0] == 'insert' and kind == 'delete':
+            # Never reached the database
+            del ops[entry_id]
+            self._pending -= 1
+        elif previous[0] in ('insert', 'upsert') and kind == 'update':
+            ops[entry_id] = (previous[0], {**previous[1], **payload})
+        elif previous[0] == 'update' and kind == 'update':
+            ops[entry_id] = ('update', {**previous[1], **payload})
+        else:
+            ops[entry_id] = (kind, payload)
+
+    async def _persist(self, chat_id: int, kind: str, entry_id: ObjectId = None, payload=None):
+        if not db.enabled:
+            return
+        self._record(chat_id, kind, entry_id, payload)
+        if Config.QUEUE_FLUSH_INTERVAL <= 0:
+            await self.flush()
+        elif self._pending >= Config.QUEUE_FLUSH_BATCH:
+            self._flush_now.set()
+
+    @staticmethod
+    def _records(journal: Dict[int, Dict]) -> List[Tuple]:
+        records = []
+        for chat_id, chat in journal.items():
+            if chat['clear']:
+                records.append((chat_id, 'clear', None, None))
+            records += [(chat_id, kind, entry_id, payload) for entry_id, (kind, payload) in chat['ops'].items()]
+        return records
+
+    @staticmethod
+    def _operation(chat_id: int, kind: str, entry_id: ObjectId, payload):
+        if kind == 'clear':
+            return DeleteMany({"chat_id": chat_id})
+        if kind in ('insert', 'upsert'):
+            # Upsert so a retried batch stays idempotent
+            return ReplaceOne({"_id": entry_id}, payload, upsert=True)
+        if kind == 'update':
+            return UpdateOne({"_id": entry_id}, {"$set": payload})
+        return DeleteOne({"_id": entry_id})
+
+    def has_pending(self, chat_id: int) -> bool:
+        """Check if a chat has mutations not yet written to the database"""
+        return chat_id in self._journal
+
+    async def flush(self) -> int:
+        """Write all journaled mutations; returns the number of operations"""
+        async with self._flush_lock:
+            if not self._journal or not db.enabled:
+                return 0
+            journal, self._journal, self._pending = self._journal, {}, 0
+            records = self._records(journal)
+            try:
+                await db.channel_queues.bulk_write(
+                    [self._operation(*record) for record in records], ordered=True
+                )
+            except Exception as e:
+                # Ordered writes stop at the first error; everything before it was applied
+                done = 0
+                if isinstance(e, BulkWriteError):
+                    errors = e.details.get('writeErrors') or []
+                    done = errors[0]['index'] if errors else 0
+                logger.error(f"Failed to flush queue journal ({done}/{len(records)} ops written): {e}")
+                # Put the rest of the batch back in front of anything recorded meanwhile
+                newer, self._journal, self._pending = self._journal, {}, 0
+                for chat_id, kind, entry_id, payload in records[done:]:
+                    self._record(chat_id, 'upsert' if kind == 'insert' else kind, entry_id, payload)
+                for record in self._records(newer):
+                    self._record(*record)
+                self.total_ops_written += done
+                return done
+
+            self.total_flushes += 1
+            self.total_ops_written += len(records)
+            return len(records)
+
+    async def _sync(self, chat_id: int):
+        """Make the database current for a chat before reading from it"""
+        if self.has_pending(chat_id):
+            await self.flush()
+
+    async def add_to_queue(self, chat_id: int, track: Dict) -> Dict:
         """Add track to queue"""
-        async with self.locks[chat_id]:
-            if len(self.queues[chat_id]) >= Config.MAX_QUEUE_SIZE:
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            if self._size(chat_id) >= Config.MAX_QUEUE_SIZE:
                 raise Exception(f"Queue limit reached ({Config.MAX_QUEUE_SIZE} tracks)")
-            
-            self.queues[chat_id].append(track)
-            
-            # Save to database
-            if db.enabled:
-                try:
-                    await db.channel_queues.insert_one({
-                        "chat_id": chat_id,
-                        "track": track,
-                        "timestamp": datetime.utcnow()
-                    })
-                except Exception as e:
-                    logger.error(f"Failed to save track to DB: {e}")
-            
+
+            entry = self._new_entry(track)
+            await self._enqueue(chat_id, entry)
+            await self._persist(chat_id, 'insert', entry['_id'], self._document(chat_id, entry))
+
             logger.info(f"Added track to queue {chat_id}: {track.get('title', 'Unknown')}")
-    
+            return entry
+
+    async def add_many(self, chat_id: int, tracks: List[Dict]) -> AsyncIterator[Tuple[int, int]]:
+        """Queue a batch of tracks, yielding (added, total) after each written chunk
+
+        Capacity is checked once for the whole batch: tracks beyond
+        MAX_PLAYLIST_SIZE or the free queue space are dropped, and the slots
+        for the rest are reserved up front. Each chunk of QUEUE_BULK_CHUNK
+        tracks is appended in one step and written with a single insert_many.
+        """
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            room = Config.MAX_QUEUE_SIZE - self._size(chat_id)
+            if room <= 0:
+                raise Exception(f"Queue limit reached ({Config.MAX_QUEUE_SIZE} tracks)")
+            tracks = tracks[:min(room, Config.MAX_PLAYLIST_SIZE)]
+            self._reserved[chat_id] = self._reserved.get(chat_id, 0) + len(tracks)
+
+        total, claimed, added = len(tracks), 0, 0
+        try:
+            for start in range(0, total, Config.QUEUE_BULK_CHUNK):
+                chunk = tracks[start:start + Config.QUEUE_BULK_CHUNK]
+                async with self._lock(chat_id):
+                    await self._hydrate(chat_id)
+                    self._reserved[chat_id] -= len(chunk)
+                    claimed += len(chunk)
+                    entries = [self._new_entry(track) for track in chunk]
+                    for entry in entries:
+                        await self._enqueue(chat_id, entry)
+                    await self._insert_many(chat_id, entries)
+                added += len(chunk)
+                yield added, total
+        finally:
+            # Give back the slots of chunks that were never added
+            self._reserved[chat_id] = self._reserved.get(chat_id, 0) - (total - claimed)
+            if self._reserved[chat_id] <= 0:
+                self._reserved.pop(chat_id, None)
+
+        logger.info(f"Added {added} tracks to queue {chat_id}")
+
+    async def _insert_many(self, chat_id: int, entries: List[Dict]):
+        """Write new entries with one insert_many, behind any pending mutations"""
+        if not db.enabled or not entries:
+            return
+        docs = [self._document(chat_id, entry) for entry in entries]
+        try:
+            await self._sync(chat_id)
+            await db.channel_queues.insert_many(docs, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to save {len(docs)} tracks to DB, retrying via journal: {e}")
+            for doc in docs:
+                await self._persist(chat_id, 'insert', doc['_id'], doc)
+
+    async def insert(self, chat_id: int, position: int, track: Dict) -> Dict:
+        """Insert a track at a queue position (0 = next)"""
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            if self._size(chat_id) >= Config.MAX_QUEUE_SIZE:
+                raise Exception(f"Queue limit reached ({Config.MAX_QUEUE_SIZE} tracks)")
+
+            position = max(0, position)
+            await self._ensure_loaded(chat_id, position + 1)
+            entry = self._new_entry(track)
+            queue = self.queues[chat_id]
+            if position < len(queue):
+                await self._place(chat_id, queue, position, entry)
+                self._fit_round(queue, position, entry)
+            else:
+                await self._append(chat_id, entry)
+            await self._persist(chat_id, 'insert', entry['_id'], self._document(chat_id, entry))
+            return entry
+
+    async def insert_next(self, chat_id: int, track: Dict) -> Dict:
+        """Queue a track to play right after the current one"""
+        return await self.insert(chat_id, 0, track)
+
     async def get_next_track(self, chat_id: int) -> Optional[Dict]:
         """Get next track from queue"""
-        async with self.locks[chat_id]:
-            # Try memory queue first
-            if chat_id in self.queues and self.queues[chat_id]:
-                track = self.queues[chat_id].pop(0)
-                await self._remove_from_db(chat_id, track)
-                return track
-            
-            # Try database queue if enabled
-            if db.enabled:
-                try:
-                    db_track = await db.channel_queues.find_one(
-                        {"chat_id": chat_id},
-                        sort=[("timestamp", 1)]
-                    )
-                    
-                    if db_track:
-                        await db.channel_queues.delete_one({"_id": db_track["_id"]})
-                        return db_track['track']
-                except Exception as e:
-                    logger.error(f"Failed to get track from DB: {e}")
-            
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._ensure_loaded(chat_id, 1)
+            queue = self.queues.get(chat_id)
+            if not queue:
+                return None
+            entry = queue.popleft()
+            if '_round' in entry:
+                self._current_round[chat_id] = entry['_round']
+            await self._persist(chat_id, 'delete', entry['_id'])
+            return await self._complete(entry)
+
+    async def remove(self, chat_id: int, position: int) -> Optional[Dict]:
+        """Remove the track at a queue position"""
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._ensure_loaded(chat_id, position + 1)
+            queue = self.queues.get(chat_id)
+            if not queue or not 0 <= position < len(queue):
+                return None
+            entry = queue[position]
+            del queue[position]
+            await self._persist(chat_id, 'delete', entry['_id'])
+            return entry
+
+    async def remove_range(self, chat_id: int, start: int, end: int) -> List[Dict]:
+        """Remove the tracks at positions ``start`` to ``end`` (inclusive)"""
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._ensure_loaded(chat_id, end + 1)
+            queue = self.queues.get(chat_id)
+            if not queue:
+                return []
+            start, end = max(0, start), min(end, len(queue) - 1)
+            removed = []
+            for _ in range(end - start + 1):
+                entry = queue[start]
+                del queue[start]
+                await self._persist(chat_id, 'delete', entry['_id'])
+                removed.append(entry)
+            return removed
+
+    async def remove_by_id(self, chat_id: int, entry_id) -> Optional[Dict]:
+        """Remove a queued track by its id"""
+        entry_id = ObjectId(entry_id) if not isinstance(entry_id, ObjectId) else entry_id
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._load_more(chat_id)
+            queue = self.queues.get(chat_id) or ()
+            for i, entry in enumerate(queue):
+                if entry['_id'] == entry_id:
+                    del queue[i]
+                    await self._persist(chat_id, 'delete', entry_id)
+                    return entry
             return None
-    
+
+    async def move(self, chat_id: int, from_position: int, to_position: int) -> bool:
+        """Move a track to another queue position; only the moved entry is rewritten"""
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._ensure_loaded(chat_id, max(from_position, to_position) + 1)
+            queue = self.queues.get(chat_id)
+            if not queue or not 0 <= from_position < len(queue):
+                return False
+            to_position = max(0, min(to_position, len(queue) - 1))
+            if to_position == from_position:
+                return True
+            entry = queue[from_position]
+            del queue[from_position]
+            await self._place(chat_id, queue, to_position, entry)
+            self._fit_round(queue, to_position, entry)
+            await self._persist(chat_id, 'update', entry['_id'], {"order": entry['_order']})
+            return True
+
     async def clear_queue(self, chat_id: int) -> int:
         """Clear all tracks from queue"""
-        async with self.locks[chat_id]:
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
             # Clear memory queue
-            queue_size = len(self.queues.get(chat_id, []))
+            queue_size = self._size(chat_id)
             if chat_id in self.queues:
                 self.queues[chat_id].clear()
-            
+            self._unloaded.pop(chat_id, None)
+            self._tails.pop(chat_id, None)
+            self._reset_rounds(chat_id)
+
             # Clear database queue
-            db_deleted = 0
-            if db.enabled:
-                try:
-                    result = await db.channel_queues.delete_many({"chat_id": chat_id})
-                    db_deleted = result.deleted_count
-                except Exception as e:
-                    logger.error(f"Failed to clear DB queue: {e}")
-            
-            total_cleared = queue_size + db_deleted
-            logger.info(f"Cleared queue for chat {chat_id}: {total_cleared} tracks")
-            return total_cleared
-    
-    async def get_queue(self, chat_id: int, limit: int = 10) -> List[Dict]:
-        """Get current queue"""
-        async with self.locks[chat_id]:
-            memory_queue = self.queues.get(chat_id, [])[:limit]
-            
-            if len(memory_queue) < limit and db.enabled:
-                # Get additional tracks from database
-                try:
-                    remaining = limit - len(memory_queue)
-                    db_tracks = await db.channel_queues.find(
-                        {"chat_id": chat_id},
-                        sort=[("timestamp", 1)]
-                    ).limit(remaining).to_list(remaining)
-                    
-                    db_queue = [track['track'] for track in db_tracks]
-                    return memory_queue + db_queue
-                except Exception as e:
-                    logger.error(f"Failed to get DB queue: {e}")
-            
-            return memory_queue
-    
+            await self._persist(chat_id, 'clear')
+
+            logger.info(f"Cleared queue for chat {chat_id}: {queue_size} tracks")
+            return queue_size
+
+    async def get_queue(self, chat_id: int, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Get a page of the current queue"""
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._ensure_loaded(chat_id, offset + limit)
+            return list(islice(self.queues.get(chat_id, ()), offset, offset + limit))
+
+    def peek(self, chat_id: int, limit: int = 10) -> List[Dict]:
+        """Get the head of the in-memory queue without locking"""
+        return list(islice(self.queues.get(chat_id, ()), limit))
+
     async def shuffle_queue(self, chat_id: int) -> bool:
         """Shuffle the queue"""
-        async with self.locks[chat_id]:
-            if chat_id in self.queues and self.queues[chat_id]:
-                import random
-                random.shuffle(self.queues[chat_id])
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            await self._load_more(chat_id)
+            self._reset_rounds(chat_id)
+            queue = self.queues.get(chat_id)
+            if queue:
+                # Deal the existing keys out again; only entries whose key changed are written
+                keys = [entry['_order'] for entry in queue]
+                entries = list(queue)
+                random.shuffle(entries)
+                queue.clear()
+                for entry, order in zip(entries, keys):
+                    if entry['_order'] != order:
+                        entry['_order'] = order
+                        await self._persist(chat_id, 'update', entry['_id'], {"order": order})
+                    queue.append(entry)
                 logger.info(f"Shuffled queue for chat {chat_id}")
                 return True
             return False
-    
-    async def _remove_from_db(self, chat_id: int, track: Dict):
-        """Remove track from database"""
-        if not db.enabled:
-            return
-        try:
-            await db.channel_queues.delete_one({
-                "chat_id": chat_id,
-                "track.title": track.get('title', '')
-            })
-        except Exception as e:
-            logger.error(f"Error removing track from DB: {e}")
-    
-    def get_queue_size(self, chat_id: int) -> int:
+
+    async def get_queue_size(self, chat_id: int) -> int:
         """Get queue size"""
-        return len(self.queues.get(chat_id, []))
+        async with self._lock(chat_id):
+            await self._hydrate(chat_id)
+            return self._size(chat_id)
+
+    # Chat state provider
+
+    def chat_state_busy(self, chat_id: int) -> bool:
+        lock = self.locks.get(chat_id)
+        return bool(lock and lock.locked()) or chat_id in self._journal or chat_id in self._reserved
+
+    def chat_state_size(self, chat_id: int) -> int:
+        return deep_size(self.queues.get(chat_id)) + deep_size(self._rounds.get(chat_id))
+
+    def export_chat_state(self, chat_id: int) -> Optional[Dict]:
+        state = {}
+        if self._rounds.get(chat_id):
+            state['rounds'] = self._rounds[chat_id]
+            state['current_round'] = self._current_round.get(chat_id, 0)
+        if not db.enabled:
+            # Nothing else has these; with MongoDB they are hydrated again
+            if self.queues.get(chat_id):
+                state['queue'] = list(self.queues[chat_id])
+            if chat_id in self.modes:
+                state['mode'] = self.modes[chat_id]
+            if self._weights.get(chat_id):
+                state['weights'] = self._weights[chat_id]
+        return state or None
+
+    def import_chat_state(self, chat_id: int, state: Dict):
+        if state.get('rounds'):
+            self._rounds[chat_id] = {int(user): value for user, value in state['rounds'].items()}
+            self._current_round[chat_id] = state.get('current_round', 0)
+        if state.get('queue'):
+            self.queues[chat_id] = deque({**entry, '_id': ObjectId(entry['_id'])} for entry in state['queue'])
+        if state.get('mode'):
+            self.modes[chat_id] = state['mode']
+        if state.get('weights'):
+            self._weights[chat_id] = {int(user): weight for user, weight in state['weights'].items()}
+
+    def evict_chat_state(self, chat_id: int):
+        for store in (self.queues, self._unloaded, self._tails, self.modes,
+                      self._weights, self._rounds, self._current_round, self.locks):
+            store.pop(chat_id, None)
+        self.hydrated.discard(chat_id)
+
+    def get_stats(self) -> Dict:
+        """Get write-behind statistics"""
+        return {
+            "pending_ops": self._pending,
+            "pending_chats": len(self._journal),
+            "hydrated_chats": len(self.hydrated),
+            "flushes": self.total_flushes,
+            "ops_written": self.total_ops_written,
+            "ops_coalesced": self.total_ops_coalesced
+        }
 
 # Global queue manager instance
 queue_manager = QueueManager()
+chat_state.register("queue", queue_manager)
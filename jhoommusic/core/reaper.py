@@ -0,0 +1,185 @@
+import time
+import heapq
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class IdleReaper:
+    """Leaves voice chats that have gone silent or empty.
+
+    Every chat has at most one live deadline in a min-heap; superseded
+    entries are skipped lazily when they surface, so the reaper only wakes
+    up for the next chat that is actually due instead of polling all chats.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+
+        # Per-chat activity (chats we are in a voice chat of)
+        self.tracked: set = set()
+        self.idle_since: Dict[int, float] = {}
+        self.expected_end: Dict[int, float] = {}
+        self.participants: Dict[int, int] = {}
+        self.empty_since: Dict[int, float] = {}
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.reclaimed = 0
+        self.reclaimed_idle = 0
+        self.reclaimed_empty = 0
+
+    def start(self):
+        """Start the reaper loop"""
+        if not self._task:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("🧹 Idle reaper started")
+
+    async def stop(self):
+        """Stop the reaper loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # Activity signals
+
+    def mark_active(self, chat_id: int, remaining: float = 0):
+        """Audio is playing; ``remaining`` seconds are left if known (0 = live/unknown)"""
+        self.tracked.add(chat_id)
+        self.idle_since.pop(chat_id, None)
+        if remaining > 0:
+            self.expected_end[chat_id] = time.monotonic() + remaining
+        else:
+            self.expected_end.pop(chat_id, None)
+        self._reschedule(chat_id)
+
+    def mark_idle(self, chat_id: int):
+        """Nothing audible is playing (paused, ended or joined without a stream)"""
+        self.tracked.add(chat_id)
+        self.idle_since.setdefault(chat_id, time.monotonic())
+        self.expected_end.pop(chat_id, None)
+        self._reschedule(chat_id)
+
+    def update_participants(self, chat_id: int, count: int):
+        """Record the participant count of a chat's voice chat"""
+        if chat_id not in self.tracked:
+            return  # not our call; don't keep state we'd never clear
+        self.participants[chat_id] = count
+        if count <= 1:
+            # Only the bot (or nobody) is left
+            self.empty_since.setdefault(chat_id, time.monotonic())
+        else:
+            self.empty_since.pop(chat_id, None)
+        self._reschedule(chat_id)
+
+    def forget(self, chat_id: int):
+        """Stop tracking a chat (we left its voice chat)"""
+        self.tracked.discard(chat_id)
+        self._deadlines.pop(chat_id, None)
+        self.idle_since.pop(chat_id, None)
+        self.expected_end.pop(chat_id, None)
+        self.empty_since.pop(chat_id, None)
+        self.participants.pop(chat_id, None)
+
+    # Scheduling
+
+    def _deadline_for(self, chat_id: int) -> Optional[float]:
+        candidates = []
+        if chat_id in self.idle_since:
+            candidates.append(self.idle_since[chat_id] + Config.IDLE_TIMEOUT)
+        if chat_id in self.expected_end:
+            candidates.append(self.expected_end[chat_id] + Config.IDLE_TIMEOUT)
+        if chat_id in self.empty_since:
+            candidates.append(self.empty_since[chat_id] + Config.EMPTY_TIMEOUT)
+        return min(candidates) if candidates else None
+
+    def _reschedule(self, chat_id: int):
+        deadline = self._deadline_for(chat_id)
+        if deadline is None:
+            self._deadlines.pop(chat_id, None)
+            return
+        self._deadlines[chat_id] = deadline
+        heapq.heappush(self._heap, (deadline, chat_id))
+        if self._wakeup and self._heap[0][1] == chat_id:
+            self._wakeup.set()
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap:
+            deadline, chat_id = self._heap[0]
+            if self._deadlines.get(chat_id) != deadline:
+                heapq.heappop(self._heap)  # superseded
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self._heap)
+            del self._deadlines[chat_id]
+            due.append(chat_id)
+        return due
+
+    async def _run(self):
+        while True:
+            timeout = None
+            now = time.monotonic()
+            self._pop_due(float("-inf"))  # drop stale heads
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - now)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            for chat_id in self._pop_due(time.monotonic()):
+                try:
+                    await self._reap(chat_id)
+                except Exception as e:
+                    logger.error(f"❌ Reaper error in {chat_id}: {e}")
+
+    async def _reap(self, chat_id: int):
+        from .stream_manager import stream_manager
+        from .connection import connection_manager
+
+        empty = chat_id in self.empty_since
+        if stream_manager.is_streaming(chat_id):
+            await stream_manager.stop_stream(chat_id)
+        elif connection_manager.is_connected(chat_id):
+            await connection_manager.release_connection(chat_id)
+        else:
+            self.forget(chat_id)
+            return
+
+        self.forget(chat_id)
+        self.reclaimed += 1
+        if empty:
+            self.reclaimed_empty += 1
+        else:
+            self.reclaimed_idle += 1
+        logger.info(
+            f"🧹 Reaped {'empty' if empty else 'idle'} voice chat {chat_id} "
+            f"(total reclaimed: {self.reclaimed})"
+        )
+
+    def get_stats(self) -> Dict:
+        """Get reaper statistics"""
+        return {
+            "tracked": len(self.tracked),
+            "scheduled": len(self._deadlines),
+            "reclaimed": self.reclaimed,
+            "reclaimed_idle": self.reclaimed_idle,
+            "reclaimed_empty": self.reclaimed_empty
+        }
+
+# Global idle reaper instance
+idle_reaper = IdleReaper()
@@ -0,0 +1,191 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import psutil
+from .config import Config
+from .process import process_manager
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceMonitor:
+    """Per-chat CPU, memory and pipe throughput accounting of FFmpeg children.
+
+    Chats that use far more than their fair share of the FFmpeg CPU budget
+    are first reniced; video chats are then restarted on a lower
+    transcoding profile.
+    """
+
+    def __init__(self, stream_manager):
+        self.stream_manager = stream_manager
+        self.usage: Dict[int, Dict] = {}
+        self._processes: Dict[int, psutil.Process] = {}
+        self._previous: Dict[int, Dict] = {}
+        self._strikes: Dict[int, int] = {}
+        self._niced: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_niced = 0
+        self.total_downgraded = 0
+
+    def start(self):
+        """Start the background sampler"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+            logger.info("📈 Resource monitor started")
+
+    async def stop(self):
+        """Stop the background sampler"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.RESOURCE_SAMPLE_INTERVAL)
+            try:
+                self.sample()
+                await self._enforce_fairness()
+            except Exception as e:
+                logger.error(f"❌ Resource monitor error: {e}")
+
+    def _get_process(self, chat_id: int, pid: int) -> Optional[psutil.Process]:
+        proc = self._processes.get(chat_id)
+        if proc is None or proc.pid != pid:
+            try:
+                proc = psutil.Process(pid)
+            except psutil.Error:
+                return None
+            self._processes[chat_id] = proc
+            # A new FFmpeg (restart, next track) starts at normal priority
+            self._previous.pop(chat_id, None)
+            self._niced.pop(chat_id, None)
+        return proc
+
+    def sample(self) -> Dict[int, Dict]:
+        """Sample every chat's FFmpeg process"""
+        now = time.monotonic()
+        usage: Dict[int, Dict] = {}
+
+        for chat_id, process in list(self.stream_manager.ffmpeg_processes.items()):
+            if process is None or process.returncode is not None:
+                continue
+            proc = self._get_process(chat_id, process.pid)
+            if proc is None:
+                continue
+
+            try:
+                with proc.oneshot():
+                    times = proc.cpu_times()
+                    cpu_time = times.user + times.system
+                    rss = proc.memory_info().rss
+                    nice = proc.nice()
+            except psutil.Error:
+                continue
+
+            buffer = self.stream_manager.pipe_buffers.get(chat_id)
+            bytes_in = buffer.bytes_in if buffer else 0
+
+            previous = self._previous.get(chat_id)
+            cpu_percent = 0.0
+            throughput = 0.0
+            if previous:
+                elapsed = max(1e-6, now - previous['at'])
+                cpu_percent = 100 * (cpu_time - previous['cpu_time']) / elapsed
+                throughput = max(0, bytes_in - previous['bytes_in']) / elapsed
+            self._previous[chat_id] = {'at': now, 'cpu_time': cpu_time, 'bytes_in': bytes_in}
+
+            stream = self.stream_manager.get_stream_info(chat_id) or {}
+            usage[chat_id] = {
+                'pid': process.pid,
+                'cpu_percent': round(cpu_percent, 1),
+                'cpu_time': round(cpu_time, 1),
+                'rss': rss,
+                'throughput': int(throughput),
+                'nice': nice,
+                'type': stream.get('type', 'audio'),
+                'profile': stream.get('profile')
+            }
+
+        # Forget chats that no longer have a process
+        for chat_id in list(self._processes):
+            if chat_id not in usage:
+                self._processes.pop(chat_id, None)
+                self._previous.pop(chat_id, None)
+                self._strikes.pop(chat_id, None)
+                self._niced.pop(chat_id, None)
+
+        self.usage = usage
+        return usage
+
+    async def _enforce_fairness(self):
+        """Renice or downgrade chats far above their fair share"""
+        if len(self.usage) < 2:
+            return
+
+        total_cpu = sum(u['cpu_percent'] for u in self.usage.values())
+        fair_share = total_cpu / len(self.usage)
+        limit = max(Config.FAIR_SHARE_MIN_CPU, fair_share * Config.FAIR_SHARE_FACTOR)
+
+        for chat_id, usage in self.usage.items():
+            if usage['cpu_percent'] <= limit:
+                self._strikes.pop(chat_id, None)
+                continue
+
+            strikes = self._strikes.get(chat_id, 0) + 1
+            self._strikes[chat_id] = strikes
+            if strikes < Config.FAIR_SHARE_STRIKES:
+                continue
+            self._strikes[chat_id] = 0
+
+            if chat_id not in self._niced:
+                self._renice(chat_id, usage)
+            else:
+                await self._downgrade(chat_id, usage)
+
+    def _renice(self, chat_id: int, usage: Dict):
+        proc = self._processes.get(chat_id)
+        if not proc:
+            return
+        try:
+            proc.nice(Config.THROTTLE_NICE)
+            self._niced[chat_id] = proc.pid
+            self.total_niced += 1
+            logger.warning(
+                f"🐢 Reniced FFmpeg for {chat_id}: {usage['cpu_percent']}% CPU "
+                f"(nice {Config.THROTTLE_NICE})"
+            )
+        except psutil.Error as e:
+            logger.error(f"❌ Renice failed for {chat_id}: {e}")
+
+    async def _downgrade(self, chat_id: int, usage: Dict):
+        # Audio profiles differ too little to be worth an audible restart
+        if usage.get('type') != 'video':
+            return
+        current = usage.get('profile')
+        lower = process_manager.lower_profile(current) if current else None
+        if not lower:
+            return
+        logger.warning(
+            f"📉 Downgrading {chat_id} ({usage['cpu_percent']}% CPU): {current} → {lower}"
+        )
+        if await self.stream_manager.restart_stream(chat_id, profile=lower):
+            self.total_downgraded += 1
+
+    def get_usage(self, chat_id: int) -> Optional[Dict]:
+        """Get last sampled usage of a chat"""
+        return self.usage.get(chat_id)
+
+    def top_consumers(self, limit: int = 10) -> List[Dict]:
+        """Get chats sorted by CPU usage"""
+        ranked = sorted(
+            ({'chat_id': chat_id, **usage} for chat_id, usage in self.usage.items()),
+            key=lambda u: (u['cpu_percent'], u['rss']),
+            reverse=True
+        )
+        return ranked[:limit]
@@ -0,0 +1,49 @@
+import zlib
+import logging
+from typing import Optional
+from pyrogram import filters
+from pyrogram.types import CallbackQuery, ChatMemberUpdated, InlineQuery, Message
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(chat_id: int, shard_count: int = None) -> int:
+    """Shard that owns a chat (stable across processes and restarts)"""
+    shard_count = shard_count or Config.SHARD_COUNT
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(str(chat_id).encode()) % shard_count
+
+
+def owns_chat(chat_id: Optional[int]) -> bool:
+    """Check if this process' shard owns a chat"""
+    if Config.SHARD_COUNT <= 1:
+        return True
+    if chat_id is None:
+        # Updates without a chat (inline queries) go to the first shard
+        return Config.SHARD_ID == 0
+    return shard_for(chat_id) == Config.SHARD_ID
+
+
+def update_chat_id(update) -> Optional[int]:
+    """Get the chat an update belongs to"""
+    if isinstance(update, Message):
+        return update.chat.id if update.chat else None
+    if isinstance(update, CallbackQuery):
+        if update.message and update.message.chat:
+            return update.message.chat.id
+        return update.from_user.id if update.from_user else None
+    if isinstance(update, ChatMemberUpdated):
+        return update.chat.id
+    if isinstance(update, InlineQuery):
+        return None
+    chat = getattr(update, "chat", None)
+    return chat.id if chat else None
+
+
+async def _owned(_, __, update) -> bool:
+    return owns_chat(update_chat_id(update))
+
+# Filter matching updates of chats owned by this shard
+owned = filters.create(_owned, "OwnedByShard")
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from .config import Config
+from ..utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "snapshot:streams"
+
+
+class SnapshotManager:
+    """Periodic snapshots of per-chat session state for restart recovery.
+
+    Snapshots hold the current track, position, loop mode, queue head and
+    assistant of every active chat. They go to a Redis hash (shared by all
+    instances, so lease takeovers can use them too) or, without Redis, to a
+    local append-only JSONL file that is compacted as it grows.
+    """
+
+    def __init__(self, redis=None, path: str = None):
+        self.redis = redis if redis is not None else redis_client
+        backend = Config.SNAPSHOT_BACKEND
+        if backend == "auto":
+            backend = "redis" if self.redis is not None else "file"
+        self.backend = backend
+        self.path = path or Config.SNAPSHOT_FILE
+        if not path and Config.SHARD_COUNT > 1:
+            root, ext = os.path.splitext(self.path)
+            self.path = f"{root}-shard{Config.SHARD_ID}{ext}"
+
+        self._written: Dict[int, str] = {}
+        self._discarded: set = set()
+        self._appended = 0
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_restored = 0
+        self.last_snapshot_ms = 0.0
+
+    def start(self):
+        """Start periodic snapshots"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"💾 Session snapshots started ({self.backend})")
+
+    async def stop(self, flush: bool = True):
+        """Stop periodic snapshots, writing a final one"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if flush:
+            await self.snapshot()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.SNAPSHOT_INTERVAL)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"❌ SNAPSHOT: Error: {e}")
+
+    def discard(self, chat_id: int):
+        """Forget a chat's session right away (playback was stopped on purpose)"""
+        self._discarded.add(chat_id)
+
+    # Capturing
+
+    def capture(self, chat_id: int) -> Optional[Dict]:
+        """Build the snapshot of one chat from in-memory state"""
+        from .stream_manager import stream_manager
+        from .playback import playback_manager
+        from .queue import queue_manager
+        from .assistants import assistant_pool
+
+        stream = stream_manager.get_stream_info(chat_id)
+        if not stream:
+            return None
+
+        info = stream['info']
+        assistant = assistant_pool.assignments.get(chat_id)
+        return {
+            'chat_id': chat_id,
+            'source': stream['source'],
+            'title': info.get('title', 'Unknown'),
+            'video': stream['type'] == 'video',
+            'position': round(stream_manager.get_position(chat_id), 1),
+            'paused': stream['paused_at'] is not None,
+            'track': playback_manager.current_streams.get(chat_id),
+            'loop': playback_manager.loop_status.get(chat_id),
+            'queue_head': queue_manager.peek(chat_id, Config.SNAPSHOT_QUEUE_HEAD),
+            'assistant': assistant_pool.assistants[assistant].name if assistant is not None else None,
+            'saved_at': time.time()
+        }
+
+    async def snapshot(self) -> int:
+        """Write snapshots of all active chats; returns how many changed"""
+        from .stream_manager import stream_manager
+
+        started = time.monotonic()
+        changed: Dict[int, str] = {}
+        for chat_id in list(stream_manager.active_streams):
+            if chat_id in self._discarded:
+                continue
+            state = self.capture(chat_id)
+            if state is None:
+                continue
+            # Only write chats whose session moved on (ignore the timestamp)
+            encoded = json.dumps(state, default=str, sort_keys=True)
+            fingerprint = json.dumps({**state, 'saved_at': None}, default=str, sort_keys=True)
+            if self._written.get(chat_id) != fingerprint:
+                changed[chat_id] = encoded
+                self._written[chat_id] = fingerprint
+
+        removed = [
+            chat_id for chat_id in self._written
+            if chat_id not in stream_manager.active_streams or chat_id in self._discarded
+        ]
+        removed += [chat_id for chat_id in self._discarded if chat_id not in removed]
+        for chat_id in removed:
+            self._written.pop(chat_id, None)
+        self._discarded.clear()
+
+        if changed or removed:
+            await self._write(changed, removed)
+        self.last_snapshot_ms = (time.monotonic() - started) * 1000
+        return len(changed)
+
+    # Storage
+
+    async def _write(self, changed: Dict[int, str], removed: List[int]):
+        loop = asyncio.get_event_loop()
+        if self.backend == "redis":
+            await loop.run_in_executor(None, self._write_redis, changed, removed)
+        else:
+            await loop.run_in_executor(None, self._write_file, changed, removed)
+
+    def _write_redis(self, changed: Dict[int, str], removed: List[int]):
+        pipe = self.redis.pipeline()
+        if changed:
+            pipe.hset(SNAPSHOT_KEY, mapping={str(k): v for k, v in changed.items()})
+        if removed:
+            pipe.hdel(SNAPSHOT_KEY, *[str(k) for k in removed])
+        pipe.execute()
+
+    def _write_file(self, changed: Dict[int, str], removed: List[int]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for chat_id, encoded in changed.items():
+                f.write(encoded + "\n")
+            for chat_id in removed:
+                f.write(json.dumps({'chat_id': chat_id, 'deleted': True}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._appended += len(changed) + len(removed)
+
+        # Compact once the log is mostly superseded entries
+        if self._appended > 10 * max(10, len(self._written)):
+            self._compact()
+
+    def _compact(self):
+        snapshots = self._read_file()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for state in snapshots.values():
+                f.write(json.dumps(state, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._appended = len(snapshots)
+
+    def _read_file(self) -> Dict[int, Dict]:
+        snapshots: Dict[int, Dict] = {}
+        if not os.path.exists(self.path):
+            return snapshots
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                if entry.get('deleted'):
+                    snapshots.pop(entry['chat_id'], None)
+                else:
+                    snapshots[entry['chat_id']] = entry
+        return snapshots
+
+    def _read_redis(self, chat_id: int = None) -> Dict[int, Dict]:
+        if chat_id is not None:
+            raw = self.redis.hget(SNAPSHOT_KEY, str(chat_id))
+            items = {str(chat_id): raw} if raw else {}
+        else:
+            items = self.redis.hgetall(SNAPSHOT_KEY) or {}
+        snapshots = {}
+        for key, value in items.items():
+            try:
+                snapshots[int(key)] = json.loads(value)
+            except ValueError:
+                continue
+        return snapshots
+
+    async def load(self, chat_id: int = None) -> Dict[int, Dict]:
+        """Load stored snapshots (of one chat, or all)"""
+        loop = asyncio.get_event_loop()
+        try:
+            if self.backend == "redis":
+                return await loop.run_in_executor(None, self._read_redis, chat_id)
+            snapshots = await loop.run_in_executor(None, self._read_file)
+        except Exception as e:
+            logger.error(f"❌ SNAPSHOT: Load error: {e}")
+            return {}
+        if chat_id is not None:
+            return {chat_id: snapshots[chat_id]} if chat_id in snapshots else {}
+        return snapshots
+
+    # Restoring
+
+    async def restore_chat(self, chat_id: int, state: Dict = None) -> bool:
+        """Rejoin a chat and resume its session from a snapshot"""
+        from .stream_manager import stream_manager
+        from .playback import playback_manager
+        from .queue import queue_manager
+        from .assistants import assistant_pool
+        from .database import db
+
+        if state is None:
+            state = (await self.load(chat_id)).get(chat_id)
+        if not state:
+            return False
+        if time.time() - state.get('saved_at', 0) > Config.SNAPSHOT_MAX_AGE:
+            logger.info(f"💾 SNAPSHOT: Skipping stale session of {chat_id}")
+            return False
+
+        # Prefer the assistant the chat had before
+        for assistant in assistant_pool.assistants:
+            if assistant.name == state.get('assistant') and assistant.is_available():
+                assistant_pool.assignments[chat_id] = assistant.index
+                break
+
+        if state.get('track'):
+            playback_manager.current_streams[chat_id] = state['track']
+        if state.get('loop'):
+            playback_manager.loop_status[chat_id] = state['loop']
+        # With MongoDB the queue is already persisted
+        if not db.enabled and state.get('queue_head') and not queue_manager.queues.get(chat_id):
+            for track in state['queue_head']:
+                await queue_manager.add_to_queue(chat_id, track)
+
+        resumed = await stream_manager.start_stream(
+            chat_id,
+            state['source'],
+            video=state.get('video', False),
+            seek=state.get('position', 0)
+        )
+        if not resumed:
+            logger.warning(f"⚠️ SNAPSHOT: Could not resume {chat_id}")
+            return False
+
+        if state.get('paused'):
+            await stream_manager.pause_stream(chat_id)
+        self.total_restored += 1
+        logger.info(f"💾 SNAPSHOT: Resumed {chat_id} at {state.get('position', 0):.0f}s: {state.get('title')}")
+        return True
+
+    async def restore_all(self) -> int:
+        """Resume every stored session with bounded parallelism"""
+        from .sharding import owns_chat
+        from .leases import lease_manager
+
+        started = time.monotonic()
+        snapshots = {
+            chat_id: state for chat_id, state in (await self.load()).items()
+            if owns_chat(chat_id)
+        }
+        if not snapshots:
+            return 0
+
+        logger.info(f"💾 SNAPSHOT: Restoring {len(snapshots)} sessions...")
+        semaphore = asyncio.Semaphore(Config.RESTORE_CONCURRENCY)
+
+        async def restore(chat_id: int, state: Dict) -> Optional[bool]:
+            # None: another instance holds the chat. Its snapshot stays for
+            # that owner, or for take_over once the lease expires.
+            async with semaphore:
+                if await lease_manager.held_elsewhere(chat_id):
+                    return None
+                try:
+                    if await self.restore_chat(chat_id, state):
+                        return True
+                except Exception as e:
+                    logger.error(f"❌ SNAPSHOT: Restore error in {chat_id}: {e}")
+                return None if await lease_manager.held_elsewhere(chat_id) else False
+
+        results = await asyncio.gather(*(restore(c, s) for c, s in snapshots.items()))
+        restored = sum(1 for ok in results if ok)
+        
+        # Don't retry sessions that could not be resumed on every restart
+        failed = [chat_id for chat_id, ok in zip(snapshots, results) if ok is False]
+        if failed:
+            await self._write({}, failed)
+        held = sum(1 for ok in results if ok is None)
+        logger.info(
+            f"✅ SNAPSHOT: Restored {restored}/{len(snapshots)} sessions "
+            f"in {time.monotonic() - started:.1f}s"
+            + (f", {held} left to their lease holder" if held else "")
+        )
+        return restored
+
+    def get_stats(self) -> Dict:
+        """Get snapshot statistics"""
+        return {
+            "backend": self.backend,
+            "tracked": len(self._written),
+            "restored": self.total_restored,
+            "last_snapshot_ms": round(self.last_snapshot_ms, 1)
+        }
+
+# Global snapshot manager instance
+snapshot_manager = SnapshotManager()
@@ -1,9 +1,30 @@
+import os
+import time
 import asyncio
 import logging
 import subprocess
+from contextlib import asynccontextmanager
 from typing import Dict, Optional, Any
-from .bot import tgcaller, app
+from tgcaller import MediaStream, VideoConfig
+from .bot import app
+from .config import Config
+from .assistants import assistant_pool
 from .media_extractor import universal_extractor
+from .pipe_buffer import PipeRingBuffer
+from .process import process_manager, AUDIO_SAMPLE_RATE, AUDIO_CHANNELS
+from .admission import admission_controller
+from .connection import connection_manager
+from .resource_monitor import ResourceMonitor
+from .reaper import idle_reaper
+from .leases import lease_manager
+from .snapshot import snapshot_manager
+from .queue import queue_manager
+from .history import play_history
+from .chatstate import chat_state
+from .activity import activity_tracker
+from .access import access_lists
+from .admins import admin_cache
+from .governor import governor
 
 logger = logging.getLogger(__name__)
 
@@ -13,19 +34,69 @@ class StreamManager:
     def __init__(self):
         self.active_streams: Dict[int, Dict] = {}
         self.ffmpeg_processes: Dict[int, subprocess.Popen] = {}
-        self.stream_lock = asyncio.Lock()
+        self.pipe_buffers: Dict[int, PipeRingBuffer] = {}
+        # chat_id -> [lock, users]; dropped once nobody holds or waits for it
+        self._stream_locks: Dict[int, list] = {}
+        self.resource_monitor = ResourceMonitor(self)
+    
+    @asynccontextmanager
+    async def _chat_lock(self, chat_id: int):
+        """Serialize stream changes in one chat; other chats go on in parallel"""
+        entry = self._stream_locks.get(chat_id)
+        if entry is None:
+            entry = self._stream_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._stream_locks[chat_id]
     
     async def start_stream(self, chat_id: int, source: str, **options) -> bool:
         """Start streaming with TgCaller"""
-        async with self.stream_lock:
+        seek = float(options.pop('seek', 0) or 0)
+        profile = options.pop('profile', None)
+        on_queued = options.pop('on_queued', None)
+        media_info = options.pop('media_info', None)
+        await chat_state.ensure(chat_id)
+        
+        # Only one instance may play in a chat
+        had_lease = lease_manager.owns(chat_id)
+        if not await lease_manager.acquire(chat_id):
+            logger.warning(f"⚠️ STREAM MANAGER: Chat {chat_id} is owned by another instance")
+            return False
+        
+        # Wait for host capacity outside the chat's stream lock
+        was_admitted = admission_controller.is_admitted(chat_id)
+        success = False
+        try:
+            if not await admission_controller.acquire(chat_id, video=options.get('video', False), on_queued=on_queued):
+                logger.warning(f"⚠️ STREAM MANAGER: No capacity for chat {chat_id}")
+                return False
+            success = await self._start_stream_locked(chat_id, source, seek, profile, media_info, **options)
+        finally:
+            if not success:
+                if not was_admitted:
+                    admission_controller.release(chat_id)
+                if not had_lease:
+                    await lease_manager.release(chat_id)
+        return success
+    
+    async def _start_stream_locked(self, chat_id: int, source: str, seek: float, profile: Optional[str],
+                                   media_info: Optional[Dict] = None, **options) -> bool:
+        """Extract, join and start playback under the chat's stream lock"""
+        async with self._chat_lock(chat_id):
             try:
                 logger.info(f"🎵 STREAM MANAGER: Starting stream in chat {chat_id}")
                 logger.info(f"🎵 STREAM MANAGER: Source: {source}")
                 logger.info(f"🎵 STREAM MANAGER: Options: {options}")
                 
-                # Extract media info
-                logger.info(f"🎵 STREAM MANAGER: Extracting media info...")
-                media_info = await universal_extractor.extract(source, **options)
+                # Extract media info (unless the caller still has a valid resolved URL)
+                if media_info is None:
+                    logger.info(f"🎵 STREAM MANAGER: Extracting media info...")
+                    media_info = await universal_extractor.extract(source, **options)
                 logger.info(f"🎵 STREAM MANAGER: Media extraction result: {bool(media_info)}")
                 
                 if not media_info:
@@ -47,23 +118,24 @@ class StreamManager:
                 # Determine stream type
                 is_video = media_info.get('is_video', False) or options.get('video', False)
                 
+                # Pick a transcoding profile from current host load
+                profile = process_manager.select_profile(is_video, floor=profile)
+                
                 logger.info(f"🔗 STREAM MANAGER: Stream URL: {stream_url[:100]}...")
-                logger.info(f"📺 STREAM MANAGER: Video mode: {is_video}")
+                logger.info(f"📺 STREAM MANAGER: Video mode: {is_video}, profile: {profile}")
                 
-                # Join voice chat first
+                # Join voice chat first (reuses a warm connection if we're still in the call)
                 logger.info(f"📞 STREAM MANAGER: Joining voice chat...")
-                try:
-                    await tgcaller.join_group_call(chat_id)
-                    logger.info(f"✅ STREAM MANAGER: Joined voice chat: {chat_id}")
-                except Exception as e:
-                    if "already joined" not in str(e).lower():
-                        logger.error(f"❌ STREAM MANAGER: Failed to join voice chat: {e}")
-                        return False
-                    logger.info(f"ℹ️ STREAM MANAGER: Already in voice chat: {chat_id}")
+                if not await connection_manager.get_connection(chat_id):
+                    logger.error(f"❌ STREAM MANAGER: Failed to join voice chat: {chat_id}")
+                    return False
+                logger.info(f"✅ STREAM MANAGER: In voice chat: {chat_id}")
                 
                 # Start streaming with proper format
                 logger.info(f"🎵 STREAM MANAGER: Starting actual stream...")
-                success = await self._start_stream_with_format(chat_id, stream_url, media_info, is_video)
+                success = await self._start_stream_with_format(
+                    chat_id, stream_url, media_info, is_video, profile, seek
+                )
                 logger.info(f"🎵 STREAM MANAGER: Stream start result: {success}")
                 
                 if success:
@@ -71,10 +143,19 @@ class StreamManager:
                         'info': media_info,
                         'type': 'video' if is_video else 'audio',
                         'url': stream_url,
-                        'source': source
+                        'source': source,
+                        'profile': profile,
+                        'offset': seek,
+                        'started_at': time.monotonic(),
+                        'paused_at': None,
+                        'paused_total': 0.0
                     }
+                    idle_reaper.mark_active(chat_id, self._remaining(chat_id))
+                    play_history.record(chat_id, media_info, source)
                     logger.info(f"✅ STREAM MANAGER: Stream started successfully: {media_info['title']}")
                 else:
+                    # Playback failing in a call we thought we were in usually means we are not
+                    connection_manager.invalidate(chat_id)
                     logger.error(f"❌ STREAM MANAGER: Failed to start stream")
                 
                 return success
@@ -85,63 +166,158 @@ class StreamManager:
                 traceback.print_exc()
                 return False
     
-    async def _start_stream_with_format(self, chat_id: int, url: str, info: Dict, is_video: bool) -> bool:
+    async def restart_stream(self, chat_id: int, profile: str = None) -> bool:
+        """Restart an active stream at its current position, e.g. on another profile"""
+        if not self._owns(chat_id):
+            return False
+        async with self._chat_lock(chat_id):
+            stream = self.active_streams.get(chat_id)
+            if not stream:
+                return False
+            
+            try:
+                is_video = stream['type'] == 'video'
+                position = self.get_position(chat_id)
+                profile = profile or process_manager.select_profile(is_video)
+                
+                logger.info(
+                    f"🔄 STREAM MANAGER: Restarting {chat_id} at {position:.0f}s "
+                    f"({stream['profile']} → {profile})"
+                )
+                
+                await self._kill_ffmpeg(chat_id)
+                if is_video:
+                    play_source = self._video_source(stream['url'], profile, position)
+                else:
+                    play_source = await self._spawn_ffmpeg(chat_id, stream['url'], False, profile, position)
+                await assistant_pool.get_caller(chat_id).play(chat_id, play_source)
+                
+                now = time.monotonic()
+                was_paused = stream['paused_at'] is not None
+                if was_paused:
+                    await assistant_pool.get_caller(chat_id).pause(chat_id)
+                
+                stream.update({
+                    'profile': profile,
+                    'offset': position,
+                    'started_at': now,
+                    'paused_at': now if was_paused else None,
+                    'paused_total': 0.0
+                })
+                if not was_paused:
+                    idle_reaper.mark_active(chat_id, self._remaining(chat_id))
+                return True
+                
+            except Exception as e:
+                logger.error(f"❌ STREAM MANAGER: Restart error in {chat_id}: {e}")
+                return False
+    
+    async def _start_stream_with_format(
+        self,
+        chat_id: int,
+        url: str,
+        info: Dict,
+        is_video: bool,
+        profile: str,
+        seek: float = 0
+    ) -> bool:
         """Start stream with proper format handling"""
         try:
             if is_video:
                 # Video streaming
-                return await self._start_video_stream(chat_id, url, info)
+                return await self._start_video_stream(chat_id, url, info, profile, seek)
             else:
                 # Audio streaming
-                return await self._start_audio_stream(chat_id, url, info)
+                return await self._start_audio_stream(chat_id, url, info, profile, seek)
                 
         except Exception as e:
             logger.error(f"❌ Format stream error: {e}")
             return False
     
-    async def _start_audio_stream(self, chat_id: int, url: str, info: Dict) -> bool:
+    def _can_play_direct(self, seek: float) -> bool:
+        """Direct URLs let TgCaller transcode; our own FFmpeg would only add a process"""
+        return seek <= 0
+    
+    @staticmethod
+    def _video_source(url: str, profile: str, seek: float = 0) -> MediaStream:
+        """Direct video source that TgCaller scales to the profile's size, fps and bitrate"""
+        settings = process_manager.get_profile(profile)
+        return MediaStream(
+            url,
+            video_config=VideoConfig(
+                width=settings['width'],
+                height=settings['height'],
+                fps=settings['fps'],
+                bitrate=settings['video_bitrate']
+            ),
+            start_time=seek if seek > 0 else None
+        )
+    
+    async def _spawn_ffmpeg(self, chat_id: int, url: str, is_video: bool, profile: str, seek: float = 0):
+        """Start FFmpeg for a chat and return the source to hand to TgCaller"""
+        ffmpeg_cmd = process_manager.build_ffmpeg_command(url, is_video, profile, seek)
+        logger.info(f"🔧 FFMPEG: {' '.join(ffmpeg_cmd[:4])}... (profile {profile})")
+        
+        if is_video:
+            process = await asyncio.create_subprocess_exec(
+                *ffmpeg_cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            self.ffmpeg_processes[chat_id] = process
+            return process.stdout
+        
+        # Audio: ffmpeg writes into a pipe we read through the jitter buffer
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *ffmpeg_cmd,
+                stdout=write_fd,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        
+        self.ffmpeg_processes[chat_id] = process
+        
+        self._close_buffer(chat_id)
+        buffer = PipeRingBuffer(
+            chat_id, read_fd,
+            on_eof=idle_reaper.mark_idle,
+            sample_rate=AUDIO_SAMPLE_RATE,
+            channels=AUDIO_CHANNELS
+        )
+        buffer.start()
+        self.pipe_buffers[chat_id] = buffer
+        return buffer
+    
+    async def _start_audio_stream(self, chat_id: int, url: str, info: Dict, profile: str, seek: float = 0) -> bool:
         """Start audio stream using TgCaller with FFmpeg pipe"""
         try:
             logger.info(f"🎵 AUDIO STREAM: Starting for {info.get('title', 'Unknown')}")
             logger.info(f"🎵 AUDIO STREAM: URL: {url[:100]}...")
             
             # Try direct URL first (simpler approach)
-            try:
-                logger.info(f"🔗 AUDIO STREAM: Trying direct URL...")
-                await tgcaller.play(chat_id, url)
-                logger.info(f"✅ AUDIO STREAM: Direct stream started successfully")
-                return True
-            except Exception as direct_error:
-                logger.warning(f"⚠️ AUDIO STREAM: Direct URL failed: {direct_error}")
-                
-                # Fallback to FFmpeg processing
-                logger.info(f"🔄 AUDIO STREAM: Trying FFmpeg processing...")
-                ffmpeg_cmd = [
-                    'ffmpeg',
-                    '-i', url,
-                    '-f', 's16le',
-                    '-ac', '2',
-                    '-ar', '48000',
-                    '-acodec', 'pcm_s16le',
-                    '-loglevel', 'error',
-                    '-'
-                ]
-                
-                logger.info(f"🔧 AUDIO STREAM: FFmpeg command: {' '.join(ffmpeg_cmd[:4])}...")
-                
-                # Start ffmpeg process
-                process = await asyncio.create_subprocess_exec(
-                    *ffmpeg_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                self.ffmpeg_processes[chat_id] = process
-                
-                # Stream to TgCaller using the stdout pipe
-                await tgcaller.play(chat_id, process.stdout)
-                logger.info(f"✅ AUDIO STREAM: FFmpeg stream started successfully")
-                return True
+            if self._can_play_direct(seek):
+                try:
+                    logger.info(f"🔗 AUDIO STREAM: Trying direct URL...")
+                    await assistant_pool.get_caller(chat_id).play(chat_id, url)
+                    logger.info(f"✅ AUDIO STREAM: Direct stream started successfully")
+                    return True
+                except Exception as direct_error:
+                    logger.warning(f"⚠️ AUDIO STREAM: Direct URL failed: {direct_error}")
+            
+            # FFmpeg processing with the selected profile
+            logger.info(f"🔄 AUDIO STREAM: Trying FFmpeg processing...")
+            buffer = await self._spawn_ffmpeg(chat_id, url, False, profile, seek)
+            
+            # Stream to TgCaller from the ring buffer
+            await assistant_pool.get_caller(chat_id).play(chat_id, buffer)
+            logger.info(f"✅ AUDIO STREAM: FFmpeg stream started successfully")
+            return True
             
         except Exception as e:
             logger.error(f"❌ AUDIO STREAM: Error: {e}")
@@ -149,48 +325,28 @@ class StreamManager:
             traceback.print_exc()
             return False
     
-    async def _start_video_stream(self, chat_id: int, url: str, info: Dict) -> bool:
+    async def _start_video_stream(self, chat_id: int, url: str, info: Dict, profile: str, seek: float = 0) -> bool:
         """Start video stream using TgCaller with FFmpeg pipe"""
         try:
             logger.info(f"📺 Starting video stream: {info.get('title', 'Unknown')}")
             
-            # Try direct URL first
+            # Direct URL, scaled by TgCaller so the audio track is kept
             try:
-                logger.info(f"🔗 Trying direct video URL: {url[:100]}...")
-                await tgcaller.play(chat_id, url, video=True)
-                logger.info(f"✅ Direct video stream started successfully")
+                logger.info(f"🔗 Trying direct video URL ({profile}): {url[:100]}...")
+                await assistant_pool.get_caller(chat_id).play(chat_id, self._video_source(url, profile, seek))
+                logger.info("✅ Direct video stream started successfully")
                 return True
             except Exception as direct_error:
                 logger.warning(f"⚠️ Direct video URL failed: {direct_error}")
-                
-                # Fallback to FFmpeg processing
-                logger.info(f"🔄 Trying FFmpeg video processing...")
-                ffmpeg_cmd = [
-                    'ffmpeg',
-                    '-i', url,
-                    '-f', 'rawvideo',
-                    '-pix_fmt', 'yuv420p',
-                    '-vf', 'scale=640:480',
-                    '-r', '30',
-                    '-loglevel', 'error',
-                    '-'
-                ]
-                
-                logger.info(f"🔧 FFmpeg video command: {' '.join(ffmpeg_cmd[:4])}...")
-                
-                # Start ffmpeg process
-                process = await asyncio.create_subprocess_exec(
-                    *ffmpeg_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                self.ffmpeg_processes[chat_id] = process
-                
-                # Stream to TgCaller using the stdout pipe
-                await tgcaller.play(chat_id, process.stdout, video=True)
-                logger.info(f"✅ FFmpeg video stream started successfully")
-                return True
+            
+            # Last resort: our own FFmpeg (raw video only, no audio track)
+            logger.info("🔄 Trying FFmpeg video processing...")
+            stdout = await self._spawn_ffmpeg(chat_id, url, True, profile, seek)
+            
+            # Stream to TgCaller using the stdout pipe
+            await assistant_pool.get_caller(chat_id).play(chat_id, stdout, video=True)
+            logger.info(f"✅ FFmpeg video stream started successfully")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Video stream error: {e}")
@@ -198,8 +354,14 @@ class StreamManager:
     
     async def pause_stream(self, chat_id: int) -> bool:
         """Pause active stream"""
+        if not self._owns(chat_id):
+            return False
         try:
-            await tgcaller.pause(chat_id)
+            await assistant_pool.get_caller(chat_id).pause(chat_id)
+            stream = self.active_streams.get(chat_id)
+            if stream and stream['paused_at'] is None:
+                stream['paused_at'] = time.monotonic()
+            idle_reaper.mark_idle(chat_id)
             logger.info(f"⏸️ Stream paused: {chat_id}")
             return True
         except Exception as e:
@@ -208,40 +370,50 @@ class StreamManager:
     
     async def resume_stream(self, chat_id: int) -> bool:
         """Resume paused stream"""
+        if not self._owns(chat_id):
+            return False
         try:
-            await tgcaller.resume(chat_id)
+            await assistant_pool.get_caller(chat_id).resume(chat_id)
+            stream = self.active_streams.get(chat_id)
+            if stream and stream['paused_at'] is not None:
+                stream['paused_total'] += time.monotonic() - stream['paused_at']
+                stream['paused_at'] = None
+            idle_reaper.mark_active(chat_id, self._remaining(chat_id))
             logger.info(f"▶️ Stream resumed: {chat_id}")
             return True
         except Exception as e:
             logger.error(f"❌ Resume error: {e}")
             return False
     
-    async def stop_stream(self, chat_id: int) -> bool:
-        """Stop active stream"""
+    async def stop_stream(self, chat_id: int, lease_lost: bool = False) -> bool:
+        """Stop active stream
+
+        With ``lease_lost`` only local playback is torn down; another
+        instance already owns the chat.
+        """
+        if not lease_lost and not self._owns(chat_id):
+            return False
         try:
-            # Stop TgCaller stream
-            await tgcaller.stop(chat_id)
+            # Stop TgCaller stream; the call may already be gone
+            try:
+                await assistant_pool.get_caller(chat_id).stop(chat_id)
+            except Exception as e:
+                logger.warning(f"⚠️ STOP: TgCaller stop failed for {chat_id}: {e}")
             
             # Kill ffmpeg process if exists
-            if chat_id in self.ffmpeg_processes:
-                process = self.ffmpeg_processes[chat_id]
-                if process and process.returncode is None:
-                    process.terminate()
-                    try:
-                        await asyncio.wait_for(process.wait(), timeout=5.0)
-                    except asyncio.TimeoutError:
-                        process.kill()
-                del self.ffmpeg_processes[chat_id]
+            await self._kill_ffmpeg(chat_id)
             
             # Leave voice chat
-            try:
-                await tgcaller.leave_group_call(chat_id)
-            except Exception as e:
-                logger.warning(f"⚠️ Leave call error (may be normal): {e}")
+            await connection_manager.release_connection(chat_id)
             
             # Clean up stream info
             if chat_id in self.active_streams:
                 del self.active_streams[chat_id]
+            admission_controller.release(chat_id)
+            idle_reaper.forget(chat_id)
+            snapshot_manager.discard(chat_id)
+            if not lease_lost:
+                await lease_manager.release(chat_id)
             
             logger.info(f"⏹️ Stream stopped: {chat_id}")
             return True
@@ -250,32 +422,78 @@ class StreamManager:
             logger.error(f"❌ Stop error: {e}")
             return False
     
+    def _owns(self, chat_id: int) -> bool:
+        """Check this instance owns a chat's playback"""
+        if lease_manager.owns(chat_id):
+            return True
+        logger.warning(f"⚠️ STREAM MANAGER: Refusing to act on {chat_id}, owned by another instance")
+        return False
+    
     async def join_call(self, chat_id: int) -> bool:
         """Join voice chat"""
-        try:
-            logger.info(f"📞 JOIN CALL: Attempting to join {chat_id}")
-            await tgcaller.join_group_call(chat_id)
-            logger.info(f"✅ JOIN CALL: Successfully joined {chat_id}")
-            return True
-        except Exception as e:
-            if "already joined" in str(e).lower():
-                logger.info(f"ℹ️ JOIN CALL: Already in call {chat_id}")
-                return True
-            logger.error(f"❌ JOIN CALL: Error joining {chat_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        logger.info(f"📞 JOIN CALL: Attempting to join {chat_id}")
+        success = await connection_manager.get_connection(chat_id)
+        if success:
+            if not self.is_streaming(chat_id):
+                idle_reaper.mark_idle(chat_id)
+            logger.info(f"✅ JOIN CALL: In call {chat_id}")
+        else:
+            logger.error(f"❌ JOIN CALL: Error joining {chat_id}")
+        return success
     
     async def leave_call(self, chat_id: int) -> bool:
         """Leave voice chat"""
-        try:
-            logger.info(f"👋 Attempting to leave call: {chat_id}")
-            await tgcaller.leave_group_call(chat_id)
+        logger.info(f"👋 Attempting to leave call: {chat_id}")
+        success = await connection_manager.release_connection(chat_id, force=True)
+        idle_reaper.forget(chat_id)
+        if success:
             logger.info(f"👋 Left call: {chat_id}")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Leave call error: {e}")
-            return False
+        return success
+    
+    async def _kill_ffmpeg(self, chat_id: int):
+        """Terminate the FFmpeg process and jitter buffer of a chat"""
+        process = self.ffmpeg_processes.pop(chat_id, None)
+        if process and process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                process.kill()
+        self._close_buffer(chat_id)
+    
+    def _close_buffer(self, chat_id: int):
+        """Close the jitter buffer of a chat, if any"""
+        buffer = self.pipe_buffers.pop(chat_id, None)
+        if buffer:
+            stats = buffer.get_stats()
+            logger.info(
+                f"📊 PIPE BUFFER {chat_id}: underruns={stats['underruns']} "
+                f"overruns={stats['overruns']} bytes={stats['bytes_out']}"
+            )
+            buffer.close()
+    
+    def get_buffer_stats(self, chat_id: int) -> Optional[Dict]:
+        """Get jitter buffer statistics for a chat"""
+        buffer = self.pipe_buffers.get(chat_id)
+        return buffer.get_stats() if buffer else None
+    
+    def get_position(self, chat_id: int) -> float:
+        """Get playback position of the active stream in seconds"""
+        stream = self.active_streams.get(chat_id)
+        if not stream:
+            return 0.0
+        now = stream['paused_at'] or time.monotonic()
+        return stream['offset'] + max(0.0, now - stream['started_at'] - stream['paused_total'])
+    
+    def _remaining(self, chat_id: int) -> float:
+        """Seconds left in the active track (0 for live or unknown duration)"""
+        stream = self.active_streams.get(chat_id)
+        if not stream:
+            return 0.0
+        duration = stream['info'].get('duration') or 0
+        if duration <= 0:
+            return 0.0
+        return max(1.0, duration - self.get_position(chat_id))
     
     def get_stream_info(self, chat_id: int) -> Optional[Dict]:
         """Get current stream info"""
@@ -285,12 +503,114 @@ class StreamManager:
         """Check if streaming in chat"""
         return chat_id in self.active_streams
     
-    async def cleanup_all(self):
-        """Cleanup all streams"""
-        logger.info("🧹 Cleaning up all streams...")
-        for chat_id in list(self.active_streams.keys()):
-            await self.stop_stream(chat_id)
-        logger.info("✅ All streams cleaned up")
+    def get_usage(self, chat_id: int) -> Optional[Dict]:
+        """Get sampled CPU, memory and throughput of a chat's FFmpeg process"""
+        return self.resource_monitor.get_usage(chat_id)
+    
+    def get_metrics(self) -> Dict:
+        """Get stream metrics for this host"""
+        buffers = [buffer.get_stats() for buffer in self.pipe_buffers.values()]
+        return {
+            "active_streams": len(self.active_streams),
+            "video_streams": sum(1 for s in self.active_streams.values() if s['type'] == 'video'),
+            "ffmpeg_processes": len(self.ffmpeg_processes),
+            "admission": admission_controller.get_utilization(),
+            "connections": connection_manager.get_stats(),
+            "host": process_manager.get_load(),
+            "buffer_underruns": sum(b['underruns'] for b in buffers),
+            "buffer_overruns": sum(b['overruns'] for b in buffers),
+            "ffmpeg_cpu_percent": round(sum(u['cpu_percent'] for u in self.resource_monitor.usage.values()), 1),
+            "ffmpeg_rss": sum(u['rss'] for u in self.resource_monitor.usage.values()),
+            "throttled": self.resource_monitor.total_niced,
+            "downgraded": self.resource_monitor.total_downgraded,
+            "reaper": idle_reaper.get_stats(),
+            "leases": lease_manager.get_stats(),
+            "snapshots": snapshot_manager.get_stats(),
+            "queue_journal": queue_manager.get_stats(),
+            "history": play_history.get_stats(),
+            "chat_state": chat_state.get_stats(),
+            "activity": activity_tracker.get_stats(),
+            "access": access_lists.get_stats(),
+            "admins": admin_cache.get_stats(),
+            "governor": governor.get_stats()
+        }
+    
+    async def _for_all(self, action, chat_ids) -> int:
+        """Run ``action(chat_id)`` for many chats with bounded parallelism"""
+        semaphore = asyncio.Semaphore(Config.DRAIN_CONCURRENCY)
+        
+        async def run(chat_id: int) -> bool:
+            async with semaphore:
+                try:
+                    return bool(await action(chat_id))
+                except Exception as e:
+                    logger.error(f"❌ STREAM MANAGER: Error in {chat_id}: {e}")
+                    return False
+        
+        results = await asyncio.gather(*(run(chat_id) for chat_id in chat_ids))
+        return sum(results)
+    
+    def _track_finished(self, chat_id: int) -> bool:
+        """Check if a chat has nothing left worth waiting for at shutdown.
+
+        Paused streams never reach their end and live or unknown-length
+        streams have none, so they count as finished right away.
+        """
+        stream = self.active_streams.get(chat_id)
+        if not stream or stream['paused_at'] is not None:
+            return True
+        duration = stream['info'].get('duration') or 0
+        return duration <= 0 or self.get_position(chat_id) >= duration
+    
+    async def _hand_off(self, chat_id: int) -> bool:
+        """Stop local playback and let a peer instance adopt the chat"""
+        await self.stop_stream(chat_id, lease_lost=True)
+        return await lease_manager.hand_off(chat_id)
+    
+    async def drain(self, timeout: float = None) -> Dict:
+        """Drain this instance before shutdown.
+        
+        New streams are refused. If a peer instance is alive, sessions are
+        handed over to it right away; otherwise current tracks may play to
+        their end until the deadline. Paused, live and unknown-length
+        streams are stopped at once.
+        """
+        timeout = Config.DRAIN_TIMEOUT if timeout is None else timeout
+        started = time.monotonic()
+        admission_controller.stop_accepting()
+        await lease_manager.start_draining()
+        
+        report = {'handed_off': 0, 'finished': 0}
+        peers = await lease_manager.peers()
+        if peers and self.active_streams:
+            # Peers resume from the snapshot, so write a fresh one and keep it
+            await snapshot_manager.stop()
+            report['handed_off'] = await self._for_all(self._hand_off, list(self.active_streams))
+            logger.info(f"🤝 DRAIN: Handed {report['handed_off']} chats to {len(peers)} peer(s)")
+        else:
+            deadline = started + timeout
+            while self.active_streams and time.monotonic() < deadline:
+                finished = [chat_id for chat_id in self.active_streams if self._track_finished(chat_id)]
+                report['finished'] += await self._for_all(self.stop_stream, finished)
+                if self.active_streams:
+                    logger.info(
+                        f"⏳ DRAIN: {len(self.active_streams)} tracks still playing, "
+                        f"{deadline - time.monotonic():.0f}s left"
+                    )
+                    await asyncio.sleep(min(5.0, max(0.0, deadline - time.monotonic())))
+        
+        report['remaining'] = len(self.active_streams)
+        report['seconds'] = round(time.monotonic() - started, 1)
+        return report
+    
+    async def cleanup_all(self) -> int:
+        """Stop all streams concurrently"""
+        started = time.monotonic()
+        chat_ids = list(self.active_streams.keys())
+        logger.info(f"🧹 Cleaning up {len(chat_ids)} streams...")
+        stopped = await self._for_all(self.stop_stream, chat_ids)
+        logger.info(f"✅ All streams cleaned up ({stopped}/{len(chat_ids)} in {time.monotonic() - started:.1f}s)")
+        return stopped
 
 # Global stream manager
 stream_manager = StreamManager()
\ No newline at end of file
@@ -2,11 +2,13 @@ import asyncio
 import logging
 from datetime import datetime
 from typing import Set
-from .bot import app, tgcaller
+from .governor import governor
 from .database import db
 from .connection import connection_manager
+from .assistants import assistant_pool
 from .playback import playback_manager
 from .config import Config
+from .admins import admin_cache
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +52,7 @@ class TroubleshootManager:
                     await playback_manager.play_track(chat_id, current_track, same_track=True)
             
             await self.log_action(chat_id, "voice_fix", "success")
-            await app.send_message(chat_id, "✅ Voice connection successfully repaired")
+            await governor.send_message(chat_id, "✅ Voice connection successfully repaired")
             return True
             
         except Exception as e:
@@ -76,11 +78,11 @@ class TroubleshootManager:
                 if current_track:
                     await playback_manager.play_track(chat_id, current_track, same_track=True)
                     await self.log_action(chat_id, "playback_restart", "success")
-                    await app.send_message(chat_id, "✅ Playback successfully restarted")
+                    await governor.send_message(chat_id, "✅ Playback successfully restarted")
                     return True
             
             await self.log_action(chat_id, "playback_restart", "failed", "No current stream")
-            await app.send_message(chat_id, "❌ No active playback to restart")
+            await governor.send_message(chat_id, "❌ No active playback to restart")
             return False
             
         except Exception as e:
@@ -100,11 +102,12 @@ class TroubleshootManager:
         }
         
         try:
-            me = await app.get_chat_member(chat_id, "me")
+            me = await admin_cache.bot_member(chat_id)
+            rights = getattr(me, "privileges", None) or me
             missing_perms = []
             
             for perm, name in required_perms.items():
-                if not getattr(me, perm, False):
+                if not getattr(rights, perm, False):
                     missing_perms.append(name)
             
             return {
@@ -127,6 +130,11 @@ class TroubleshootManager:
         conn_status = "✅ Connected" if connection_manager.is_connected(chat_id) else "❌ Disconnected"
         report.append(f"**Voice Connection**: {conn_status}")
         
+        # Assistant serving this chat
+        assistant = assistant_pool.assistant_for(chat_id)
+        assistant_status = "❌ Out of rotation" if not assistant.is_available() else "✅ Available"
+        report.append(f"**Assistant**: {assistant.name} ({assistant.load} calls) {assistant_status}")
+        
         # Playback status
         playback_status = "✅ Playing" if playback_manager.is_playing(chat_id) else "❌ Stopped"
         report.append(f"**Playback Status**: {playback_status}")
@@ -142,7 +150,7 @@ class TroubleshootManager:
         
         # Queue status
         from .queue import queue_manager
-        queue_size = queue_manager.get_queue_size(chat_id)
+        queue_size = await queue_manager.get_queue_size(chat_id)
         report.append(f"**Queue**: {queue_size} tracks")
         
         # Suggested actions
@@ -162,12 +170,12 @@ class TroubleshootManager:
         )
         
         try:
-            await app.send_message(chat_id, error_msg)
+            await governor.send_message(chat_id, error_msg)
         except Exception as e:
             logger.error(f"Failed to send failure notification to {chat_id}: {e}")
         
         # Notify super group
-        await app.send_message(
+        await governor.send_message(
             Config.SUPER_GROUP_ID,
             f"🚨 **Repair Failed**\n"
             f"**Chat ID**: {chat_id}\n"
@@ -176,50 +184,27 @@ class TroubleshootManager:
         )
     
     async def health_check_all_chats(self):
-        """Check health of all active chats"""
-        if not db.enabled:
-            logger.debug("Database not enabled. Skipping health check.")
-            return
-            
+        """Check health of all active voice connections"""
         try:
-            all_chats = await db.chats.find().to_list(None)
-            for chat in all_chats:
-                chat_id = chat["chat_id"]
-                
+            # Probe every joined call concurrently instead of scanning all chats
+            dead_chats = await connection_manager.dead_connections()
+            
+            for chat_id in dead_chats:
                 # Skip if already being repaired
                 if chat_id in self.active_repairs:
                     continue
                 
                 try:
-                    # Check if bot is alone in voice chat
-                    if connection_manager.is_connected(chat_id):
-                        # Check if call is still active using TgCaller
-                        try:
-                            call_info = await tgcaller.get_call(chat_id)
-                            if not call_info:
-                                await self.log_action(
-                                    chat_id,
-                                    "health_check",
-                                    "disconnected",
-                                    "Call disconnected"
-                                )
-                                await connection_manager.release_connection(chat_id)
-                        except Exception as e:
-                            await self.log_action(
-                                chat_id,
-                                "health_check",
-                                "failed",
-                                f"Health check error: {e}"
-                            )
-                            
+                    await connection_manager.drop_dead_call(chat_id)
+                    if db.enabled:
+                        await self.log_action(
+                            chat_id,
+                            "health_check",
+                            "disconnected",
+                            "Call disconnected"
+                        )
                 except Exception as e:
                     logger.error(f"Health check error for {chat_id}: {e}")
-                    await self.log_action(
-                        chat_id,
-                        "health_check",
-                        "failed",
-                        str(e)
-                    )
         except Exception as e:
             logger.error(f"Global health check error: {e}")
 
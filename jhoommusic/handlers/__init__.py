@@ -1,4 +1,6 @@
 # Import all handlers to register them
+from . import shard_handler
+from . import access_handler
 from . import start_handler
 from . import play_handler
 from . import control_handler
@@ -6,6 +8,8 @@ from . import admin_handler
 from . import callback_handler
 
 __all__ = [
+    "shard_handler",
+    "access_handler",
     "start_handler",
     "play_handler", 
     "control_handler",
@@ -0,0 +1,19 @@
+import logging
+from pyrogram import StopPropagation
+from pyrogram.handlers import CallbackQueryHandler, ChatMemberUpdatedHandler, InlineQueryHandler, MessageHandler
+from ..core.bot import app
+from ..core.access import allowed
+
+logger = logging.getLogger(__name__)
+
+# Runs after the shard guard and before every other handler group
+ACCESS_GUARD_GROUP = -90
+
+
+async def drop_denied_update(_, update):
+    """Stop handling updates from gbanned or blocked users and blacklisted chats"""
+    raise StopPropagation
+
+
+for handler_type in (MessageHandler, CallbackQueryHandler, ChatMemberUpdatedHandler, InlineQueryHandler):
+    app.add_handler(handler_type(drop_denied_update, ~allowed), group=ACCESS_GUARD_GROUP)
@@ -1,49 +1,126 @@
 import logging
 from datetime import datetime
+from typing import Optional
 from pyrogram import filters
-from pyrogram.types import Message
+from pyrogram.types import ChatMemberUpdated, Message
 from ..core.bot import app
 from ..core.database import db
 from ..core.config import Config
+from ..core.access import access_lists
+from ..core.admins import admin_cache
+from ..core.broadcast import broadcast_engine, parse_broadcast
+from ..core.governor import governor
+from ..core.process import process_manager
+from ..core.stream_manager import stream_manager
 from ..utils.helpers import save_user_to_db
 
 logger = logging.getLogger(__name__)
 
-@app.on_message(filters.command("auth") & filters.user(Config.SUDO_USERS))
-async def auth_user(_, message: Message):
-    """Handle /auth command"""
+@app.on_chat_member_updated()
+async def refresh_admins(_, update: ChatMemberUpdated):
+    """Keep cached admin lists in step with promotions and demotions"""
+    admin_cache.on_member_updated(update)
+
+# Command -> (access list, add or remove, reply)
+ACCESS_COMMANDS = {
+    "auth": ("auth", True, "✅ **User {} added to auth list**"),
+    "unauth": ("auth", False, "✅ **User {} removed from auth list**"),
+    "gban": ("gban", True, "🚫 **User {} globally banned**"),
+    "ungban": ("gban", False, "✅ **User {} unbanned globally**"),
+    "block": ("block", True, "🚫 **User {} blocked from the bot**"),
+    "unblock": ("block", False, "✅ **User {} unblocked**"),
+    "blacklistchat": ("blacklist", True, "🚫 **Chat {} blacklisted**"),
+    "whitelistchat": ("blacklist", False, "✅ **Chat {} whitelisted**")
+}
+
+# Command -> (access list, title)
+ACCESS_LIST_COMMANDS = {
+    "authusers": ("auth", "Authorized users"),
+    "gbannedusers": ("gban", "Globally banned users"),
+    "blockedusers": ("block", "Blocked users"),
+    "blacklistedchat": ("blacklist", "Blacklisted chats")
+}
+
+async def _access_target(message: Message, is_chat: bool) -> Optional[int]:
+    """Id from the command argument, the replied user, or (for chats) this chat"""
+    if len(message.command) > 1:
+        arg = message.command[1]
+        try:
+            return int(arg)
+        except ValueError:
+            target = await (app.get_chat(arg) if is_chat else app.get_users(arg))
+            return target.id
+    if is_chat:
+        return message.chat.id
+    if message.reply_to_message and message.reply_to_message.from_user:
+        return message.reply_to_message.from_user.id
+    return None
+
+@app.on_message(filters.command(list(ACCESS_COMMANDS)) & filters.user(Config.SUDO_USERS))
+async def change_access(_, message: Message):
+    """Handle /auth, /unauth, /gban, /ungban, /block, /unblock, /blacklistchat and /whitelistchat"""
     try:
         await save_user_to_db(message.from_user)
         
-        if len(message.command) < 2:
-            await message.reply("**Usage:** `/auth user_id`")
-            return
+        command = message.command[0].lower()
+        name, add, reply = ACCESS_COMMANDS[command]
+        is_chat = name == "blacklist"
         
         try:
-            user_id = int(message.command[1])
-        except ValueError:
-            await message.reply("❌ Invalid user ID")
+            target = await _access_target(message, is_chat)
+        except Exception:
+            target = None
+        if target is None:
+            await governor.reply(message, f"**Usage:** `/{command} {'chat_id' if is_chat else 'user_id'}`")
+            return
+        if not is_chat and add and name != "auth" and target in Config.SUDO_USERS:
+            await governor.reply(message, "❌ Sudo users can't be banned or blocked")
             return
         
-        if db.enabled:
-            await db.auth_users.update_one(
-                {"user_id": user_id},
-                {
-                    "$set": {
-                        "user_id": user_id,
-                        "authorized_by": message.from_user.id,
-                        "authorized_at": datetime.utcnow()
-                    }
-                },
-                upsert=True
+        if add:
+            changed = await access_lists.add(
+                name, target, added_by=message.from_user.id, added_at=datetime.utcnow()
             )
+        else:
+            changed = await access_lists.remove(name, target)
+        
+        if not changed:
+            await governor.reply(message, f"ℹ️ `{target}` is {'already' if add else 'not'} in the {name} list")
+            return
+        
+        await governor.reply(message, reply.format(target))
+        logger.info(f"/{command} {target} by {message.from_user.id}")
+        
+        if is_chat and add:
+            try:
+                await app.leave_chat(target)
+            except Exception:
+                pass
+        
+    except Exception as e:
+        logger.error(f"Error in access command: {e}")
+        await governor.reply(message, f"❌ An error occurred: {str(e)}")
+
+@app.on_message(filters.command(list(ACCESS_LIST_COMMANDS)) & filters.user(Config.SUDO_USERS))
+async def show_access_list(_, message: Message):
+    """Handle /authusers, /gbannedusers, /blockedusers and /blacklistedchat"""
+    try:
+        name, title = ACCESS_LIST_COMMANDS[message.command[0].lower()]
+        members = access_lists.members(name)
+        
+        if not members:
+            await governor.reply(message, f"📋 **{title}:** none")
+            return
         
-        await message.reply(f"✅ **User {user_id} added to auth list**")
-        logger.info(f"User {user_id} authorized by {message.from_user.id}")
+        lines = [f"📋 **{title}** ({len(members)})\n"]
+        lines += [f"• `{member}`" for member in members[:50]]
+        if len(members) > 50:
+            lines.append(f"\n...and {len(members) - 50} more")
+        await governor.reply(message, "\n".join(lines))
         
     except Exception as e:
-        logger.error(f"Error in auth command: {e}")
-        await message.reply(f"❌ An error occurred: {str(e)}")
+        logger.error(f"Error in access list command: {e}")
+        await governor.reply(message, f"❌ An error occurred: {str(e)}")
 
 @app.on_message(filters.command("broadcast") & filters.user(Config.SUDO_USERS))
 async def broadcast_message(_, message: Message):
@@ -51,49 +128,72 @@ async def broadcast_message(_, message: Message):
     try:
         await save_user_to_db(message.from_user)
         
-        if len(message.command) < 2:
-            await message.reply("**Usage:** `/broadcast message`")
-            return
-        
-        broadcast_msg = ' '.join(message.command[1:])
+        options, text = parse_broadcast(message.text)
         
-        if not db.enabled:
-            await message.reply("❌ Database not available for broadcast")
+        if text.strip().lower() == "-stop":
+            stopped = await broadcast_engine.cancel()
+            await governor.reply(message, "🛑 **Broadcast cancelled**" if stopped else "❌ No broadcast is running")
             return
         
-        all_chats = await db.chats.find().to_list(None)
-        
-        if not all_chats:
-            await message.reply("❌ No chats found to broadcast")
+        source = None
+        if message.reply_to_message:
+            source = {"chat_id": message.chat.id, "message_id": message.reply_to_message.id}
+        elif not text:
+            await governor.reply(message, "**Usage:** `/broadcast [-pin|-pinloud] [-user] [-nobot] message` or reply to a message")
             return
         
-        success = 0
-        failed = 0
-        total = len(all_chats)
+        if not options["targets"]:
+            await governor.reply(message, "❌ Nothing to broadcast to: `-nobot` needs `-user`")
+            return
         
-        progress = await message.reply(f"📢 **Starting broadcast to {total} chats...**")
+        if not db.enabled:
+            await governor.reply(message, "❌ Database not available for broadcast")
+            return
         
-        for chat in all_chats:
-            try:
-                chat_id = chat['chat_id']
-                await app.send_message(chat_id, broadcast_msg)
-                success += 1
-                
-                if (success + failed) % 10 == 0:
-                    await progress.edit_text(
-                        f"📢 **Broadcasting...**\n**Success:** {success}\n**Failed:** {failed}\n**Remaining:** {total - success - failed}"
-                    )
-                
-            except Exception as e:
-                logger.error(f"Error broadcasting to {chat['chat_id']}: {e}")
-                failed += 1
-        
-        await progress.edit_text(
-            f"📢 **Broadcast completed!**\n**Success:** {success}\n**Failed:** {failed}"
+        progress = await governor.reply(message, "📢 **Starting broadcast...**")
+        job_id = await broadcast_engine.create(
+            message.from_user.id,
+            text=None if source else text,
+            source=source,
+            progress={"chat_id": progress.chat.id, "message_id": progress.id},
+            **options
         )
         
-        logger.info(f"Broadcast completed by {message.from_user.id}: {success} success, {failed} failed")
+        logger.info(f"Broadcast {job_id} to {', '.join(options['targets'])} started by {message.from_user.id}")
         
     except Exception as e:
         logger.error(f"Error in broadcast command: {e}")
-        await message.reply(f"❌ An error occurred: {str(e)}")
\ No newline at end of file
+        await governor.reply(message, f"❌ An error occurred: {str(e)}")
+
+
+@app.on_message(filters.command(["topstreams", "usage"]) & filters.user(Config.SUDO_USERS))
+async def top_streams(_, message: Message):
+    """Handle /topstreams command"""
+    try:
+        consumers = stream_manager.resource_monitor.top_consumers(10)
+        load = process_manager.get_load()
+        
+        if not consumers:
+            await governor.reply(
+                message,
+                f"📈 **No FFmpeg processes running**\n\n"
+                f"**Host:** CPU {load['cpu_percent']}% · RAM {load['memory_percent']}% · profile `{load['profile']}`"
+            )
+            return
+        
+        lines = [
+            "📈 **Top stream consumers**\n",
+            f"**Host:** CPU {load['cpu_percent']}% · RAM {load['memory_percent']}% · profile `{load['profile']}`\n"
+        ]
+        for i, usage in enumerate(consumers, 1):
+            lines.append(
+                f"**{i}.** `{usage['chat_id']}` · {usage['type']} · `{usage['profile']}`\n"
+                f"    CPU {usage['cpu_percent']}% · RSS {usage['rss'] // (1024 * 1024)} MB · "
+                f"{usage['throughput'] // 1024} KB/s · nice {usage['nice']}"
+            )
+        
+        await governor.reply(message, "\n".join(lines))
+        
+    except Exception as e:
+        logger.error(f"Error in topstreams command: {e}")
+        await governor.reply(message, f"❌ An error occurred: {str(e)}")
@@ -2,6 +2,7 @@ import logging
 from pyrogram import filters
 from pyrogram.types import CallbackQuery
 from ..core.bot import app
+from ..core.playback import playback_manager
 
 logger = logging.getLogger(__name__)
 
@@ -33,4 +34,18 @@ async def settings_callback(_, query: CallbackQuery):
         logger.info(f"Settings callback from {query.from_user.id}")
     except Exception as e:
         logger.error(f"Error in settings callback: {e}")
+        await query.answer("❌ Error occurred", show_alert=True)
+
+@app.on_callback_query(filters.regex("^player_previous$"))
+async def player_previous_callback(_, query: CallbackQuery):
+    """Handle player previous button"""
+    try:
+        record = await playback_manager.play_previous(query.message.chat.id)
+        if record:
+            await query.answer(f"⏮ {record.get('title', 'Unknown')}"[:200])
+        else:
+            await query.answer("❌ No previous track", show_alert=True)
+        logger.info(f"Previous callback from {query.from_user.id}")
+    except Exception as e:
+        logger.error(f"Error in previous callback: {e}")
         await query.answer("❌ Error occurred", show_alert=True)
\ No newline at end of file
@@ -1,9 +1,15 @@
 import logging
-from pyrogram import filters
+from pyrogram import filters, raw, utils
+from pyrogram.handlers import RawUpdateHandler
 from pyrogram.types import Message
-from ..core.bot import app
+from ..core.bot import app, assistant_clients
+from ..core.playback import playback_manager
+from ..core.queue import queue_manager
 from ..core.stream_manager import stream_manager
-from ..utils.helpers import is_admin_or_sudo, save_user_to_db, save_chat_to_db
+from ..core.reaper import idle_reaper
+from ..core.governor import governor, PRIORITY_CONTROL
+from ..core.sharding import owns_chat
+from ..utils.helpers import format_duration, is_admin_or_sudo, save_user_to_db, save_chat_to_db
 
 logger = logging.getLogger(__name__)
 
@@ -19,17 +25,17 @@ async def pause_music(_, message: Message):
         chat_id = message.chat.id
         
         if not stream_manager.is_streaming(chat_id):
-            await message.reply("❌ No active stream to pause. Use /play [song] first.")
+            await governor.reply(message, "❌ No active stream to pause. Use /play [song] first.")
             return
         
-        processing_msg = await message.reply("🔄 **Pausing playback...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Pausing playback...**")
         
         success = await stream_manager.pause_stream(chat_id)
         
         if success:
-            await processing_msg.edit_text("⏸️ **Playback paused**")
+            await governor.edit(processing_msg, "⏸️ **Playback paused**", priority=PRIORITY_CONTROL)
         else:
-            await processing_msg.edit_text("❌ **Failed to pause playback**")
+            await governor.edit(processing_msg, "❌ **Failed to pause playback**", priority=PRIORITY_CONTROL)
         
         logger.info(f"✅ PAUSE COMMAND completed: {success}")
         
@@ -37,7 +43,7 @@ async def pause_music(_, message: Message):
         logger.error(f"❌ Pause command error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply(f"❌ Error: {str(e)}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
 
 @app.on_message(filters.command(["resume", "r"]) & filters.group)
 async def resume_music(_, message: Message):
@@ -50,14 +56,14 @@ async def resume_music(_, message: Message):
         
         chat_id = message.chat.id
         
-        processing_msg = await message.reply("🔄 **Resuming playback...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Resuming playback...**")
         
         success = await stream_manager.resume_stream(chat_id)
         
         if success:
-            await processing_msg.edit_text("▶️ **Playback resumed**")
+            await governor.edit(processing_msg, "▶️ **Playback resumed**", priority=PRIORITY_CONTROL)
         else:
-            await processing_msg.edit_text("❌ **Failed to resume playback**")
+            await governor.edit(processing_msg, "❌ **Failed to resume playback**", priority=PRIORITY_CONTROL)
         
         logger.info(f"✅ RESUME COMMAND completed: {success}")
         
@@ -65,7 +71,7 @@ async def resume_music(_, message: Message):
         logger.error(f"❌ Resume command error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply(f"❌ Error: {str(e)}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
 
 @app.on_message(filters.command(["stop", "end"]) & filters.group)
 async def stop_music(_, message: Message):
@@ -78,14 +84,14 @@ async def stop_music(_, message: Message):
         
         chat_id = message.chat.id
         
-        processing_msg = await message.reply("🔄 **Stopping playback...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Stopping playback...**")
         
         success = await stream_manager.stop_stream(chat_id)
         
         if success:
-            await processing_msg.edit_text("⏹️ **Playback stopped and left voice chat**")
+            await governor.edit(processing_msg, "⏹️ **Playback stopped and left voice chat**", priority=PRIORITY_CONTROL)
         else:
-            await processing_msg.edit_text("❌ **Failed to stop playback**")
+            await governor.edit(processing_msg, "❌ **Failed to stop playback**", priority=PRIORITY_CONTROL)
         
         logger.info(f"✅ STOP COMMAND completed: {success}")
         
@@ -93,7 +99,7 @@ async def stop_music(_, message: Message):
         logger.error(f"❌ Stop command error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply(f"❌ Error: {str(e)}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
 
 @app.on_message(filters.command(["status", "current"]) & filters.group)
 async def status_command(_, message: Message):
@@ -107,7 +113,8 @@ async def status_command(_, message: Message):
             stream_info = stream_manager.get_stream_info(chat_id)
             if stream_info:
                 info = stream_info['info']
-                await message.reply(
+                await governor.reply(
+                    message,
                     f"📊 **Current Status**\n\n"
                     f"**Status:** 🟢 Streaming\n"
                     f"**Title:** {info.get('title', 'Unknown')}\n"
@@ -115,9 +122,9 @@ async def status_command(_, message: Message):
                     f"**Source:** {info.get('source', 'Unknown').title()}"
                 )
             else:
-                await message.reply("📊 **Status:** 🟢 Streaming (No info available)")
+                await governor.reply(message, "📊 **Status:** 🟢 Streaming (No info available)")
         else:
-            await message.reply("📊 **Status:** 🔴 Not streaming")
+            await governor.reply(message, "📊 **Status:** 🔴 Not streaming")
         
         logger.info(f"✅ STATUS COMMAND completed")
         
@@ -125,4 +132,139 @@ async def status_command(_, message: Message):
         logger.error(f"❌ Status command error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply(f"❌ Error: {str(e)}")
\ No newline at end of file
+        await governor.reply(message, f"❌ Error: {str(e)}")
+
+@app.on_message(filters.command(["previous", "prev"]) & filters.group)
+async def previous_command(_, message: Message):
+    """Handle /previous command"""
+    try:
+        logger.info(f"⏮ PREVIOUS COMMAND from {message.from_user.id} in {message.chat.id}")
+        
+        processing_msg = await governor.deferred_reply(message, "🔄 **Going back...**")
+        record = await playback_manager.play_previous(message.chat.id)
+        
+        if record:
+            await processing_msg.edit_text(f"⏮ **Playing previous:** {record.get('title', 'Unknown')}")
+        else:
+            await processing_msg.edit_text("❌ **No previous track to go back to.**")
+        
+    except Exception as e:
+        logger.error(f"❌ Previous command error: {e}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
+
+@app.on_message(filters.command(["replay"]) & filters.group)
+async def replay_command(_, message: Message):
+    """Handle /replay command"""
+    try:
+        logger.info(f"🔂 REPLAY COMMAND from {message.from_user.id} in {message.chat.id}")
+        
+        processing_msg = await governor.deferred_reply(message, "🔄 **Replaying...**")
+        record = await playback_manager.replay(message.chat.id)
+        
+        if record:
+            await processing_msg.edit_text(f"🔂 **Replaying:** {record.get('title', 'Unknown')}")
+        else:
+            await processing_msg.edit_text("❌ **Nothing has been played here yet.**")
+        
+    except Exception as e:
+        logger.error(f"❌ Replay command error: {e}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
+
+@app.on_message(filters.command(["queue", "q"]) & filters.group)
+async def queue_command(_, message: Message):
+    """Handle /queue command"""
+    try:
+        chat_id = message.chat.id
+        tracks = await queue_manager.get_queue(chat_id, limit=10)
+        size = await queue_manager.get_queue_size(chat_id)
+        
+        if not tracks:
+            await governor.reply(message, "📭 **Queue is empty.** Use /play [song] to add tracks.")
+            return
+        
+        mode = queue_manager.modes.get(chat_id, 'fifo')
+        lines = [
+            f"**{i}.** {track.get('title', 'Unknown')} · {format_duration(track.get('duration', 0))}"
+            for i, track in enumerate(tracks, 1)
+        ]
+        more = f"\n\n…and {size - len(tracks)} more" if size > len(tracks) else ""
+        await governor.reply(
+            message,
+            f"📃 **Up Next** ({size} tracks{', fair turns' if mode == 'fair' else ''})\n\n"
+            + "\n".join(lines) + more
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Queue command error: {e}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
+
+@app.on_message(filters.command(["fairqueue"]) & filters.group)
+async def fair_queue_command(_, message: Message):
+    """Handle /fairqueue command"""
+    try:
+        chat_id = message.chat.id
+        if not await is_admin_or_sudo(chat_id, message.from_user.id):
+            await governor.reply(message, "❌ Only admins can change the queue mode.")
+            return
+        
+        args = [arg.lower() for arg in message.command[1:]]
+        
+        if args[:1] == ["weight"]:
+            target = message.reply_to_message.from_user if message.reply_to_message else None
+            if not target or len(args) < 2 or not args[1].isdigit():
+                await governor.reply(message, "**Usage:** reply to a user with `/fairqueue weight [n]`")
+                return
+            await queue_manager.set_weight(chat_id, target.id, int(args[1]))
+            await governor.reply(message, f"⚖️ {target.mention} now gets **{max(1, int(args[1]))}** track(s) per turn.")
+            return
+        
+        if args[:1] not in (["on"], ["off"]):
+            mode = queue_manager.modes.get(chat_id, 'fifo')
+            await governor.reply(
+                message,
+                f"⚖️ **Fair queue:** {'On' if mode == 'fair' else 'Off'}\n\n"
+                "**Usage:** `/fairqueue on` or `/fairqueue off`"
+            )
+            return
+        
+        await queue_manager.set_mode(chat_id, 'fair' if args[0] == "on" else 'fifo')
+        await governor.reply(
+            message,
+            "⚖️ **Fair queue on** — requesters now take turns."
+            if args[0] == "on" else
+            "📃 **Fair queue off** — tracks play in the order they were added."
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Fair queue command error: {e}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
+
+def _group_call_chat_id(update, chats) -> int:
+    """Marked chat id of an UpdateGroupCall
+
+    The update carries the bare id; basic groups are marked as -id and
+    supergroups/channels as -100id.
+    """
+    if isinstance(chats.get(update.chat_id), (raw.types.Chat, raw.types.ChatForbidden)):
+        return -update.chat_id
+    return utils.get_channel_id(update.chat_id)
+
+@app.on_raw_update(group=5)
+async def voice_chat_participants(_, update, users, chats):
+    """Feed voice chat participant counts to the idle reaper"""
+    if not isinstance(update, raw.types.UpdateGroupCall):
+        return
+    try:
+        chat_id = _group_call_chat_id(update, chats)
+        if not owns_chat(chat_id):
+            return
+        if isinstance(update.call, raw.types.GroupCallDiscarded):
+            idle_reaper.update_participants(chat_id, 0)
+        else:
+            idle_reaper.update_participants(chat_id, update.call.participants_count)
+    except Exception as e:
+        logger.debug(f"Participant update error: {e}")
+
+# The assistants are the accounts sitting in the calls, so they get these updates too
+for client in assistant_clients:
+    client.add_handler(RawUpdateHandler(voice_chat_participants), group=5)
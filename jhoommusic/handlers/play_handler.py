@@ -1,12 +1,76 @@
+import re
+import time
 import logging
 from pyrogram import filters
 from pyrogram.types import Message
 from ..core.bot import app
+from ..core.config import Config
+from ..core.media_extractor import universal_extractor
+from ..core.playback import playback_manager
+from ..core.queue import queue_manager
 from ..core.stream_manager import stream_manager
+from ..core.governor import governor
 from ..utils.helpers import save_user_to_db, save_chat_to_db
 
 logger = logging.getLogger(__name__)
 
+PLAYLIST_URL = re.compile(r"[?&]list=|/playlist|spotify\.com/(playlist|album)/")
+
+# Minimum seconds between edits of a progress message
+PROGRESS_EDIT_INTERVAL = 3
+
+def _queue_notifier(processing_msg: Message):
+    """Tell the user where they are in the admission queue"""
+    async def notify(position: int, eta: int):
+        await governor.edit(
+            processing_msg,
+            f"⏳ **Host is busy**\n\n"
+            f"You're **#{position}** in line. Estimated wait: ~{eta}s"
+        )
+    return notify
+
+async def _play_playlist(message: Message, query: str, processing_msg: Message):
+    """Queue a whole playlist, starting the first track if nothing is playing"""
+    chat_id = message.chat.id
+    tracks = await universal_extractor.extract(
+        query, playlist=True, max_playlist=Config.MAX_PLAYLIST_SIZE, audio_only=True
+    )
+    if not tracks:
+        await processing_msg.edit_text("❌ **Couldn't read that playlist.**")
+        return
+    if not isinstance(tracks, list):
+        tracks = [tracks]
+    for track in tracks:
+        track['user_id'] = message.from_user.id
+
+    started = None
+    if not stream_manager.is_streaming(chat_id):
+        started = tracks.pop(0)
+        if not await playback_manager.play_track(chat_id, started):
+            await processing_msg.edit_text("❌ Failed to start playback. Check if bot has proper permissions.")
+            return
+
+    added, total, last_edit = 0, len(tracks), time.monotonic()
+    try:
+        async for added, total in queue_manager.add_many(chat_id, tracks):
+            if added < total and time.monotonic() - last_edit >= PROGRESS_EDIT_INTERVAL:
+                last_edit = time.monotonic()
+                await governor.edit(processing_msg, f"📥 **Adding playlist...** {added}/{total} tracks queued")
+    except Exception as e:
+        logger.error(f"❌ Playlist queue error in {chat_id}: {e}")
+        if not added:
+            await processing_msg.edit_text(f"❌ {str(e)}")
+            return
+
+    skipped = len(tracks) - added
+    await processing_msg.edit_text(
+        "📃 **Playlist added**\n\n"
+        + (f"**Now Playing:** {started.get('title', 'Unknown')}\n" if started else "")
+        + f"**Queued:** {added} tracks\n"
+        + (f"**Skipped:** {skipped} (queue limit)\n" if skipped else "")
+        + f"**Requested by:** {message.from_user.mention}"
+    )
+
 @app.on_message(filters.command(["play", "p"]) & filters.group)
 async def play_music(_, message: Message):
     """Handle /play command"""
@@ -19,7 +83,7 @@ async def play_music(_, message: Message):
         
         # Check if query is provided
         if len(message.command) < 2 and not message.reply_to_message:
-            await message.reply_text("**Usage:** `/play [song name or URL]` or reply to an audio file")
+            await governor.reply(message, "**Usage:** `/play [song name or URL]` or reply to an audio file")
             return
         
         chat_id = message.chat.id
@@ -29,7 +93,7 @@ async def play_music(_, message: Message):
         if message.reply_to_message and (message.reply_to_message.audio or message.reply_to_message.video):
             file = message.reply_to_message.audio or message.reply_to_message.video
             
-            processing_msg = await message.reply_text("🔄 **Processing file...**")
+            processing_msg = await governor.deferred_reply(message, "🔄 **Processing file...**")
             
             try:
                 file_path = await app.download_media(file)
@@ -38,7 +102,8 @@ async def play_music(_, message: Message):
                 success = await stream_manager.start_stream(
                     chat_id, 
                     file_path,
-                    audio_only=not bool(message.reply_to_message.video)
+                    audio_only=not bool(message.reply_to_message.video),
+                    on_queued=_queue_notifier(processing_msg)
                 )
                 
                 if success:
@@ -64,7 +129,15 @@ async def play_music(_, message: Message):
         logger.info(f"🔍 SEARCH QUERY: {query}")
         
         # Send processing message
-        processing_msg = await message.reply_text("🔄 **Searching and processing...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Searching and processing...**")
+        
+        if PLAYLIST_URL.search(query):
+            try:
+                await _play_playlist(message, query, processing_msg)
+            except Exception as e:
+                logger.error(f"❌ Playlist error: {e}")
+                await processing_msg.edit_text(f"❌ **Error occurred**\n\n**Details:** {str(e)[:200]}")
+            return
         
         try:
             logger.info(f"🎵 Starting stream for: {query}")
@@ -72,7 +145,8 @@ async def play_music(_, message: Message):
             success = await stream_manager.start_stream(
                 chat_id, 
                 query,
-                audio_only=True
+                audio_only=True,
+                on_queued=_queue_notifier(processing_msg)
             )
             
             logger.info(f"🎵 Stream start result: {success}")
@@ -98,7 +172,8 @@ async def play_music(_, message: Message):
                     "**Possible issues:**\n"
                     "• Bot needs admin rights in the group\n"
                     "• Voice chat must be active\n"
-                    "• Check if the song/URL is valid\n\n"
+                    "• Check if the song/URL is valid\n"
+                    "• Host may be at capacity, try again shortly\n\n"
                     "Try: /join first, then /play again"
                 )
         
@@ -121,7 +196,7 @@ async def play_music(_, message: Message):
         logger.error(f"❌ Critical error in play command: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply_text(f"❌ Critical error: {str(e)}")
+        await governor.reply(message, f"❌ Critical error: {str(e)}")
 
 @app.on_message(filters.command(["testplay"]) & filters.group)
 async def test_play_music(_, message: Message):
@@ -130,7 +205,7 @@ async def test_play_music(_, message: Message):
         logger.info(f"🧪 TESTPLAY COMMAND from {message.from_user.id} in {message.chat.id}")
         
         if len(message.command) < 2:
-            await message.reply_text("**Usage:** `/testplay [song name or URL]`")
+            await governor.reply(message, "**Usage:** `/testplay [song name or URL]`")
             return
         
         query = " ".join(message.command[1:])
@@ -138,7 +213,7 @@ async def test_play_music(_, message: Message):
         
         logger.info(f"🔍 TEST SEARCH QUERY: {query}")
         
-        processing_msg = await message.reply_text("🔄 **Testing playback...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Testing playback...**")
         
         try:
             logger.info(f"🧪 Starting test stream for: {query}")
@@ -146,7 +221,8 @@ async def test_play_music(_, message: Message):
             success = await stream_manager.start_stream(
                 chat_id, 
                 query,
-                audio_only=True
+                audio_only=True,
+                on_queued=_queue_notifier(processing_msg)
             )
             
             logger.info(f"🧪 Test stream result: {success}")
@@ -178,7 +254,7 @@ async def test_play_music(_, message: Message):
         logger.error(f"❌ Critical test play error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply_text(f"❌ Critical error: {str(e)}")
+        await governor.reply(message, f"❌ Critical error: {str(e)}")
 
 @app.on_message(filters.command(["vplay", "vp"]) & filters.group)
 async def video_play(_, message: Message):
@@ -190,7 +266,7 @@ async def video_play(_, message: Message):
         await save_chat_to_db(message.chat)
         
         if len(message.command) < 2:
-            await message.reply_text("**Usage:** `/vplay [video name or URL]`")
+            await governor.reply(message, "**Usage:** `/vplay [video name or URL]`")
             return
         
         query = " ".join(message.command[1:])
@@ -198,14 +274,15 @@ async def video_play(_, message: Message):
         
         logger.info(f"🔍 Video search query: {query}")
         
-        processing_msg = await message.reply("🔄 **Searching and processing video...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Searching and processing video...**")
         
         try:
             success = await stream_manager.start_stream(
                 chat_id, 
                 query,
                 video=True,
-                audio_only=False
+                audio_only=False,
+                on_queued=_queue_notifier(processing_msg)
             )
             
             if success:
@@ -229,7 +306,8 @@ async def video_play(_, message: Message):
                     "**Possible issues:**\n"
                     "• Bot needs admin rights in the group\n"
                     "• Voice chat must be active\n"
-                    "• Check if the video/URL is valid\n\n"
+                    "• Check if the video/URL is valid\n"
+                    "• Host may be at capacity, try again shortly\n\n"
                     "Try: /join first, then /vplay again"
                 )
         
@@ -252,7 +330,7 @@ async def video_play(_, message: Message):
         logger.error(f"❌ Critical error in vplay command: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply(f"❌ Critical error: {str(e)}")
+        await governor.reply(message, f"❌ Critical error: {str(e)}")
 
 @app.on_message(filters.command(["join"]) & filters.group)
 async def join_command(_, message: Message):
@@ -262,7 +340,7 @@ async def join_command(_, message: Message):
         
         chat_id = message.chat.id
         
-        processing_msg = await message.reply_text("🔄 **Joining voice chat...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Joining voice chat...**")
         
         logger.info(f"📞 Attempting to join voice chat in {chat_id}")
         success = await stream_manager.join_call(chat_id)
@@ -291,7 +369,7 @@ async def join_command(_, message: Message):
         logger.error(f"❌ Join command error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply_text(f"❌ Error: {str(e)}")
+        await governor.reply(message, f"❌ Error: {str(e)}")
 
 @app.on_message(filters.command(["leave"]) & filters.group)
 async def leave_command(_, message: Message):
@@ -301,7 +379,7 @@ async def leave_command(_, message: Message):
         
         chat_id = message.chat.id
         
-        processing_msg = await message.reply("🔄 **Leaving voice chat...**")
+        processing_msg = await governor.deferred_reply(message, "🔄 **Leaving voice chat...**")
         
         success = await stream_manager.leave_call(chat_id)
         
@@ -316,4 +394,4 @@ async def leave_command(_, message: Message):
         logger.error(f"❌ Leave command error: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply(f"❌ Error: {str(e)}")
\ No newline at end of file
+        await governor.reply(message, f"❌ Error: {str(e)}")
\ No newline at end of file
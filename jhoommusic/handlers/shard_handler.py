@@ -0,0 +1,22 @@
+import logging
+from pyrogram import StopPropagation
+from pyrogram.handlers import CallbackQueryHandler, ChatMemberUpdatedHandler, InlineQueryHandler, MessageHandler
+from ..core.bot import app
+from ..core.config import Config
+from ..core.sharding import owned
+
+logger = logging.getLogger(__name__)
+
+# Runs before every other handler group
+SHARD_GUARD_GROUP = -100
+
+
+async def drop_foreign_update(_, update):
+    """Stop handling updates of chats owned by another shard"""
+    raise StopPropagation
+
+
+if Config.SHARD_COUNT > 1:
+    for handler_type in (MessageHandler, CallbackQueryHandler, ChatMemberUpdatedHandler, InlineQueryHandler):
+        app.add_handler(handler_type(drop_foreign_update, ~owned), group=SHARD_GUARD_GROUP)
+    logger.info(f"🧩 Shard {Config.SHARD_ID}/{Config.SHARD_COUNT} guarding its chats")
@@ -2,6 +2,7 @@ import logging
 from pyrogram import filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from ..core.bot import app
+from ..core.governor import governor, PRIORITY_CONTROL
 from ..utils.helpers import save_user_to_db, save_chat_to_db, get_current_time
 
 logger = logging.getLogger(__name__)
@@ -62,7 +63,8 @@ HEY {message.from_user.first_name}, I'M JHOOM MUSIC - AN ADVANCED AI MUSIC PLAYE
             ]
         ])
         
-        await message.reply_text(
+        await governor.reply(
+            message,
             text=text,
             reply_markup=buttons,
             disable_web_page_preview=True
@@ -74,7 +76,8 @@ HEY {message.from_user.first_name}, I'M JHOOM MUSIC - AN ADVANCED AI MUSIC PLAYE
         logger.error(f"❌ Error in start command: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply_text(
+        await governor.reply(
+            message,
             "🎵 **JhoomMusic Bot**\n\n"
             "✅ Bot is online and ready!\n"
             "Use /play [song name] to start playing music."
@@ -120,14 +123,14 @@ async def help_command(_, message: Message):
 **🆘 SUPPORT:** @JhoomMusicSupport
 """
         
-        await message.reply_text(help_text)
+        await governor.reply(message, help_text)
         logger.info(f"✅ HELP COMMAND completed")
         
     except Exception as e:
         logger.error(f"❌ Error in help command: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply("❓ **Help:** Use /play [song name] to play music!")
+        await governor.reply(message, "❓ **Help:** Use /play [song name] to play music!")
 
 @app.on_message(filters.command("ping"))
 async def ping_command(_, message: Message):
@@ -137,19 +140,28 @@ async def ping_command(_, message: Message):
         logger.info(f"🏓 PING COMMAND from {message.from_user.id}")
         
         start_time = time.time()
-        msg = await message.reply("🏓 **Pong!**")
+        msg = await governor.reply(message, "🏓 **Pong!**")
         end_time = time.time()
         
         response_time = (end_time - start_time) * 1000
         from ..utils.helpers import get_uptime
+        from ..core.admission import admission_controller
+        from ..core.reaper import idle_reaper
         uptime = get_uptime()
+        load = admission_controller.get_utilization()
+        reaper = idle_reaper.get_stats()
         
-        await msg.edit_text(
+        await governor.edit(
+            msg,
             f"🏓 **Pong!**\n\n"
             f"⏱ **Response Time:** `{response_time:.2f} ms`\n"
             f"🕐 **Uptime:** `{uptime}`\n"
+            f"🎚 **Streams:** `{load['used']}/{load['capacity']} units ({load['percent']}%)`"
+            f" · `{load['waiting']} waiting`\n"
+            f"🧹 **Idle calls reclaimed:** `{reaper['reclaimed']}`\n"
             f"🤖 **Status:** Online\n"
-            f"🎵 **JhoomMusic Bot** is ready!"
+            f"🎵 **JhoomMusic Bot** is ready!",
+            priority=PRIORITY_CONTROL
         )
         
         logger.info(f"✅ PING COMMAND completed: {response_time:.2f}ms")
@@ -158,7 +170,7 @@ async def ping_command(_, message: Message):
         logger.error(f"❌ Error in ping command: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply("🏓 **Pong!** - Bot is online!")
+        await governor.reply(message, "🏓 **Pong!** - Bot is online!")
 
 @app.on_message(filters.command("alive"))
 async def alive_command(_, message: Message):
@@ -169,7 +181,8 @@ async def alive_command(_, message: Message):
         from ..utils.helpers import get_uptime
         uptime = get_uptime()
         
-        await message.reply(
+        await governor.reply(
+            message,
             "🤖 **I'm Alive!**\n\n"
             "✅ Bot is running perfectly\n"
             "✅ All systems operational\n"
@@ -186,4 +199,4 @@ async def alive_command(_, message: Message):
         logger.error(f"❌ Error in alive command: {e}")
         import traceback
         traceback.print_exc()
-        await message.reply("🤖 **I'm Alive!** - Bot is working!")
\ No newline at end of file
+        await governor.reply(message, "🤖 **I'm Alive!** - Bot is working!")
\ No newline at end of file
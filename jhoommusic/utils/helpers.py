@@ -2,9 +2,9 @@ import time
 import logging
 from datetime import datetime, timedelta
 from pyrogram.types import Message
-from ..core.bot import app
-from ..core.database import db
 from ..core.config import Config
+from ..core.activity import activity_tracker
+from ..core.admins import admin_cache
 
 logger = logging.getLogger(__name__)
 
@@ -52,33 +52,17 @@ async def is_admin_or_sudo(chat_id: int, user_id: int) -> bool:
     if user_id in Config.SUDO_USERS:
         return True
     
-    try:
-        member = await app.get_chat_member(chat_id, user_id)
-        return member.status in ["administrator", "creator"]
-    except Exception:
-        return False
+    return await admin_cache.is_admin(chat_id, user_id)
 
 async def is_user_gbanned(user_id: int) -> bool:
     """Check if user is globally banned"""
-    if not db.enabled:
-        return False
-    try:
-        return await db.gbanned_users.find_one({"user_id": user_id}) is not None
-    except Exception as e:
-        logger.error(f"Error checking gban status: {e}")
-        return False
+    from ..core.access import access_lists
+    return access_lists.contains("gban", user_id)
 
 async def check_user_auth(user_id: int) -> bool:
     """Check if user is authorized"""
-    if user_id in Config.SUDO_USERS:
-        return True
-    if not db.enabled:
-        return True  # Allow all users when DB is disabled
-    try:
-        return await db.auth_users.find_one({"user_id": user_id}) is not None
-    except Exception as e:
-        logger.error(f"Error checking auth status: {e}")
-        return True  # Allow all users on error (for testing)
+    from ..core.access import access_lists
+    return access_lists.is_authorized(user_id)
 
 def extract_chat_id(message: Message) -> int:
     """Extract chat ID from message text or reply"""
@@ -91,43 +75,9 @@ def extract_chat_id(message: Message) -> int:
         return message.chat.id
 
 async def save_user_to_db(user):
-    """Save user to database"""
-    if not db.enabled or not user:
-        return
-    try:
-        await db.users.update_one(
-            {"user_id": user.id},
-            {
-                "$set": {
-                    "user_id": user.id,
-                    "username": user.username,
-                    "first_name": user.first_name,
-                    "last_name": user.last_name,
-                    "last_seen": datetime.utcnow()
-                }
-            },
-            upsert=True
-        )
-    except Exception as e:
-        logger.error(f"Error saving user to DB: {e}")
+    """Record user activity (written to the database in batches)"""
+    activity_tracker.record_user(user)
 
 async def save_chat_to_db(chat):
-    """Save chat to database"""
-    if not db.enabled or not chat:
-        return
-    try:
-        await db.chats.update_one(
-            {"chat_id": chat.id},
-            {
-                "$set": {
-                    "chat_id": chat.id,
-                    "title": chat.title,
-                    "type": chat.type,
-                    "username": chat.username,
-                    "last_active": datetime.utcnow()
-                }
-            },
-            upsert=True
-        )
-    except Exception as e:
-        logger.error(f"Error saving chat to DB: {e}")
+    """Record chat activity (written to the database in batches)"""
+    activity_tracker.record_chat(chat)
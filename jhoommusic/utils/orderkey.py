@@ -0,0 +1,62 @@
+"""Lexicographic order keys for lists stored as independent documents.
+
+A key is a base-62 fraction in (0, 1) written as a string whose ASCII
+order matches its numeric order, so an index on it returns items in list
+order. A key strictly between any two keys always exists, which lets an
+item be moved or inserted by writing that one item only.
+"""
+
+from typing import List, Optional
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """Key between fractions ``a`` and ``b`` (None = 1), neither ending in '0'"""
+    if b is not None:
+        # Keep the common prefix, then split the first differing digit
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    low = DIGITS.index(a[0]) if a else 0
+    high = DIGITS.index(b[0]) if b is not None else BASE
+    if high - low > 1:
+        return DIGITS[(low + high) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[low] + _midpoint(a[1:], None)
+
+
+def key_between(before: Optional[str], after: Optional[str]) -> str:
+    """Order key sorting after ``before`` and before ``after`` (None = open end)"""
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"Order keys out of order: {before!r} >= {after!r}")
+    if before is None and after is not None:
+        return _midpoint("", after)
+    if after is None and before:
+        # Appends step the first digit that can grow instead of halving the gap
+        for i, digit in enumerate(before):
+            if digit != DIGITS[-1]:
+                return before[:i] + DIGITS[DIGITS.index(digit) + 1]
+        return before + DIGITS[1]
+    return _midpoint(before or "", after)
+
+
+def spread_keys(count: int) -> List[str]:
+    """``count`` evenly spaced keys of equal width"""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    keys = []
+    for i in range(count):
+        value = (i + 1) * BASE ** width // (count + 1)
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits = DIGITS[digit] + digits
+        keys.append(digits.rstrip(DIGITS[0]))
+    return keys
@@ -0,0 +1,89 @@
+"""Token bucket for pacing bursts of Telegram API calls.
+
+Tokens refill at ``rate`` per second up to ``capacity``; every call takes
+one. A FloodWait pauses the whole bucket for the requested time and halves
+the rate, and each success wins back a small share of the original rate,
+so senders settle just under the limit Telegram enforces.
+"""
+
+import time
+import asyncio
+from typing import Dict, Optional
+
+# Share of the maximum rate regained per successful call
+RECOVERY_STEP = 0.02
+
+
+class TokenBucket:
+    """Rate limiter shared by concurrent senders"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 10
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+        self.total_waits = 0
+        self.total_flood_waits = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait for a token (callers are served in arrival order)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.total_waits += 1
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.total_waits += 1
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is now)"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        """Take a token without waiting, if one is available"""
+        if self.delay() > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def penalize(self, seconds: float):
+        """Back off after a FloodWait of ``seconds``"""
+        now = time.monotonic()
+        self.total_flood_waits += 1
+        if now >= self.paused_until:
+            # Calls already in flight hit the same limit; slow down once per pause
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self._updated = self.paused_until  # no refill while paused
+
+    def reward(self):
+        """Speed back up after a successful call"""
+        self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+
+    def get_stats(self) -> Dict:
+        return {
+            "rate": round(self.rate, 2),
+            "max_rate": self.max_rate,
+            "waits": self.total_waits,
+            "flood_waits": self.total_flood_waits
+        }
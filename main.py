@@ -8,6 +8,7 @@ import os
 import sys
 import asyncio
 import logging
+import time
 import signal
 from pathlib import Path
 
@@ -16,15 +17,30 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from jhoommusic.core.config import Config
-from jhoommusic.core.bot import app, tgcaller
+from jhoommusic.core.bot import app
 from jhoommusic.core.database import db
 from jhoommusic.core.stream_manager import stream_manager
+from jhoommusic.core.reaper import idle_reaper
+from jhoommusic.core.assistants import assistant_pool
+from jhoommusic.core.connection import connection_manager
+from jhoommusic.core.leases import lease_manager
+from jhoommusic.core.snapshot import snapshot_manager
+from jhoommusic.core.queue import queue_manager
+from jhoommusic.core.history import play_history
+from jhoommusic.core.chatstate import chat_state
+from jhoommusic.core.activity import activity_tracker
+from jhoommusic.core.access import access_lists
+from jhoommusic.core.broadcast import broadcast_engine
+from jhoommusic.core.governor import governor
 
 logger = logging.getLogger(__name__)
 
 # Global shutdown flag
 shutdown_event = asyncio.Event()
 
+# SIGTERM drains streams before shutting down, SIGINT stops right away
+drain_requested = False
+
 def register_handlers():
     """Register all handlers manually"""
     try:
@@ -32,6 +48,8 @@ def register_handlers():
         
         # Import all handlers to register them
         from jhoommusic.handlers import (
+            shard_handler,
+            access_handler,
             start_handler,
             play_handler, 
             control_handler,
@@ -55,13 +73,53 @@ async def startup_tasks():
         await db.connect()
         logger.info("✅ Database initialized")
         
-        # Start TgCaller
+        # Pace outbound Telegram calls
+        governor.start()
+        
+        # Keep auth, gban, block and blacklist lookups in memory
+        await access_lists.load()
+        access_lists.start()
+        
+        # Batch queue, play history and activity writes to MongoDB
+        queue_manager.start()
+        play_history.start()
+        activity_tracker.start()
+        
+        # Move state of inactive chats out of memory
+        chat_state.start()
+        
+        # Start TgCaller on every assistant account
         try:
-            await tgcaller.start()
-            logger.info("✅ TgCaller started successfully")
+            await assistant_pool.start()
+            logger.info(f"✅ TgCaller started on {len(assistant_pool.assistants)} assistant(s)")
         except Exception as e:
             logger.error(f"❌ TgCaller start error: {e}")
         
+        # Drop voice connections whose call ended or that we were kicked from
+        connection_manager.start()
+        
+        # Start per-chat resource accounting
+        stream_manager.resource_monitor.start()
+        
+        # Leave silent or empty voice chats
+        idle_reaper.start()
+        
+        # Keep chat ownership leases alive and adopt orphaned chats
+        lease_manager.start()
+        
+        # Resume sessions from before the restart, then keep snapshotting
+        await snapshot_manager.restore_all()
+        snapshot_manager.start()
+        
+        # Continue broadcasts cut off by the restart (first shard only)
+        if db.enabled and Config.SHARD_ID == 0:
+            try:
+                resumed = await broadcast_engine.resume()
+                if resumed:
+                    logger.info(f"✅ Resumed {resumed} broadcast(s)")
+            except Exception as e:
+                logger.error(f"❌ Broadcast resume error: {e}")
+        
         # Send startup message to super group if configured
         if Config.SUPER_GROUP_ID and Config.SUPER_GROUP_ID != 0:
             try:
@@ -94,21 +152,54 @@ async def shutdown_tasks():
     """Cleanup tasks on shutdown"""
     try:
         logger.info("🛑 Shutting down JhoomMusic Bot...")
+        started = time.monotonic()
+        
+        # Stop background loops
+        await stream_manager.resource_monitor.stop()
+        await connection_manager.stop()
+        await idle_reaper.stop()
+        await chat_state.stop()
+        await access_lists.stop()
+        await broadcast_engine.stop()
         
-        # Stop all streams
+        # Hand sessions to a peer or let current tracks finish
+        if drain_requested:
+            try:
+                report = await stream_manager.drain()
+                logger.info(
+                    f"✅ Drained in {report['seconds']}s: {report['handed_off']} handed off, "
+                    f"{report['finished']} finished, {report['remaining']} cut off"
+                )
+            except Exception as e:
+                logger.error(f"❌ Drain error: {e}")
+        await lease_manager.stop()
+        
+        # Final session snapshot so the next start resumes where we stopped
+        await snapshot_manager.stop()
+        
+        # Stop all remaining streams
         try:
             await stream_manager.cleanup_all()
             logger.info("✅ All streams stopped")
         except Exception as e:
             logger.error(f"❌ Error stopping streams: {e}")
         
-        # Stop TgCaller
+        # Stop TgCaller on every assistant account
         try:
-            await tgcaller.stop()
+            await assistant_pool.stop()
             logger.info("✅ TgCaller stopped")
         except Exception as e:
             logger.error(f"❌ Error stopping TgCaller: {e}")
         
+        # Write out queue changes still in the journal
+        try:
+            await queue_manager.stop()
+            await play_history.stop()
+            await activity_tracker.stop()
+            logger.info("✅ Queue journal, play history and activity flushed")
+        except Exception as e:
+            logger.error(f"❌ Error flushing queue journal: {e}")
+        
         # Close database connection
         try:
             await db.close()
@@ -116,6 +207,9 @@ async def shutdown_tasks():
         except Exception as e:
             logger.error(f"❌ Error closing database: {e}")
         
+        # Drop messages still waiting for the API
+        await governor.stop()
+        
         # Stop the bot
         try:
             await app.stop()
@@ -123,16 +217,59 @@ async def shutdown_tasks():
         except Exception as e:
             logger.error(f"❌ Error stopping bot: {e}")
         
-        logger.info("👋 Shutdown completed successfully")
+        logger.info(f"👋 Shutdown completed successfully in {time.monotonic() - started:.1f}s")
         
     except Exception as e:
         logger.error(f"❌ Error during shutdown: {e}")
 
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
+    global drain_requested
     logger.info(f"📡 Received signal {signum}")
+    if signum == signal.SIGTERM:
+        drain_requested = True
     shutdown_event.set()
 
+async def supervise_shards():
+    """Run one worker process per shard and restart crashed ones"""
+    processes = {}
+    
+    async def run_shard(shard_id: int):
+        backoff = 1
+        while not shutdown_event.is_set():
+            env = dict(os.environ, SHARD_ID=str(shard_id))
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(project_root / "main.py"), env=env
+            )
+            processes[shard_id] = process
+            logger.info(f"🧩 Shard {shard_id} started (pid {process.pid})")
+            
+            code = await process.wait()
+            if shutdown_event.is_set():
+                break
+            
+            # Reset backoff after a healthy run, grow it on crash loops
+            if time.monotonic() - started > 60:
+                backoff = 1
+            logger.error(f"❌ Shard {shard_id} exited with code {code}, restarting in {backoff}s")
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, 60)
+    
+    logger.info(f"🧩 Starting {Config.SHARD_COUNT} shards...")
+    tasks = [asyncio.create_task(run_shard(i)) for i in range(Config.SHARD_COUNT)]
+    
+    await shutdown_event.wait()
+    logger.info("🛑 Stopping shards...")
+    for process in processes.values():
+        if process.returncode is None:
+            process.terminate()
+    await asyncio.gather(*tasks)
+    logger.info("✅ All shards stopped")
+
 async def main():
     """Main function to start the bot"""
     try:
@@ -190,9 +327,12 @@ if __name__ == "__main__":
         logger.error("Install with: sudo apt install ffmpeg (Ubuntu/Debian) or brew install ffmpeg (macOS)")
         sys.exit(1)
     
-    # Run the bot
+    # Run the bot (as shard supervisor when sharding and not a worker)
     try:
-        asyncio.run(main())
+        if Config.SHARD_COUNT > 1 and "SHARD_ID" not in os.environ:
+            asyncio.run(supervise_shards())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("🛑 Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Assistant pool test script (uses fake TgCallers, no voice chats needed)
+"""
+
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from jhoommusic.core import connection
+from jhoommusic.core.assistants import AssistantPool
+from jhoommusic.core.config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeTgCaller:
+    """Records calls instead of talking to Telegram"""
+
+    def __init__(self, name: str, broken: bool = False):
+        self.name = name
+        self.broken = broken
+        self.calls = set()
+
+    async def start(self):
+        pass
+
+    async def stop(self, chat_id: int = None):
+        if chat_id is not None:
+            self.calls.discard(chat_id)
+
+    async def join_group_call(self, chat_id: int):
+        if self.broken:
+            raise Exception(f"{self.name} is broken")
+        self.calls.add(chat_id)
+
+    async def leave_group_call(self, chat_id: int):
+        self.calls.discard(chat_id)
+
+    async def get_call(self, chat_id: int):
+        return chat_id in self.calls
+
+    async def play(self, chat_id: int, source, **kwargs):
+        pass
+
+def make_pool(*callers) -> AssistantPool:
+    pool = AssistantPool()
+    for caller in callers:
+        pool.add(caller, name=caller.name)
+    return pool
+
+async def test_least_loaded():
+    """New chats are spread over the least-loaded assistants"""
+    logger.info("🧪 Testing least-loaded scheduling...")
+    a, b, c = FakeTgCaller("a"), FakeTgCaller("b"), FakeTgCaller("c")
+    connection.assistant_pool = make_pool(a, b, c)
+    manager = connection.ConnectionManager()
+
+    for chat_id in range(1, 7):
+        await manager.get_connection(chat_id)
+
+    loads = sorted(len(caller.calls) for caller in (a, b, c))
+    logger.info(f"📊 Loads: {loads}")
+    return loads == [2, 2, 2]
+
+async def test_sticky():
+    """A chat goes back to the same assistant after leaving"""
+    logger.info("🧪 Testing sticky assignment...")
+    a, b = FakeTgCaller("a"), FakeTgCaller("b")
+    pool = connection.assistant_pool = make_pool(a, b)
+    manager = connection.ConnectionManager()
+
+    await manager.get_connection(100)
+    first = pool.assistant_for(100).name
+    await manager.get_connection(200)
+    await manager.get_connection(300)
+    await manager.release_connection(100)
+    await manager.get_connection(100)
+    second = pool.assistant_for(100).name
+
+    logger.info(f"📊 Chat 100: {first} → {second}")
+    return first == second
+
+async def test_failover():
+    """Joins fail over to a healthy assistant and a broken one is taken out"""
+    logger.info("🧪 Testing failover...")
+    broken, healthy = FakeTgCaller("broken", broken=True), FakeTgCaller("healthy")
+    pool = connection.assistant_pool = make_pool(broken, healthy)
+    manager = connection.ConnectionManager()
+
+    results = []
+    for chat_id in range(1, Config.ASSISTANT_MAX_FAILURES + 2):
+        results.append(await manager.get_connection(chat_id))
+
+    stats = {s['name']: s for s in pool.get_stats()}
+    logger.info(f"📊 Stats: {stats}")
+    return (
+        all(results)
+        and not broken.calls
+        and len(healthy.calls) == len(results)
+        and stats['broken']['down']
+    )
+
+async def test_all_broken():
+    """Joining fails cleanly when no assistant works"""
+    logger.info("🧪 Testing all assistants broken...")
+    connection.assistant_pool = make_pool(FakeTgCaller("x", broken=True), FakeTgCaller("y", broken=True))
+    manager = connection.ConnectionManager()
+
+    ok = await manager.get_connection(1)
+    return not ok and not manager.is_connected(1)
+
+async def main():
+    """Main test function"""
+    logger.info("🧪 Starting assistant pool tests...")
+    logger.info("=" * 50)
+
+    results = {
+        "Least loaded": await test_least_loaded(),
+        "Sticky": await test_sticky(),
+        "Failover": await test_failover(),
+        "All broken": await test_all_broken()
+    }
+
+    logger.info("\n📊 Test Results:")
+    for name, ok in results.items():
+        logger.info(f"{name}: {'✅ PASS' if ok else '❌ FAIL'}")
+
+    if all(results.values()):
+        logger.info("\n🎉 All assistant pool tests passed!")
+    else:
+        logger.error("\n❌ Some tests failed. Check the logs above.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Broadcast engine test script (uses a fake send API and collections, no Telegram or MongoDB needed)
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from pyrogram.errors import FloodWait
+from jhoommusic.core.broadcast import BroadcastEngine, parse_broadcast
+from jhoommusic.core.config import Config
+from jhoommusic.utils.ratelimit import TokenBucket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeCursor:
+    """Async cursor over a list of documents"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction=1):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    """Just enough of a Motor collection for the broadcast engine"""
+
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    @staticmethod
+    def _matches(doc, query):
+        for field, cond in query.items():
+            if isinstance(cond, dict):
+                if "$gt" in cond and not doc.get(field, float("-inf")) > cond["$gt"]:
+                    return False
+            elif doc.get(field) != cond:
+                return False
+        return True
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs if self._matches(doc, query or {})])
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if self._matches(doc, query):
+                doc.update(update.get("$set", {}))
+                return
+
+class FakeDatabase:
+    def __init__(self, chats=0, users=0):
+        self.enabled = True
+        self.chats = FakeCollection({"chat_id": -1000 - i} for i in range(chats))
+        self.users = FakeCollection({"user_id": 1 + i} for i in range(users))
+        self.broadcast_jobs = FakeCollection()
+
+class FakeMessage:
+    def __init__(self, chat_id, message_id):
+        self.chat_id = chat_id
+        self.id = message_id
+
+class FakeApi:
+    """Records sends, with optional FloodWaits and broken recipients"""
+
+    def __init__(self, flood_on=(), broken=(), delay=0.0):
+        self.flood_on = set(flood_on)
+        self.broken = set(broken)
+        self.delay = delay
+        self.sent = []
+        self.pinned = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if chat_id in self.flood_on:
+                self.flood_on.discard(chat_id)
+                raise FloodWait(value=1)
+            if chat_id in self.broken:
+                raise Exception("USER_IS_BLOCKED")
+            self.sent.append(chat_id)
+            return FakeMessage(chat_id, len(self.sent))
+        finally:
+            self.in_flight -= 1
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        return await self.send_message(chat_id, None)
+
+    async def pin_chat_message(self, chat_id, message_id, disable_notification=True):
+        self.pinned.append((chat_id, disable_notification))
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        pass
+
+async def wait_for_jobs(engine: BroadcastEngine):
+    await asyncio.gather(*list(engine.tasks.values()))
+
+async def test_parse_flags():
+    """Flags pick targets and pinning, the rest is the message"""
+    logger.info("🧪 Testing flag parsing...")
+    plain, text = parse_broadcast("/broadcast hello  world")
+    users, _ = parse_broadcast("/broadcast -user -pinloud hi")
+    nobot, rest = parse_broadcast("/broadcast -nobot -user -pin hi -user")
+
+    logger.info(f"📊 {plain}, {users}, {nobot}")
+    return (
+        text == "hello  world" and plain["targets"] == ["chats"] and not plain["pin"]
+        and users["targets"] == ["chats", "users"] and users["pin"] and users["pin_loud"]
+        and nobot["targets"] == ["users"] and nobot["pin"] and not nobot["pin_loud"]
+        and rest == "hi -user"
+    )
+
+async def test_delivery():
+    """Every recipient gets the message once; FloodWaits are retried and slow the bucket"""
+    logger.info("🧪 Testing delivery with FloodWait and broken recipients...")
+    Config.BROADCAST_RATE = 500
+    Config.BROADCAST_CONCURRENCY = 5
+    database = FakeDatabase(chats=40, users=10)
+    api = FakeApi(flood_on={-1005}, broken={3}, delay=0.01)
+    engine = BroadcastEngine(api=api, database=database)
+
+    await engine.create(1, text="hi", targets=["chats", "users"], pin=True)
+    await wait_for_jobs(engine)
+
+    job = database.broadcast_jobs.docs[0]
+    logger.info(f"📊 Job: sent {job['sent']}, failed {job['failed']}, bucket {engine.bucket.get_stats()}")
+    return (
+        job["status"] == "done"
+        and job["sent"] == 49 and job["failed"] == 1
+        and len(api.sent) == len(set(api.sent)) == 49
+        and len(api.pinned) == 49
+        and api.max_in_flight <= Config.BROADCAST_CONCURRENCY
+        and engine.bucket.total_flood_waits == 1
+    )
+
+async def test_resume():
+    """A job stopped half way resumes from its checkpoint without skipping anyone"""
+    logger.info("🧪 Testing resume after a restart...")
+    Config.BROADCAST_RATE = 200
+    Config.BROADCAST_CONCURRENCY = 4
+    Config.BROADCAST_CHECKPOINT_EVERY = 5
+    database = FakeDatabase(chats=60)
+    api = FakeApi(delay=0.005)
+    engine = BroadcastEngine(api=api, database=database)
+
+    await engine.create(1, text="hi")
+    while len(api.sent) < 25:
+        await asyncio.sleep(0.01)
+    await engine.stop()
+    first_run = set(api.sent)
+    checkpoint = database.broadcast_jobs.docs[0]["checkpoint"]["chats"]
+
+    restarted = BroadcastEngine(api=api, database=database)
+    resumed = await restarted.resume()
+    await wait_for_jobs(restarted)
+
+    all_chats = {doc["chat_id"] for doc in database.chats.docs}
+    repeats = len(api.sent) - len(set(api.sent))
+    logger.info(f"📊 First run {len(first_run)}, checkpoint {checkpoint}, repeats {repeats}")
+    return (
+        resumed == 1
+        and set(api.sent) == all_chats
+        and repeats <= Config.BROADCAST_CONCURRENCY
+        and database.broadcast_jobs.docs[0]["sent"] == len(all_chats) + repeats
+        and database.broadcast_jobs.docs[0]["status"] == "done"
+    )
+
+async def test_bucket_rate():
+    """The token bucket holds senders to its rate"""
+    logger.info("🧪 Testing token bucket pacing...")
+    bucket = TokenBucket(rate=100, capacity=1)
+    started = time.monotonic()
+    await asyncio.gather(*(bucket.acquire() for _ in range(50)))
+    elapsed = time.monotonic() - started
+
+    logger.info(f"📊 50 tokens at 100/s took {elapsed:.2f}s")
+    return 0.4 <= elapsed < 1.0
+
+async def main():
+    """Main test function"""
+    logger.info("🧪 Starting broadcast tests...")
+    logger.info("=" * 50)
+
+    results = {
+        "Parse flags": await test_parse_flags(),
+        "Delivery": await test_delivery(),
+        "Resume": await test_resume(),
+        "Bucket rate": await test_bucket_rate()
+    }
+
+    logger.info("\n📊 Test Results:")
+    for name, ok in results.items():
+        logger.info(f"{name}: {'✅ PASS' if ok else '❌ FAIL'}")
+
+    if all(results.values()):
+        logger.info("\n🎉 All broadcast tests passed!")
+    else:
+        logger.error("\n❌ Some tests failed. Check the logs above.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
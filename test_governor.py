@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+API governor test script (uses a fake client, no Telegram needed)
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from pyrogram.errors import FloodWait
+from jhoommusic.core.config import Config
+from jhoommusic.core.governor import ApiGovernor, PRIORITY_CONTROL, PRIORITY_COSMETIC
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeMessage:
+    def __init__(self, chat_id, message_id):
+        self.chat = type("Chat", (), {"id": chat_id})()
+        self.id = message_id
+
+class FakeClient:
+    """Records API calls, optionally raising one FloodWait per chat"""
+
+    def __init__(self, flood_chats=()):
+        self.flood_chats = dict(flood_chats)
+        self.calls = []
+        self.started = time.monotonic()
+
+    def _record(self, method, chat_id, detail):
+        if chat_id in self.flood_chats:
+            raise FloodWait(value=self.flood_chats.pop(chat_id))
+        self.calls.append((round(time.monotonic() - self.started, 2), method, chat_id, detail))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._record("send_message", chat_id, text)
+        return FakeMessage(chat_id, len(self.calls))
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self._record("edit_message_text", chat_id, text)
+        return FakeMessage(chat_id, message_id)
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        self._record("delete_messages", chat_id, message_ids)
+        return True
+
+def configure(global_rate=100, chat_rate=10, chat_burst=1):
+    Config.GOVERNOR_GLOBAL_RATE = global_rate
+    Config.GOVERNOR_CHAT_RATE = chat_rate
+    Config.GOVERNOR_CHAT_BURST = chat_burst
+
+async def test_priority():
+    """Control replies overtake queued cosmetic calls in the same chat"""
+    logger.info("🧪 Testing priorities...")
+    configure(chat_rate=20)
+    client = FakeClient()
+    governor = ApiGovernor(client)
+
+    cosmetic = [
+        asyncio.create_task(governor.delete_messages(1, [i], priority=PRIORITY_COSMETIC))
+        for i in range(5)
+    ]
+    await asyncio.sleep(0)
+    control = await governor.send_message(1, "paused", priority=PRIORITY_CONTROL)
+    await asyncio.gather(*cosmetic)
+    await governor.stop()
+
+    order = [call[1] for call in client.calls]
+    logger.info(f"📊 Order: {order}")
+    return control is not None and order.index("send_message") <= 1 and len(order) == 6
+
+async def test_coalescing():
+    """Edits of one message that pile up are sent once, with the newest text"""
+    logger.info("🧪 Testing edit coalescing...")
+    configure(chat_rate=5)
+    client = FakeClient()
+    governor = ApiGovernor(client)
+    message = FakeMessage(2, 10)
+
+    await governor.send_message(2, "start")  # uses the chat's only burst token
+    edits = [asyncio.create_task(governor.edit(message, f"progress {i}")) for i in range(10)]
+    results = await asyncio.gather(*edits)
+    await governor.stop()
+
+    edit_calls = [call for call in client.calls if call[1] == "edit_message_text"]
+    logger.info(f"📊 {len(edit_calls)} edit call(s) for 10 edits: {edit_calls}")
+    return (
+        len(edit_calls) == 1
+        and edit_calls[-1][3] == "progress 9"
+        and all(result.id == 10 for result in results)
+        and governor.total_coalesced == 9
+    )
+
+async def test_flood_wait_isolation():
+    """A FloodWait pauses only the chat it happened in"""
+    logger.info("🧪 Testing FloodWait isolation...")
+    configure(chat_rate=50, chat_burst=5)
+    client = FakeClient(flood_chats={3: 1})
+    governor = ApiGovernor(client)
+
+    flooded = asyncio.create_task(governor.send_message(3, "flooded"))
+    await asyncio.sleep(0.05)
+    others = await asyncio.gather(*(governor.send_message(4, f"other {i}") for i in range(5)))
+    others_done = time.monotonic() - client.started
+    await flooded
+    await governor.stop()
+
+    flooded_at = next(call[0] for call in client.calls if call[2] == 3)
+    logger.info(f"📊 Chat 4 done at {others_done:.2f}s, chat 3 retried at {flooded_at}s")
+    return len(others) == 5 and others_done < 0.5 and flooded_at >= 1.0 and governor.total_flood_waits == 1
+
+async def test_chat_rate():
+    """One chat is held to its own rate while another is not slowed down"""
+    logger.info("🧪 Testing per-chat rate...")
+    configure(chat_rate=10, chat_burst=1)
+    client = FakeClient()
+    governor = ApiGovernor(client)
+
+    started = time.monotonic()
+    await asyncio.gather(*(governor.send_message(5, f"m{i}") for i in range(6)))
+    busy_chat = time.monotonic() - started
+    started = time.monotonic()
+    await asyncio.gather(*(governor.send_message(chat_id, "hi") for chat_id in range(100, 106)))
+    many_chats = time.monotonic() - started
+    await governor.stop()
+
+    logger.info(f"📊 6 calls in one chat: {busy_chat:.2f}s, in six chats: {many_chats:.2f}s")
+    return busy_chat >= 0.45 and many_chats < 0.2
+
+async def test_deferred_reply():
+    """Fast commands send only their final text; slow ones show a placeholder first"""
+    logger.info("🧪 Testing deferred placeholders...")
+    configure(chat_rate=50, chat_burst=5)
+    Config.PLACEHOLDER_DELAY = 0.2
+    client = FakeClient()
+    governor = ApiGovernor(client)
+
+    fast = await governor.deferred_reply(FakeMessage(6, 1), "🔄 Working...")
+    await asyncio.sleep(0.05)
+    await fast.edit_text("done fast")
+
+    slow = await governor.deferred_reply(FakeMessage(7, 1), "🔄 Working...")
+    await asyncio.sleep(0.3)
+    await slow.edit_text("done slow")
+    await governor.stop()
+
+    fast_calls = [call[1:] for call in client.calls if call[2] == 6]
+    slow_calls = [call[1:] for call in client.calls if call[2] == 7]
+    logger.info(f"📊 Fast: {fast_calls}, slow: {slow_calls}")
+    return (
+        fast_calls == [("send_message", 6, "done fast")]
+        and slow_calls == [("send_message", 7, "🔄 Working..."), ("edit_message_text", 7, "done slow")]
+    )
+
+async def main():
+    """Main test function"""
+    logger.info("🧪 Starting API governor tests...")
+    logger.info("=" * 50)
+
+    results = {
+        "Priority": await test_priority(),
+        "Coalescing": await test_coalescing(),
+        "FloodWait isolation": await test_flood_wait_isolation(),
+        "Per-chat rate": await test_chat_rate(),
+        "Deferred reply": await test_deferred_reply()
+    }
+
+    logger.info("\n📊 Test Results:")
+    for name, ok in results.items():
+        logger.info(f"{name}: {'✅ PASS' if ok else '❌ FAIL'}")
+
+    if all(results.values()):
+        logger.info("\n🎉 All API governor tests passed!")
+    else:
+        logger.error("\n❌ Some tests failed. Check the logs above.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
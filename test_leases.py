@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Chat lease test script (uses an in-process Redis stand-in, no server needed)
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from jhoommusic.core import leases
+from jhoommusic.core.config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeRedis:
+    """Just enough of redis.Redis for the lease manager, with key expiry"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def _alive(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def set(self, key, value, px=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        if px:
+            self.expiry[key] = time.monotonic() + px / 1000
+        return True
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def pexpire(self, key, ms):
+        if not self._alive(key):
+            return 0
+        self.expiry[key] = time.monotonic() + int(ms) / 1000
+        return 1
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def exists(self, key):
+        return int(self._alive(key))
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(str(member).encode())
+
+    def srem(self, key, member):
+        self.data.get(key, set()).discard(str(member).encode())
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    # Python equivalents of the lease Lua scripts
+
+    def _acquire(self, keys, args):
+        lease, fence_key, chats = keys
+        owner, ttl, chat_id = args
+        current = self.get(lease)
+        if current:
+            current_owner, fence = current.decode().rsplit(":", 1)
+            if current_owner == owner:
+                self.pexpire(lease, ttl)
+                return int(fence)
+            return -1
+        fence = self.incr(fence_key)
+        self.set(lease, f"{owner}:{fence}", px=int(ttl))
+        self.sadd(chats, chat_id)
+        return fence
+
+    def _renew(self, keys, args):
+        token, ttl = args
+        if self.get(keys[0]) == token.encode():
+            return self.pexpire(keys[0], ttl)
+        return 0
+
+    def _release(self, keys, args):
+        lease, state, chats = keys
+        token, chat_id = args
+        if self.get(lease) == token.encode():
+            self.delete(lease, state)
+            self.srem(chats, chat_id)
+            return 1
+        return 0
+
+    def _hand_off(self, keys, args):
+        if self.get(keys[0]) == args[0].encode():
+            return self.delete(keys[0])
+        return 0
+
+    def _save_state(self, keys, args):
+        lease, state = keys
+        if self.get(lease) != args[0].encode():
+            return 0
+        for i in range(1, len(args), 2):
+            self.hset(state, args[i], args[i + 1])
+        return 1
+
+    def register_script(self, source):
+        scripts = {
+            leases.ACQUIRE_SCRIPT: self._acquire,
+            leases.RENEW_SCRIPT: self._renew,
+            leases.RELEASE_SCRIPT: self._release,
+            leases.HAND_OFF_SCRIPT: self._hand_off,
+            leases.SAVE_STATE_SCRIPT: self._save_state
+        }
+        func = scripts[source]
+        return lambda keys=(), args=(): func(list(keys), list(args))
+
+async def test_exclusive():
+    """Only one instance can own a chat"""
+    logger.info("🧪 Testing exclusive ownership...")
+    redis = FakeRedis()
+    host_a = leases.LeaseManager(redis, owner="host-a")
+    host_b = leases.LeaseManager(redis, owner="host-b")
+
+    a_ok = await host_a.acquire(1)
+    b_ok = await host_b.acquire(1)
+    again = await host_a.acquire(1)
+    return a_ok and not b_ok and again and host_a.owns(1) and not host_b.owns(1)
+
+async def test_fenced_handoff():
+    """After a lease expires the new owner gets a higher fence and the old one is locked out"""
+    logger.info("🧪 Testing fenced handoff...")
+    redis = FakeRedis()
+    host_a = leases.LeaseManager(redis, owner="host-a")
+    host_b = leases.LeaseManager(redis, owner="host-b")
+
+    await host_a.acquire(1)
+    await host_a.save_state(1, {'source': 'song', 'position': 42.0})
+    old_fence = host_a.fence(1)
+
+    # host-a stalls past its TTL
+    await asyncio.sleep(Config.LEASE_TTL + 0.05)
+    orphans = await host_b.find_orphans()
+    b_ok = await host_b.acquire(1)
+
+    stale_write = await host_a.save_state(1, {'position': 1.0})
+    still_owned = await host_a.renew(1)
+    state = await host_b.load_state(1)
+
+    logger.info(f"📊 Fences: {old_fence} → {host_b.fence(1)}, state={state}")
+    return (
+        orphans == [1]
+        and b_ok
+        and host_b.fence(1) > old_fence
+        and not stale_write
+        and not still_owned
+        and state.get('position') == '42.0'
+    )
+
+async def test_release():
+    """Releasing frees the chat and forgets it"""
+    logger.info("🧪 Testing release...")
+    redis = FakeRedis()
+    host_a = leases.LeaseManager(redis, owner="host-a")
+    host_b = leases.LeaseManager(redis, owner="host-b")
+
+    await host_a.acquire(1)
+    released = await host_a.release(1)
+    orphans = await host_b.find_orphans()
+    b_ok = await host_b.acquire(1)
+    return released and not orphans and b_ok and not host_a.owns(1)
+
+async def test_hand_off():
+    """A drained chat is adopted by a peer with its state intact"""
+    logger.info("🧪 Testing hand-off...")
+    redis = FakeRedis()
+    host_a = leases.LeaseManager(redis, owner="host-a")
+    host_b = leases.LeaseManager(redis, owner="host-b")
+
+    await host_a.acquire(1)
+    await host_a.save_state(1, {'source': 'song', 'position': 99.0})
+    handed = await host_a.hand_off(1)
+    orphans = await host_b.find_orphans()
+    b_ok = await host_b.acquire(1)
+    state = await host_b.load_state(1)
+    return handed and orphans == [1] and b_ok and state.get('position') == '99.0'
+
+async def test_disabled():
+    """Without Redis every chat is owned locally"""
+    logger.info("🧪 Testing without Redis...")
+    manager = leases.LeaseManager(FakeRedis(), owner="host-a")
+    manager.enabled = False
+    return manager.owns(1) and await manager.acquire(1)
+
+async def main():
+    """Main test function"""
+    logger.info("🧪 Starting lease tests...")
+    logger.info("=" * 50)
+
+    Config.LEASE_TTL = 0.2
+
+    results = {
+        "Exclusive": await test_exclusive(),
+        "Fenced handoff": await test_fenced_handoff(),
+        "Release": await test_release(),
+        "Hand-off": await test_hand_off(),
+        "Disabled": await test_disabled()
+    }
+
+    logger.info("\n📊 Test Results:")
+    for name, ok in results.items():
+        logger.info(f"{name}: {'✅ PASS' if ok else '❌ FAIL'}")
+
+    if all(results.values()):
+        logger.info("\n🎉 All lease tests passed!")
+    else:
+        logger.error("\n❌ Some tests failed. Check the logs above.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())